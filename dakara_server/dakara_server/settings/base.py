@@ -31,7 +31,7 @@ INSTALLED_APPS = (
     "rest_framework.authtoken",
     "channels",
     "ordered_model",
-    "library",
+    "library.apps.LibraryConfig",
     "playlist.apps.PlaylistConfig",
     "users",
     "internal.apps.InternalConfig",
@@ -131,6 +131,21 @@ urlpatterns = [
         library_views.feeder.FeederListView.as_view(),
         name="library-feeder-list",
     ),
+    path(
+        "api/library/feeder/bulk/",
+        library_views.feeder.FeederBulkView.as_view(),
+        name="library-feeder-bulk",
+    ),
+    path(
+        "api/library/feeder/changes/",
+        library_views.feeder.FeederChangesView.as_view(),
+        name="library-feeder-changes",
+    ),
+    path(
+        "api/library/feeder/directories/",
+        library_views.feeder.FeederDirectoriesView.as_view(),
+        name="library-feeder-directories",
+    ),
     # API documentation routes
     path("api-docs/", include_docs_urls(title="Dakara server API")),
 ]
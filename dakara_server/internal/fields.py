@@ -0,0 +1,89 @@
+import unicodedata
+
+from django.db import models
+
+
+def fold(text, keep_accents=False):
+    """Fold a text for case insensitive comparison
+
+    The text is case folded and its accents are removed.
+
+    Args:
+        text (str): text to fold.
+        keep_accents (bool): only fold the case of the text.
+
+    Returns:
+        str: folded text.
+    """
+    if not keep_accents:
+        decomposed = unicodedata.normalize("NFKD", text)
+        text = "".join(char for char in decomposed if not unicodedata.combining(char))
+
+    return text.casefold()
+
+
+class FoldedCharField(models.CharField):
+    """Char field containing the folded value of another field
+
+    The value is computed from the source field each time the object is
+    saved, so that the field can be indexed and used for case insensitive
+    lookups and orderings instead of the source field. It is not computed by
+    `bulk_update` or `update`, see `refresh_folded_fields`.
+
+    Args:
+        source (str): name of the field to fold.
+        keep_accents (bool): only fold the case of the source field.
+    """
+
+    def __init__(self, *args, source=None, keep_accents=False, **kwargs):
+        self.source = source
+        self.keep_accents = keep_accents
+        kwargs.setdefault("max_length", 255)
+        kwargs.setdefault("editable", False)
+        kwargs.setdefault("db_index", True)
+        kwargs.setdefault("default", "")
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["source"] = self.source
+        if self.keep_accents:
+            kwargs["keep_accents"] = True
+
+        return name, path, args, kwargs
+
+    def fold(self, value):
+        """Fold a value of the source field
+
+        Args:
+            value (str): value to fold.
+
+        Returns:
+            str: folded value, truncated to the maximal length of the field.
+        """
+        return fold(value or "", self.keep_accents)[: self.max_length]
+
+    def pre_save(self, model_instance, add):
+        value = self.fold(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+def refresh_folded_fields(instance):
+    """Compute the folded fields of an object
+
+    This is needed before updating the object with `bulk_update`.
+
+    Args:
+        instance (django.db.models.Model): object to refresh.
+
+    Returns:
+        list: names of the folded fields of the object.
+    """
+    names = []
+    for field in instance._meta.concrete_fields:
+        if isinstance(field, FoldedCharField):
+            field.pre_save(instance, False)
+            names.append(field.name)
+
+    return names
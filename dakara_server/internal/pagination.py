@@ -1,5 +1,15 @@
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from django.db.models.expressions import OrderBy
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class PageNumberPaginationCustom(PageNumberPagination):
@@ -19,3 +29,193 @@ class PageNumberPaginationCustom(PageNumberPagination):
                 "results": data,
             }
         )
+
+
+class KeysetPaginationCustom(PageNumberPaginationCustom):
+    """Pagination by keyset, or by page number
+
+    The keyset mode is enabled by the `cursor` query parameter, which can be
+    empty to get the first page. In this mode, the page is fetched after the
+    values of the ordering keys of the last item of the previous page, instead
+    of using an offset, and the amount of items is not counted. Getting a page
+    takes then a constant time, which suits infinite scroll clients. The
+    results of the page are given with the link to the next page.
+
+    Without the `cursor` query parameter, the pagination is done by page
+    number.
+
+    In both modes, the size of the page can be set with the `page_size` query
+    parameter.
+
+    The ordering of the queryset must be unique, i.e. its last key must be
+    unique, like the ID.
+    """
+
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    keyset_mode = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = self.cursor_query_param in request.query_params
+
+        if not self.keyset_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.request = request
+        self.cursor = self.decode_cursor(request)
+
+        # annotate ordering keys, so that their values can be compared
+        # and retrieved
+        keys = self.get_keys(queryset)
+        queryset = queryset.annotate(
+            **{name: expression for name, expression, _ in keys}
+        ).order_by(
+            *(
+                F(name).desc() if descending else F(name).asc()
+                for name, _, descending in keys
+            )
+        )
+
+        if self.cursor:
+            values = self.get_cursor_values(queryset, keys)
+
+            try:
+                queryset = queryset.filter(self.get_keyset_filter(keys, values))
+
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        # fetch one more item to know if there is a next page
+        items = list(queryset[: page_size + 1])
+        self.has_next = len(items) > page_size
+        items = items[:page_size]
+
+        if self.has_next:
+            self.next_cursor = [getattr(items[-1], name) for name, _, _ in keys]
+
+        return items
+
+    @staticmethod
+    def get_keys(queryset):
+        """Get the ordering keys of a queryset
+
+        Returns:
+            list: list of tuples containing the annotation name, the
+            expression and the descending flag of each key.
+        """
+        ordering = queryset.query.order_by
+        if not ordering:
+            raise ImproperlyConfigured(
+                "Keyset pagination requires the queryset to be ordered"
+            )
+
+        keys = []
+        for index, item in enumerate(ordering):
+            name = "keyset_{}".format(index)
+
+            if isinstance(item, str):
+                descending = item.startswith("-")
+                keys.append((name, F(item.lstrip("-")), descending))
+                continue
+
+            if isinstance(item, OrderBy):
+                keys.append((name, item.expression, item.descending))
+                continue
+
+            keys.append((name, item, False))
+
+        return keys
+
+    @staticmethod
+    def get_keyset_filter(keys, values):
+        """Create the filter to get items after the given keys values
+
+        For keys (a, b) and values (x, y), the filter is
+        `a > x OR (a = x AND b > y)`.
+        """
+        keyset_filter = Q()
+        equal_filter = Q()
+        for (name, _, descending), value in zip(keys, values):
+            lookup = "{}__{}".format(name, "lt" if descending else "gt")
+            keyset_filter |= equal_filter & Q(**{lookup: value})
+            equal_filter &= Q(**{name: value})
+
+        return keyset_filter
+
+    def decode_cursor(self, request):
+        """Get the keys values from the cursor query parameter
+        """
+        encoded = request.query_params[self.cursor_query_param]
+        if not encoded:
+            return None
+
+        try:
+            cursor = json.loads(b64decode(encoded.encode("ascii")).decode("utf8"))
+
+        except (BinasciiError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(cursor, list):
+            raise NotFound(self.invalid_cursor_message)
+
+        return cursor
+
+    def get_cursor_values(self, queryset, keys):
+        """Convert the values of the cursor to the types of the keys
+
+        Args:
+            queryset (django.db.models.QuerySet): queryset with the keys
+                annotated.
+            keys (list): ordering keys, as given by `get_keys`.
+
+        Returns:
+            list: converted values.
+
+        Raises:
+            NotFound: if the cursor does not match the keys.
+        """
+        if len(self.cursor) != len(keys):
+            raise NotFound(self.invalid_cursor_message)
+
+        try:
+            return [
+                queryset.query.annotations[name].output_field.to_python(value)
+                for (name, _, _), value in zip(keys, self.cursor)
+            ]
+
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def encode_cursor(values):
+        """Create the cursor query parameter from keys values
+        """
+        return b64encode(
+            json.dumps(values, cls=DjangoJSONEncoder).encode("utf8")
+        ).decode("ascii")
+
+    def get_next_link(self):
+        if not self.keyset_mode:
+            return super().get_next_link()
+
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_cursor)
+        )
+
+    def get_paginated_response(self, data):
+        if not self.keyset_mode:
+            return super().get_paginated_response(data)
+
+        return Response({"pagination": {"next": self.get_next_link()}, "results": data})
@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from internal.fields import fold, refresh_folded_fields
+from library.models import Song
+
+UserModel = get_user_model()
+
+
+class FoldTestCase(TestCase):
+    def test_fold(self):
+        """Test to fold a text
+        """
+        self.assertEqual(fold("Ça Plaît À Straße"), "ca plait a strasse")
+
+    def test_fold_keep_accents(self):
+        """Test to fold the case of a text only
+        """
+        self.assertEqual(fold("Ça Plaît", keep_accents=True), "ça plaît")
+
+
+class FoldedCharFieldTestCase(TestCase):
+    def test_save(self):
+        """Test the folded field is computed when saving
+        """
+        song = Song.objects.create(title="Sông Title")
+        self.assertEqual(song.title_folded, "song title")
+
+        song.title = "Other Title"
+        song.save()
+        song.refresh_from_db()
+        self.assertEqual(song.title_folded, "other title")
+
+    def test_bulk_create(self):
+        """Test the folded field is computed when creating in bulk
+        """
+        Song.objects.bulk_create([Song(title="Sông Title")])
+
+        self.assertEqual(Song.objects.get().title_folded, "song title")
+
+    def test_refresh_folded_fields(self):
+        """Test to compute folded fields before updating in bulk
+        """
+        song = Song.objects.create(title="Song Title")
+        song.title = "Other Title"
+
+        fields = refresh_folded_fields(song)
+        Song.objects.bulk_update([song], fields)
+
+        self.assertListEqual(fields, ["title_folded"])
+        song.refresh_from_db()
+        self.assertEqual(song.title_folded, "other title")
+
+    def test_username(self):
+        """Test users are found by their username with any case
+        """
+        user = UserModel.objects.create_user("TestUser", "", "password")
+
+        self.assertEqual(UserModel.objects.get_by_natural_key("testuser"), user)
+        self.assertEqual(user.username_folded, "testuser")
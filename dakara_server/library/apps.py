@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class LibraryConfig(AppConfig):
+    """Library app
+    """
+
+    name = "library"
+
+    def ready(self):
+        """Method called when app start
+        """
+        # connect the signals
+        import library.signals  # noqa F401
@@ -0,0 +1,458 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from internal.fields import refresh_folded_fields
+from library import search
+from library.models import (
+    Artist,
+    LibraryRevision,
+    Song,
+    SongTag,
+    SongTombstone,
+    SongWorkLink,
+    Work,
+    WorkType,
+)
+from library.query_language import invalidate_parser
+from library.signals import songs_updated
+
+# amount of values passed at once to a `__in` lookup, kept under the limit of
+# query parameters of SQLite
+BATCH_SIZE = 500
+
+
+def chunks(items, size=BATCH_SIZE):
+    """Split a list in chunks
+
+    Args:
+        items (list): items to split.
+        size (int): maximal length of a chunk.
+
+    Yields:
+        list: chunk of items.
+    """
+    for index in range(0, len(items), size):
+        yield items[index : index + size]
+
+
+def get_objects(model, key_fields, keys):
+    """Get objects by key in bulk
+
+    Args:
+        model (type): model of the objects.
+        key_fields (tuple): names of the fields identifying an object.
+        keys (set): values of the key fields of the objects to get.
+
+    Returns:
+        dict: objects by values of their key fields. If several objects have
+        the same key, the oldest one is given.
+    """
+    objects = {}
+    first_values = list({key[0] for key in keys})
+    for chunk in chunks(first_values):
+        query_set = model.objects.filter(
+            **{"{}__in".format(key_fields[0]): chunk}
+        ).order_by("pk")
+
+        for obj in query_set:
+            key = tuple(getattr(obj, field) for field in key_fields)
+            if key in keys:
+                objects.setdefault(key, obj)
+
+    return objects
+
+
+def get_or_create_objects(model, key_fields, values_list):
+    """Get or create objects in bulk
+
+    This is the equivalent of `get_or_create` for several objects, done in a
+    few queries.
+
+    Args:
+        model (type): model of the objects.
+        key_fields (tuple): names of the fields identifying an object.
+        values_list (iterable): values of the fields of each object, used to
+            create it if it does not exist. They must contain the key fields.
+
+    Returns:
+        tuple: objects by values of their key fields and true if some objects
+        have been created.
+    """
+    values_by_key = {}
+    for values in values_list:
+        key = tuple(values[field] for field in key_fields)
+        values_by_key.setdefault(key, values)
+
+    objects = get_objects(model, key_fields, set(values_by_key))
+    missing_keys = set(values_by_key) - set(objects)
+    if not missing_keys:
+        return objects, False
+
+    model.objects.bulk_create([model(**values_by_key[key]) for key in missing_keys])
+
+    # IDs of created objects are not always set by `bulk_create`
+    objects.update(get_objects(model, key_fields, missing_keys))
+
+    return objects, True
+
+
+def get_work_key(work_data):
+    """Give the key identifying a work from its data
+
+    Args:
+        work_data (dict): validated data of the work.
+
+    Returns:
+        tuple: title, subtitle and work type query name of the work.
+    """
+    return (
+        work_data["title"],
+        work_data.get("subtitle", ""),
+        work_data["work_type"]["query_name"],
+    )
+
+
+def get_songworklink_values(songworklink_data):
+    """Give the values of a link between a song and a work, except the work
+
+    Args:
+        songworklink_data (dict): validated data of the link.
+
+    Returns:
+        dict: values of the fields of the link.
+    """
+    return {key: value for key, value in songworklink_data.items() if key != "work"}
+
+
+def get_or_create_related(artists_data, tags_data, songworklinks_data):
+    """Get or create in bulk the objects related to songs
+
+    Args:
+        artists_data (iterable): validated data of artists.
+        tags_data (iterable): validated data of tags.
+        songworklinks_data (list): validated data of links to works.
+
+    Returns:
+        tuple: artists by name, tags by name and works by key, as given by
+        `get_work_key`.
+    """
+    artists, _ = get_or_create_objects(Artist, ("name",), artists_data)
+    tags, _ = get_or_create_objects(SongTag, ("name",), tags_data)
+    work_types, work_types_created = get_or_create_objects(
+        WorkType,
+        ("query_name",),
+        (
+            songworklink_data["work"]["work_type"]
+            for songworklink_data in songworklinks_data
+        ),
+    )
+
+    # work types created in bulk do not send signals
+    if work_types_created:
+        invalidate_parser()
+
+    works_values = {}
+    for songworklink_data in songworklinks_data:
+        work_data = songworklink_data["work"]
+        work_type = work_types[(work_data["work_type"]["query_name"],)]
+        works_values[get_work_key(work_data)] = {
+            "title": work_data["title"],
+            "subtitle": work_data.get("subtitle", ""),
+            "work_type_id": work_type.pk,
+        }
+
+    works, _ = get_or_create_objects(
+        Work, ("title", "subtitle", "work_type_id"), works_values.values()
+    )
+
+    return (
+        {key[0]: artist for key, artist in artists.items()},
+        {key[0]: tag for key, tag in tags.items()},
+        {
+            key: works[(values["title"], values["subtitle"], values["work_type_id"])]
+            for key, values in works_values.items()
+        },
+    )
+
+
+def set_relation(manager, objects):
+    """Set the objects of a many to many relation of an object
+
+    Only missing objects are added and only extra objects are removed.
+
+    Args:
+        manager (django.db.models.Manager): related manager of the relation.
+        objects (list): objects to set.
+
+    Returns:
+        bool: true if the relation changed.
+    """
+    ids_old = set(manager.values_list("pk", flat=True))
+    ids_new = {obj.pk for obj in objects}
+    if ids_old == ids_new:
+        return False
+
+    if ids_old - ids_new:
+        manager.remove(*(ids_old - ids_new))
+
+    if ids_new - ids_old:
+        manager.add(*(ids_new - ids_old))
+
+    return True
+
+
+def set_songworklinks(song, songworklinks_data, works):
+    """Set the links between a song and works
+
+    Only missing links are created and only extra links are deleted.
+
+    Args:
+        song (library.models.Song): song to update.
+        songworklinks_data (list): validated data of the links.
+        works (dict): works by key, as given by `get_or_create_related`.
+
+    Returns:
+        bool: true if the links changed.
+    """
+    songworklinks_new = {}
+    for songworklink_data in songworklinks_data:
+        songworklink = SongWorkLink(
+            song_id=song.pk,
+            work_id=works[get_work_key(songworklink_data["work"])].pk,
+            **get_songworklink_values(songworklink_data)
+        )
+        songworklinks_new.setdefault(get_songworklink_key(songworklink), songworklink)
+
+    songworklinks_old = {
+        get_songworklink_key(songworklink): songworklink
+        for songworklink in SongWorkLink.objects.filter(song_id=song.pk)
+    }
+
+    songworklinks_removed = [
+        songworklink.pk
+        for key, songworklink in songworklinks_old.items()
+        if key not in songworklinks_new
+    ]
+    if songworklinks_removed:
+        SongWorkLink.objects.filter(pk__in=songworklinks_removed).delete()
+
+    songworklinks_added = [
+        songworklink
+        for key, songworklink in songworklinks_new.items()
+        if key not in songworklinks_old
+    ]
+    if songworklinks_added:
+        SongWorkLink.objects.bulk_create(songworklinks_added)
+
+        # links created in bulk do not send signals
+        search.refresh([song.pk])
+
+    return bool(songworklinks_removed or songworklinks_added)
+
+
+def get_songworklink_key(songworklink):
+    """Give the key identifying a link between a song and a work
+
+    Args:
+        songworklink (library.models.SongWorkLink): link.
+
+    Returns:
+        tuple: work ID and values of the link.
+    """
+    return (
+        songworklink.work_id,
+        songworklink.link_type,
+        songworklink.link_type_number,
+        songworklink.episodes,
+    )
+
+
+def save_songs(songs_data):
+    """Create or update songs with their relations in bulk
+
+    Artists, tags, work types and works are resolved in a few queries and
+    created if they do not exist. Songs, their many to many relations and
+    their links to works are then created in bulk, in a single transaction
+    and a single revision of the library.
+
+    Args:
+        songs_data (list): validated data of songs, as given by
+            `SongSerializer`. Songs having an ID are updated and their
+            relations are replaced, other songs are created.
+
+    Returns:
+        list: saved songs, in the same order as their data.
+    """
+    songs_data = [dict(song_data) for song_data in songs_data]
+    relations = [
+        (
+            song_data.pop("artists", []),
+            song_data.pop("tags", []),
+            song_data.pop("songworklink_set", []),
+        )
+        for song_data in songs_data
+    ]
+
+    with transaction.atomic():
+        with search.deferred_refresh(), LibraryRevision.objects.batch() as revision:
+            artists, tags, works = get_or_create_related(
+                (
+                    artist_data
+                    for artists_data, _, _ in relations
+                    for artist_data in artists_data
+                ),
+                (tag_data for _, tags_data, _ in relations for tag_data in tags_data),
+                [
+                    songworklink_data
+                    for _, _, songworklinks_data in relations
+                    for songworklink_data in songworklinks_data
+                ],
+            )
+
+            songs = save_songs_fields(songs_data, revision)
+            song_ids = [song.pk for song in songs]
+
+            # replace the relations of updated songs
+            updated_song_ids = [
+                song_data["id"] for song_data in songs_data if "id" in song_data
+            ]
+            for chunk in chunks(updated_song_ids):
+                Song.artists.through.objects.filter(song_id__in=chunk).delete()
+                Song.tags.through.objects.filter(song_id__in=chunk).delete()
+                SongWorkLink.objects.filter(song_id__in=chunk).delete()
+
+            song_artists = set()
+            song_tags = set()
+            songworklinks = []
+            for song, (artists_data, tags_data, songworklinks_data) in zip(
+                songs, relations
+            ):
+                for artist_data in artists_data:
+                    song_artists.add((song.pk, artists[artist_data["name"]].pk))
+
+                for tag_data in tags_data:
+                    song_tags.add((song.pk, tags[tag_data["name"]].pk))
+
+                for songworklink_data in songworklinks_data:
+                    songworklinks.append(
+                        SongWorkLink(
+                            song_id=song.pk,
+                            work_id=works[get_work_key(songworklink_data["work"])].pk,
+                            **get_songworklink_values(songworklink_data)
+                        )
+                    )
+
+            Song.artists.through.objects.bulk_create(
+                [
+                    Song.artists.through(song_id=song_id, artist_id=artist_id)
+                    for song_id, artist_id in song_artists
+                ]
+            )
+            Song.tags.through.objects.bulk_create(
+                [
+                    Song.tags.through(song_id=song_id, songtag_id=tag_id)
+                    for song_id, tag_id in song_tags
+                ]
+            )
+            SongWorkLink.objects.bulk_create(songworklinks)
+
+            # relations created in bulk do not send signals
+            search.refresh(song_ids, create=True)
+            for chunk in chunks(song_ids):
+                Song.objects.filter(pk__in=chunk).refresh_hidden()
+
+    return songs
+
+
+def save_songs_fields(songs_data, revision):
+    """Create or update songs without their relations in bulk
+
+    Args:
+        songs_data (list): values of the fields of songs. Songs having an ID
+            are updated, other songs are created.
+        revision (int): revision of the library of the changes.
+
+    Returns:
+        list: saved songs, in the same order as their data.
+
+    Raises:
+        Song.DoesNotExist: if a song to update does not exist.
+    """
+    updated_songs = {}
+    updated_song_ids = [
+        song_data["id"] for song_data in songs_data if "id" in song_data
+    ]
+    for chunk in chunks(updated_song_ids):
+        updated_songs.update(Song.objects.in_bulk(chunk))
+
+    now = timezone.now()
+    songs = []
+    songs_to_create = []
+    songs_to_update = []
+    songs_moved = []
+    updated_fields = {"revision", "date_updated"}
+    for song_data in songs_data:
+        if "id" in song_data:
+            song = updated_songs.get(song_data["id"])
+            if song is None:
+                raise Song.DoesNotExist(
+                    "Song with ID {} does not exist".format(song_data["id"])
+                )
+
+            if song_data.get("directory", song.directory) != song.directory:
+                songs_moved.append((song.pk, song.directory))
+
+            for field, value in song_data.items():
+                setattr(song, field, value)
+                updated_fields.add(field)
+
+            # folded fields are not computed by `bulk_update`
+            updated_fields.update(refresh_folded_fields(song))
+
+            song.date_updated = now
+            songs_to_update.append(song)
+
+        else:
+            song = Song(**song_data)
+            songs_to_create.append(song)
+
+        song.revision = revision
+        songs.append(song)
+
+    updated_fields.discard("id")
+    Song.objects.bulk_update(songs_to_update, updated_fields, batch_size=BATCH_SIZE)
+    SongTombstone.objects.create_for_songs(songs_moved, moved=True)
+    songs_updated.send(sender=Song, songs=songs_to_update, fields=updated_fields)
+
+    # IDs of created songs can be retrieved only on some databases
+    if connection.features.can_return_ids_from_bulk_insert:
+        Song.objects.bulk_create(songs_to_create)
+
+    else:
+        for song in songs_to_create:
+            song.save()
+
+    return songs
+
+
+def delete_songs(song_ids):
+    """Delete songs in bulk
+
+    The songs are deleted in a single transaction and a single revision of the
+    library.
+
+    Args:
+        song_ids (list): IDs of the songs to delete.
+
+    Returns:
+        int: amount of deleted songs.
+    """
+    song_ids = list(song_ids)
+    deleted = 0
+    with transaction.atomic():
+        with search.deferred_refresh(), LibraryRevision.objects.batch():
+            for chunk in chunks(song_ids):
+                _, deleted_per_model = Song.objects.filter(pk__in=chunk).delete()
+                deleted += deleted_per_model.get(Song._meta.label, 0)
+
+    return deleted
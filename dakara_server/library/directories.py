@@ -0,0 +1,157 @@
+from hashlib import sha1
+
+from django.core.cache import cache
+
+from library.bulk import chunks
+from library.models import LibraryRevision, Song, SongTombstone
+
+DIRECTORY_HASHES_KEY = "library_directory_hashes"
+
+# amount of songs fetched from the database at once
+CHUNK_SIZE = 2000
+
+
+def compute_directory_hashes(directories=None):
+    """Compute the hashes of the content of each directory of the library
+
+    The hash of a directory is the SHA1 of the lines `<filename>\t<date>\n` of
+    its songs, sorted by file name and date of last update. Directories are
+    not nested: a song only changes the hash of its own directory.
+
+    Args:
+        directories (list): directories to hash. If not given, all the
+            directories of the library are hashed.
+
+    Returns:
+        dict: hashes by directory. Given directories with no songs are not
+        included.
+    """
+    if directories is None:
+        return hash_directories(Song.objects.all())
+
+    hashes = {}
+    for chunk in chunks(sorted(directories)):
+        hashes.update(hash_directories(Song.objects.filter(directory__in=chunk)))
+
+    return hashes
+
+
+def hash_directories(queryset):
+    """Hash the directories of the songs of a queryset
+
+    Args:
+        queryset (django.db.models.QuerySet): songs to hash.
+
+    Returns:
+        dict: hashes by directory.
+    """
+    rows = (
+        queryset.order_by("directory", "filename", "date_updated")
+        .values_list("directory", "filename", "date_updated")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+    hashes = {}
+    current_directory = None
+    current_hash = None
+    for directory, filename, date_updated in rows:
+        if directory != current_directory:
+            if current_hash is not None:
+                hashes[current_directory] = current_hash.hexdigest()
+
+            current_directory = directory
+            current_hash = sha1()
+
+        current_hash.update(
+            "{}\t{}\n".format(filename, date_updated.isoformat()).encode("utf-8")
+        )
+
+    if current_hash is not None:
+        hashes[current_directory] = current_hash.hexdigest()
+
+    return hashes
+
+
+def compute_library_hash(hashes):
+    """Compute the hash of the library from the hashes of its directories
+
+    The hash of the library is the SHA1 of the lines `<directory>\t<hash>\n`
+    of all directories, sorted by directory.
+
+    Args:
+        hashes (dict): hashes by directory.
+
+    Returns:
+        str: hash of the library.
+    """
+    library_hash = sha1()
+    for directory in sorted(hashes):
+        library_hash.update(
+            "{}\t{}\n".format(directory, hashes[directory]).encode("utf-8")
+        )
+
+    return library_hash.hexdigest()
+
+
+def get_changed_directories(since):
+    """Get the directories changed since a revision of the library
+
+    A directory changes when one of its songs is saved, or when a song is
+    deleted from it or moved out of it.
+
+    Args:
+        since (int): revision of the library.
+
+    Returns:
+        set: changed directories.
+    """
+    directories = set(
+        Song.objects.filter(revision__gt=since)
+        .order_by()
+        .values_list("directory", flat=True)
+        .distinct()
+    )
+    directories.update(
+        SongTombstone.objects.filter(revision__gt=since)
+        .order_by()
+        .values_list("directory", flat=True)
+        .distinct()
+    )
+
+    return directories
+
+
+def get_directory_hashes():
+    """Get the hashes of the content of each directory of the library
+
+    Hashes are stored in cache with the revision of the library they were
+    computed for. When the revision changes, only the directories changed
+    since then are hashed again, so the cost depends on the amount of songs
+    of these directories, not on the size of the library. The hash of the
+    library is computed again from the hashes of all directories.
+
+    Returns:
+        tuple: revision of the library, hash of the library and dictionary of
+        hashes by directory.
+    """
+    revision = LibraryRevision.objects.get_committed_value()
+    cached = cache.get(DIRECTORY_HASHES_KEY)
+
+    if cached is not None and cached[0] == revision:
+        return cached
+
+    if cached is None:
+        hashes = compute_directory_hashes()
+
+    else:
+        cached_revision, _, hashes = cached
+        directories = get_changed_directories(cached_revision)
+        for directory in directories:
+            hashes.pop(directory, None)
+
+        hashes.update(compute_directory_hashes(directories))
+
+    cached = (revision, compute_library_hash(hashes), hashes)
+    cache.set(DIRECTORY_HASHES_KEY, cached, None)
+
+    return cached
@@ -0,0 +1,125 @@
+import gzip
+from datetime import timedelta
+
+from django.utils.dateparse import parse_datetime
+
+# extension of compressed library files
+GZIP_EXTENSION = ".gz"
+
+
+def open_library_file(path, mode):
+    """Open a library file, compressed if it has the gzip extension
+
+    Args:
+        path (str): path of the file.
+        mode (str): mode of opening, in text.
+
+    Returns:
+        file: file object.
+    """
+    if path.endswith(GZIP_EXTENSION):
+        return gzip.open(path, mode, encoding="utf-8")
+
+    return open(path, mode, encoding="utf-8")
+
+
+def get_song_record(song):
+    """Give the record of a song for a library file
+
+    The record is self-contained: it contains the song with its artists, its
+    tags and its works, with their alternative titles and their work type.
+
+    Args:
+        song (library.models.Song): song, with its relations prefetched.
+
+    Returns:
+        dict: record of the song, which can be converted to JSON.
+    """
+    return {
+        "id": song.id,
+        "title": song.title,
+        "filename": song.filename,
+        "directory": song.directory,
+        "duration": song.duration.total_seconds(),
+        "version": song.version,
+        "detail": song.detail,
+        "detail_video": song.detail_video,
+        "lyrics": song.lyrics,
+        "has_instrumental": song.has_instrumental,
+        "date_created": song.date_created.isoformat(),
+        "date_updated": song.date_updated.isoformat(),
+        "artists": [{"name": artist.name} for artist in song.artists.all()],
+        "tags": [
+            {"name": tag.name, "color_hue": tag.color_hue, "disabled": tag.disabled}
+            for tag in song.tags.all()
+        ],
+        "works": [
+            {
+                "work": get_work_record(songworklink.work),
+                "link_type": songworklink.link_type,
+                "link_type_number": songworklink.link_type_number,
+                "episodes": songworklink.episodes,
+            }
+            for songworklink in song.songworklink_set.all()
+        ],
+    }
+
+
+def get_work_record(work):
+    """Give the record of a work for a library file
+
+    Args:
+        work (library.models.Work): work, with its alternative titles
+            prefetched and its work type selected.
+
+    Returns:
+        dict: record of the work.
+    """
+    return {
+        "title": work.title,
+        "subtitle": work.subtitle,
+        "alternative_titles": [
+            alternative_title.title
+            for alternative_title in work.alternative_titles.all()
+        ],
+        "work_type": {
+            "query_name": work.work_type.query_name,
+            "name": work.work_type.name,
+            "name_plural": work.work_type.name_plural,
+            "icon_name": work.work_type.icon_name,
+        },
+    }
+
+
+def get_song_data(record):
+    """Give the data of a song from its record in a library file
+
+    Args:
+        record (dict): record of the song, as given by `get_song_record`.
+
+    Returns:
+        dict: data of the song, in the format of the validated data of
+        `SongSerializer`, with the dates of creation and update. The ID of
+        the song is not kept.
+    """
+    song_data = {
+        key: record[key]
+        for key in (
+            "title",
+            "filename",
+            "directory",
+            "version",
+            "detail",
+            "detail_video",
+            "lyrics",
+            "has_instrumental",
+        )
+    }
+    song_data["duration"] = timedelta(seconds=record["duration"])
+    song_data["date_created"] = parse_datetime(record["date_created"])
+    song_data["date_updated"] = parse_datetime(record["date_updated"])
+    song_data["artists"] = record["artists"]
+    song_data["tags"] = record["tags"]
+    song_data["songworklink_set"] = record["works"]
+
+    return song_data
@@ -4,6 +4,9 @@ from codecs import open
 
 import yaml
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from library.bulk import BATCH_SIZE, chunks
 
 
 file_encoding = sys.getfilesystemencoding()
@@ -59,3 +62,78 @@ class BaseCommandWithConfig(BaseCommand):
     def handle_custom(self, config, *args, **options):
         """Stub for custom handle actions
         """
+
+    @staticmethod
+    def save_entries(model, key_field, entries, prune=False):
+        """Create or update entries of the config file in bulk
+
+        Existing objects are loaded at once and matched with the entries by
+        their key field, case insensitively. Missing objects are then created
+        at once and modified objects are updated at once, in a single
+        transaction.
+
+        Args:
+            model (type): model of the objects.
+            key_field (str): name of the field identifying an object.
+            entries (list): values of the fields of each object. They must
+                contain the key field.
+            prune (bool): remove objects not found in the entries.
+
+        Returns:
+            tuple: amount of created objects, updated objects and removed
+            objects.
+        """
+        with transaction.atomic():
+            objects_all = list(model.objects.order_by("pk"))
+            objects_old = {}
+            for obj in objects_all:
+                objects_old.setdefault(getattr(obj, key_field).lower(), obj)
+
+            objects_new = {}
+            objects_to_create = []
+            objects_to_update = {}
+            updated_fields = set()
+            for entry in entries:
+                key = entry[key_field].lower()
+                obj = objects_new.get(key) or objects_old.get(key)
+
+                if obj is None:
+                    obj = model(**entry)
+                    objects_to_create.append(obj)
+
+                elif obj.pk is None:
+                    # the object was given twice and will be created
+                    for field, value in entry.items():
+                        setattr(obj, field, value)
+
+                else:
+                    for field, value in entry.items():
+                        if field == key_field or getattr(obj, field) == value:
+                            continue
+
+                        setattr(obj, field, value)
+                        updated_fields.add(field)
+                        objects_to_update[obj.pk] = obj
+
+                objects_new[key] = obj
+
+            model.objects.bulk_create(objects_to_create)
+
+            if objects_to_update:
+                model.objects.bulk_update(
+                    objects_to_update.values(), updated_fields, batch_size=BATCH_SIZE
+                )
+
+            # created objects are not concerned, as they were not loaded
+            removed = 0
+            if prune:
+                kept_ids = {obj.pk for obj in objects_new.values()}
+                ids_to_remove = [
+                    obj.pk for obj in objects_all if obj.pk not in kept_ids
+                ]
+                for chunk in chunks(ids_to_remove):
+                    model.objects.filter(pk__in=chunk).delete()
+
+                removed = len(ids_to_remove)
+
+        return len(objects_to_create), len(objects_to_update), removed
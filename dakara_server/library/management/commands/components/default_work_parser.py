@@ -1,6 +1,12 @@
 import os
 import json
 
+# amount of characters read from the file at once in stream mode
+READ_SIZE = 65536
+
+# characters a JSON number can contain
+NUMBER_CHARACTERS = "0123456789+-.eE"
+
 
 class JSONFileNotFound(Exception):
     """Raised when the JSON file at the path specified is not found."""
@@ -18,3 +24,194 @@ def parse_work(filepath):
 
     with open(filepath) as f:
         return json.load(f)
+
+
+def parse_work_stream(filepath):
+    """Default stream parse module for work data file in JSON.
+
+    The file is read incrementally and works are given one at a time. If the
+    file has the `.jsonl` extension, it is read as JSON Lines, where each line
+    is a work with an extra `work_type` key containing the work type query
+    name.
+
+    Args:
+        filepath : path of the file to parse (must be JSON or JSON Lines).
+
+    Yields:
+        tuple: work type query name and work dictionary.
+    """
+
+    if not os.path.isfile(filepath):
+        raise JSONFileNotFound("JSON file at path '{}' not found.".format(filepath))
+
+    with open(filepath) as f:
+        if os.path.splitext(filepath)[1] == ".jsonl":
+            yield from parse_json_lines(f)
+            return
+
+        yield from JSONStreamReader(f).parse()
+
+
+def parse_json_lines(file):
+    """Parse a work file in JSON Lines
+
+    Args:
+        file (file): file object to parse.
+
+    Yields:
+        tuple: work type query name and work dictionary.
+    """
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+
+        dict_work = json.loads(line)
+        if not isinstance(dict_work, dict) or "work_type" not in dict_work:
+            raise ValueError("Line {} has no work type".format(line_number))
+
+        yield dict_work.pop("work_type"), dict_work
+
+
+class InvalidWorkList:
+    """Value of a work type which is not a list of works
+
+    It is given by `parse_work_stream` in place of a work, so that the value
+    is reported like in a work file parsed at once.
+
+    Args:
+        value (object): value of the work type.
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+
+class JSONStreamReader:
+    """Incremental reader of a JSON work file
+
+    The file must be an object of lists of works. Only one work is decoded at
+    a time, so that the whole file is never kept in memory.
+
+    Args:
+        file (file): file object to read.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def fill(self):
+        """Read more characters from the file
+
+        Returns:
+            bool: True if characters have been read.
+        """
+        if self.eof:
+            return False
+
+        data = self.file.read(READ_SIZE)
+        if not data:
+            self.eof = True
+            return False
+
+        # drop consumed characters
+        self.buffer = self.buffer[self.position :] + data
+        self.position = 0
+        return True
+
+    def peek(self):
+        """Get the next non blank character without consuming it
+
+        Returns:
+            str: next character, or empty string at the end of the file.
+        """
+        while True:
+            while self.position < len(self.buffer):
+                if not self.buffer[self.position].isspace():
+                    return self.buffer[self.position]
+
+                self.position += 1
+
+            if not self.fill():
+                return ""
+
+    def expect(self, characters):
+        """Consume the next non blank character
+
+        Args:
+            characters (str): accepted characters.
+
+        Returns:
+            str: consumed character.
+        """
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(
+                "Expecting one of '{}' at position {}".format(characters, self.position)
+            )
+
+        self.position += 1
+        return character
+
+    def decode(self):
+        """Decode the next JSON value
+
+        Returns:
+            object: decoded value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+
+            except json.JSONDecodeError:
+                # the value may be incomplete
+                if self.fill():
+                    continue
+
+                raise
+
+            # a number may continue after the end of the buffer
+            if not self.buffer[end:].strip(NUMBER_CHARACTERS) and self.fill():
+                continue
+
+            self.position = end
+            return value
+
+    def parse(self):
+        """Parse the file
+
+        Yields:
+            tuple: work type query name and work dictionary.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            return
+
+        while True:
+            work_type = self.decode()
+            if not isinstance(work_type, str):
+                raise ValueError(
+                    "Expecting a work type name at position {}".format(self.position)
+                )
+
+            self.expect(":")
+            if self.peek() == "[":
+                self.position += 1
+                if self.peek() == "]":
+                    self.position += 1
+
+                else:
+                    while True:
+                        yield work_type, self.decode()
+                        if self.expect(",]") == "]":
+                            break
+
+            else:
+                yield work_type, InvalidWorkList(self.decode())
+
+            if self.expect(",}") == "}":
+                return
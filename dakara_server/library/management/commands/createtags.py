@@ -25,26 +25,22 @@ class Command(BaseCommandWithConfig):
             dictionnaries with the keys `name` and `color_hue`. The `name` key
             is mandatory.
         """
-        created_or_updated_tag_ids = []
+        entries = []
 
         for tag in tags:
             # check there is a query name
             if "name" not in tag:
                 raise ValueError("A tag must have a name")
 
-            # get the tag from database or create it
-            tag_entry, _ = SongTag.objects.get_or_create(
-                name__iexact=tag["name"], defaults={"name": tag["name"]}
-            )
+            entry = {"name": tag["name"]}
 
             # process extra field
             if "color_hue" in tag:
-                tag_entry.color_hue = int(tag["color_hue"])
-                tag_entry.save()
+                entry["color_hue"] = int(tag["color_hue"])
 
-            created_or_updated_tag_ids.append(tag_entry.id)
+            entries.append(entry)
 
-        if options.get("prune"):
-            SongTag.objects.exclude(id__in=created_or_updated_tag_ids).delete()
+        # get the tags from database, create or update them
+        self.save_entries(SongTag, "name", entries, prune=options.get("prune"))
 
         self.stdout.write("Tags successfuly created")
@@ -2,10 +2,15 @@ import os
 import sys
 import logging
 import importlib
+from collections import Counter
+from time import perf_counter
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
-from library.models import WorkType, WorkAlternativeTitle, Work
+from library import search
+from library.bulk import chunks
+from library.models import WorkType, WorkAlternativeTitle, Work, SongWorkLink
 
 from .components import default_work_parser
 
@@ -26,22 +31,30 @@ class WorkAlternativeTitleCreator:
             list: The new list with the incorrect alternative titles removed.
 
         """
-        alt_title_to_remove = []
+        return list(self.iter_correct_alt_titles(work_alternative_titles))
 
+    def iter_correct_alt_titles(self, work_alternative_titles):
+        """Give the alternative titles having a correct structure
+
+        Alternative titles are checked in a single pass.
+
+        Args:
+            work_alternative_titles (iterable): The alt titles to filter
+
+        Yields:
+            str: The correct alternative titles.
+
+        """
         for index, struct_alt_title in enumerate(work_alternative_titles):
             # check if it is a string
             if not isinstance(struct_alt_title, str):
-                alt_title_to_remove.append(struct_alt_title)
                 logger.debug(
                     "Incorrect alternative title at index {} of "
                     "current work: value must be a string.".format(index)
                 )
+                continue
 
-        return [
-            alt_title
-            for alt_title in work_alternative_titles
-            if alt_title not in alt_title_to_remove
-        ]
+            yield struct_alt_title
 
     def create_alternative_title(self, work_type_entry, work_entry, alt_title):
         """Create work alternative title in the database if necessary
@@ -74,12 +87,8 @@ class WorkAlternativeTitleCreator:
             work_alternative_titles (list): The list of alt titles to create
 
         """
-        # remove the incorrect alternative titles
-        work_alternative_titles = self.remove_incorrect_alt_titles(
-            work_alternative_titles
-        )
-
-        for alt_title in work_alternative_titles:
+        # skip the incorrect alternative titles
+        for alt_title in self.iter_correct_alt_titles(work_alternative_titles):
             # create work alternative title
             self.create_alternative_title(work_type_entry, work_entry, alt_title)
 
@@ -94,6 +103,11 @@ class WorkCreator:
         parser (module): Custom python module used to extract data from file
         debug (bool): Enable debug mode if true
         update_only (bool): Only update existing works, do not create new ones
+        bulk (bool): Create works and alternative titles in bulk, in a
+            single transaction
+        stream (bool): Read the work file incrementally and create works in
+            bulk by batches, each batch in its own transaction
+        batch_size (int): Amount of works of a batch in stream mode
 
     About parser:
         This module should define a method called `parse_work` which takes
@@ -115,13 +129,30 @@ class WorkCreator:
                     ],
                  'WorkType 2': []}
 
+        For stream mode, this module should also define a method called
+        `parse_work_stream` which takes a file path as argument and yields
+        tuples of a work type query name and a work dictionary, as described
+        above, while reading the file.
+
     """
 
-    def __init__(self, work_file="", parser=None, debug=False, update_only=False):
+    def __init__(
+        self,
+        work_file="",
+        parser=None,
+        debug=False,
+        update_only=False,
+        bulk=False,
+        stream=False,
+        batch_size=1000,
+    ):
         self.work_file = work_file
         self.parser = parser
         self.debug = debug
         self.update_only = update_only
+        self.bulk = bulk or stream
+        self.stream = stream
+        self.batch_size = batch_size
         self.work_alt_title_creator = WorkAlternativeTitleCreator()
 
     def remove_incorrect_works(self, work_listing):
@@ -134,13 +165,26 @@ class WorkCreator:
             list: The new list with the incorrect works removed
 
         """
-        work_to_remove = []
+        return list(self.iter_correct_works(work_listing))
+
+    def iter_correct_works(self, work_listing, start=0):
+        """Give the works having a correct structure in a list of works
+
+        Works are checked in a single pass.
+
+        Args:
+            work_listing (iterable): The works to filter
+            start (int): Index of the first work in the work type, used to
+                report incorrect works
+
+        Yields:
+            dict: The correct works.
 
+        """
         logger.debug("Removing the incorrect work from the current work type.")
-        for index, dict_work in enumerate(work_listing):
+        for index, dict_work in enumerate(work_listing, start):
             # check if it is a dictionary
             if not isinstance(dict_work, dict):
-                work_to_remove.append(dict_work)
                 logger.debug(
                     "Incorrect work at index {}: "
                     "value must be a dictionary.".format(index)
@@ -150,8 +194,9 @@ class WorkCreator:
             # check if it has a title field
             work_title = dict_work.get("title")
             if not work_title:
-                work_to_remove.append(dict_work)
-                logger.debug("Incorrect work at index {}: " "no title field found")
+                logger.debug(
+                    "Incorrect work at index {}: no title field found".format(index)
+                )
                 continue
 
             logger.debug(
@@ -160,7 +205,7 @@ class WorkCreator:
                 )
             )
 
-        return [work for work in work_listing if work not in work_to_remove]
+            yield dict_work
 
     def creatework(self, work_type_entry, dict_work):
         """Create or update a work in database
@@ -227,6 +272,150 @@ class WorkCreator:
         # save work in the database
         work_entry.save()
 
+    def createworks_bulk(self, work_type_entry, work_listing):
+        """Create or update works of a work type in bulk
+
+        Existing works of the work type and their alternative titles are
+        loaded at once, then missing ones are created at once.
+
+        Args:
+            work_type_entry (obj): The work type entry object of the works
+            work_listing (iterable): The correct works as dictionaries (see
+                parser doc), read once
+
+        Returns:
+            tuple: amount of processed works, amount of created works and
+            amount of created alternative titles.
+
+        """
+        # group the alternative titles by work
+        alt_titles_by_key = {}
+        works_count = 0
+        for dict_work in work_listing:
+            works_count += 1
+            key = (dict_work.get("title"), dict_work.get("subtitle", ""))
+            alt_titles_by_key.setdefault(key, []).append(
+                dict_work.get("alternative_titles", [])
+            )
+
+        # index existing works and their alternative titles
+        titles = {title for title, _ in alt_titles_by_key}
+        works_index = self.get_works_index(work_type_entry, titles)
+        alt_titles_index = self.get_alt_titles_index(works_index.values())
+
+        # create missing works
+        works_to_create = []
+        for key in alt_titles_by_key:
+            if key in works_index:
+                continue
+
+            if self.update_only:
+                logger.debug(
+                    "Work (title: {title}, "
+                    "subtitle: {subtitle}, work_type: {work_type})"
+                    " not found (update only).".format(
+                        title=key[0],
+                        subtitle=key[1],
+                        work_type=work_type_entry.query_name,
+                    )
+                )
+                continue
+
+            work_entry = Work(title=key[0], subtitle=key[1], work_type=work_type_entry)
+            works_index[key] = work_entry
+            works_to_create.append(work_entry)
+
+        if works_to_create:
+            Work.objects.bulk_create(works_to_create)
+
+            # IDs of created works are not always set by `bulk_create`
+            works_index = self.get_works_index(work_type_entry, titles)
+
+        # create missing alternative titles
+        alt_titles_to_create = []
+        alt_title_creator = self.work_alt_title_creator
+        for key, work_alternative_titles_list in alt_titles_by_key.items():
+            work_entry = works_index.get(key)
+            if work_entry is None:
+                continue
+
+            for work_alternative_titles in work_alternative_titles_list:
+                work_alternative_titles = alt_title_creator.iter_correct_alt_titles(
+                    work_alternative_titles
+                )
+                for alt_title in work_alternative_titles:
+                    if (work_entry.pk, alt_title) in alt_titles_index:
+                        continue
+
+                    alt_titles_index.add((work_entry.pk, alt_title))
+                    alt_titles_to_create.append(
+                        WorkAlternativeTitle(title=alt_title, work=work_entry)
+                    )
+
+        if alt_titles_to_create:
+            WorkAlternativeTitle.objects.bulk_create(alt_titles_to_create)
+
+            # alternative titles created in bulk do not send signals
+            work_ids = list({alt_title.work_id for alt_title in alt_titles_to_create})
+            song_ids = set()
+            for chunk in chunks(work_ids):
+                song_ids.update(
+                    SongWorkLink.objects.filter(work_id__in=chunk).values_list(
+                        "song_id", flat=True
+                    )
+                )
+
+            search.refresh(song_ids)
+
+        return works_count, len(works_to_create), len(alt_titles_to_create)
+
+    @staticmethod
+    def get_works_index(work_type_entry, titles):
+        """Get the works of a work type by title and subtitle
+
+        Args:
+            work_type_entry (obj): The work type entry object of the works
+            titles (set): The titles of the works to get
+
+        Returns:
+            dict: works by tuple of title and subtitle.
+
+        """
+        works_index = {}
+        for chunk in chunks(list(titles)):
+            query_set = Work.objects.filter(
+                work_type=work_type_entry, title__in=chunk
+            ).order_by("pk")
+
+            for work_entry in query_set:
+                works_index.setdefault(
+                    (work_entry.title, work_entry.subtitle), work_entry
+                )
+
+        return works_index
+
+    @staticmethod
+    def get_alt_titles_index(work_entries):
+        """Get the alternative titles of works
+
+        Args:
+            work_entries (iterable): The work entry objects
+
+        Returns:
+            set: tuples of work ID and alternative title.
+
+        """
+        alt_titles_index = set()
+        work_ids = [work_entry.pk for work_entry in work_entries]
+        for chunk in chunks(work_ids):
+            alt_titles_index.update(
+                WorkAlternativeTitle.objects.filter(work_id__in=chunk).values_list(
+                    "work_id", "title"
+                )
+            )
+
+        return alt_titles_index
+
     def createworks(self):
         """Create or update works provided
 
@@ -234,15 +423,115 @@ class WorkCreator:
             Raise a CommandError exception if the work file cannot be read
 
         """
-        # parse the work file to get the data structure
+        start = perf_counter()
+        report = Counter()
+
+        if self.stream:
+            self.createworks_stream(report)
+
+        else:
+            # parse the work file to get the data structure
+            try:
+                works = self.parser.parse_work(self.work_file)
+            except BaseException as exc:
+                raise CommandError(
+                    "Error when reading the work" " file: {}".format(exc)
+                ) from exc
+
+            if self.bulk:
+                with transaction.atomic():
+                    self.createworks_from_data(works, report)
+
+            else:
+                self.createworks_from_data(works, report)
+
+        if not report["errors"]:
+            logger.info("Works successfully created.")
+
+        if self.bulk:
+            duration = perf_counter() - start
+            logger.info(
+                "Processed {} works in {:.2f} s ({:.0f} works/s): "
+                "created {} works and {} alternative titles.".format(
+                    report["works"],
+                    duration,
+                    report["works"] / duration if duration else 0,
+                    report["created_works"],
+                    report["created_alt_titles"],
+                )
+            )
+
+    def createworks_stream(self, report):
+        """Create or update works while reading the work file
+
+        Works are created by batches, each batch in its own transaction.
+
+        Args:
+            report (collections.Counter): counters of processed works.
+
+        Note:
+            Raise a CommandError exception if the work file cannot be read
+
+        """
+        # index in the file of the first work of the batch, by work type
+        starts = Counter()
+        batch = {}
+        batch_count = 0
+        for worktype_query_name, dict_work in self.read_work_stream():
+            # report a work type which is not a list of works
+            if isinstance(dict_work, default_work_parser.InvalidWorkList):
+                self.createworks_from_data(
+                    {worktype_query_name: dict_work.value}, report
+                )
+                continue
+
+            batch.setdefault(worktype_query_name, []).append(dict_work)
+            batch_count += 1
+
+            if batch_count >= self.batch_size:
+                with transaction.atomic():
+                    self.createworks_from_data(batch, report, starts)
+
+                logger.debug("Processed {} works.".format(report["works"]))
+                batch = {}
+                batch_count = 0
+
+        if batch:
+            with transaction.atomic():
+                self.createworks_from_data(batch, report, starts)
+
+    def read_work_stream(self):
+        """Read the work file incrementally
+
+        Yields:
+            tuple: work type query name and work dictionary.
+
+        Note:
+            Raise a CommandError exception if the work file cannot be read
+
+        """
         try:
-            works = self.parser.parse_work(self.work_file)
-        except BaseException as exc:
+            yield from self.parser.parse_work_stream(self.work_file)
+        except Exception as exc:
             raise CommandError(
-                "Error when reading the work" " file: {}".format(exc)
+                "Error when reading the work file: {}".format(exc)
             ) from exc
 
-        work_success = True
+    def createworks_from_data(self, works, report, starts=None):
+        """Create or update works from parsed data
+
+        Args:
+            works (dict): works by work type query name (see parser doc)
+            report (collections.Counter): counters of processed works.
+            starts (collections.Counter): index of the first work of each
+                work type, used to report incorrect works. It is incremented
+                by the amount of works processed. If not given, works are
+                indexed from 0.
+
+        """
+        if starts is None:
+            starts = Counter()
+
         # get works or create it
         for worktype_query_name, work_listing in works.items():
             logger.debug("Get WorkType query name '{}'".format(worktype_query_name))
@@ -251,7 +540,7 @@ class WorkCreator:
                 work_type_entry = WorkType.objects.get(query_name=worktype_query_name)
 
             except WorkType.DoesNotExist:
-                work_success = False
+                report["errors"] += 1
                 logger.error(
                     "Unable to find work type query name '{}'. Use "
                     "createworktypes command first to create "
@@ -261,7 +550,7 @@ class WorkCreator:
 
             # check the value associated to the work_type is a list
             if not isinstance(work_listing, list):
-                work_success = False
+                report["errors"] += 1
                 logger.warning(
                     "Ignore creation of the works associated "
                     "to the worktype '{}': "
@@ -269,16 +558,26 @@ class WorkCreator:
                 )
                 continue
 
-            # remove the works having an incorrect structure
-            work_listing = self.remove_incorrect_works(work_listing)
+            # skip the works having an incorrect structure
+            correct_works = self.iter_correct_works(
+                work_listing, starts[worktype_query_name]
+            )
+            starts[worktype_query_name] += len(work_listing)
+
+            if self.bulk:
+                works_count, created_works, created_alt_titles = self.createworks_bulk(
+                    work_type_entry, correct_works
+                )
+                report["works"] += works_count
+                report["created_works"] += created_works
+                report["created_alt_titles"] += created_alt_titles
+                continue
 
             # get works and their attributes
-            for dict_work in work_listing:
+            for dict_work in correct_works:
+                report["works"] += 1
                 self.creatework(work_type_entry, dict_work)
 
-        if work_success:
-            logger.info("Works successfully created.")
-
 
 class Command(BaseCommand):
     """Command available for `manage.py` for creating works or add info"""
@@ -309,6 +608,22 @@ class Command(BaseCommand):
             action="store_true",
         )
 
+        parser.add_argument(
+            "--bulk",
+            help="""Create works and alternative titles in bulk, in a single
+            transaction. Faster for large work files.""",
+            action="store_true",
+        )
+
+        parser.add_argument(
+            "--stream",
+            help="""Read the work file incrementally and create works in bulk
+            by batches, each batch in its own transaction. Uses a bounded
+            amount of memory for huge work files. The parser must support
+            it.""",
+            action="store_true",
+        )
+
     def handle(self, *args, **options):
         """Process the feeding"""
         # work file data
@@ -334,8 +649,21 @@ class Command(BaseCommand):
         # update only
         update_only = options.get("update_only", False)
 
+        # bulk
+        bulk = options.get("bulk", False)
+
+        # stream
+        stream = options.get("stream", False)
+        if stream and not hasattr(parser, "parse_work_stream"):
+            raise CommandError("The parser does not support stream mode")
+
         work_creator = WorkCreator(
-            work_file=work_file, parser=parser, debug=debug, update_only=update_only
+            work_file=work_file,
+            parser=parser,
+            debug=debug,
+            update_only=update_only,
+            bulk=bulk,
+            stream=stream,
         )
 
         # run the work creator
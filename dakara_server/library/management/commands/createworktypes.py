@@ -1,4 +1,5 @@
 from library.models import WorkType
+from library.query_language import invalidate_parser
 from ._private import BaseCommandWithConfig
 
 
@@ -39,31 +40,31 @@ class Command(BaseCommandWithConfig):
             dictionnaries with different keys. Among them, the `query_name` key
             is mandatory.
         """
-        created_or_updated_work_type_ids = []
+        entries = []
 
         for work_type in work_types:
             # check there is a query name
             if "query_name" not in work_type:
                 raise ValueError("A work type must have a query name")
 
-            # get the work entry from database or creat it
-            work_type_entry, _ = WorkType.objects.get_or_create(
-                query_name__iexact=work_type["query_name"],
-                defaults={"query_name": work_type["query_name"]},
-            )
+            entry = {"query_name": work_type["query_name"]}
 
             # process for all extra fields
             for subkey in self._get_subkeys():
                 if subkey not in work_type:
                     continue
 
-                # alter the work type attribute
-                setattr(work_type_entry, subkey, work_type[subkey])
-                work_type_entry.save()
+                entry[subkey] = work_type[subkey]
 
-            created_or_updated_work_type_ids.append(work_type_entry.id)
+            entries.append(entry)
 
-        if options.get("prune"):
-            WorkType.objects.exclude(id__in=created_or_updated_work_type_ids).delete()
+        # get the work types from database, create or update them
+        created, updated, _ = self.save_entries(
+            WorkType, "query_name", entries, prune=options.get("prune")
+        )
+
+        # work types created or updated in bulk do not send signals
+        if created or updated:
+            invalidate_parser()
 
         self.stdout.write("Work types successfuly created")
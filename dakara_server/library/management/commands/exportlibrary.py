@@ -0,0 +1,82 @@
+import json
+import os
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from library.models import Song
+from library.serializers import SongSerializer
+
+from ._library_file import get_song_record, open_library_file
+
+
+class Command(BaseCommand):
+    """Command for exporting the library to a file
+
+    The file is in JSON Lines: each line is a self-contained record of a song
+    with its artists, tags and works. It is compressed with gzip if its name
+    ends with `.gz`. Songs are fetched by chunks, so that the library is never
+    kept in memory.
+    """
+
+    help = "Export the library to a file."
+
+    # amount of songs fetched from the database at once
+    chunk_size = 1000
+
+    def add_arguments(self, parser):
+        """Extend arguments for the command
+        """
+        parser.add_argument(
+            "file", help="File to export to, compressed if it ends with '.gz'."
+        )
+
+        parser.add_argument(
+            "--quiet", help="Do not display anything on run.", action="store_true"
+        )
+
+    def handle(self, *args, **options):
+        """Export the library
+        """
+
+        # quiet mode
+        if options["quiet"]:
+            self.stdout = open(os.devnull, "w")
+            self.stderr = open(os.devnull, "w")
+
+        start = perf_counter()
+        exported = 0
+        with open_library_file(options["file"], "wt") as file:
+            for song in self.get_songs():
+                file.write(json.dumps(get_song_record(song), ensure_ascii=False))
+                file.write("\n")
+                exported += 1
+
+        duration = perf_counter() - start
+        self.stdout.write(
+            "Exported {} songs in {:.2f} s ({:.0f} songs/s).".format(
+                exported, duration, exported / duration if duration else 0
+            )
+        )
+
+    def get_songs(self):
+        """Get the songs of the library by chunks
+
+        Yields:
+            library.models.Song: song with its relations prefetched.
+        """
+        last_id = 0
+        while True:
+            songs = list(
+                Song.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .prefetch_related(*SongSerializer.get_prefetch_lookups())[
+                    : self.chunk_size
+                ]
+            )
+
+            if not songs:
+                return
+
+            yield from songs
+            last_id = songs[-1].pk
@@ -0,0 +1,180 @@
+import json
+import os
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from library import bulk, search
+from library.models import Song, SongWorkLink, WorkAlternativeTitle
+
+from ._library_file import get_song_data, open_library_file
+
+
+class Command(BaseCommand):
+    """Command for importing the library from a file
+
+    The file is the one created by the `exportlibrary` command. Songs are
+    created in bulk by batches, each batch in its own transaction. IDs of the
+    file are not kept: artists, tags, work types and works are matched by
+    name with the ones of the database, or created, and songs are matched by
+    directory and file name, and updated. The dates of the songs are kept.
+    """
+
+    help = "Import the library from a file."
+
+    # amount of songs created at once
+    batch_size = 1000
+
+    def add_arguments(self, parser):
+        """Extend arguments for the command
+        """
+        parser.add_argument(
+            "file", help="File to import from, compressed if it ends with '.gz'."
+        )
+
+        parser.add_argument(
+            "--quiet", help="Do not display anything on run.", action="store_true"
+        )
+
+    def handle(self, *args, **options):
+        """Import the library
+        """
+
+        # quiet mode
+        if options["quiet"]:
+            self.stdout = open(os.devnull, "w")
+            self.stderr = open(os.devnull, "w")
+
+        if not os.path.isfile(options["file"]):
+            raise CommandError("Library file '{}' not found".format(options["file"]))
+
+        start = perf_counter()
+        imported = 0
+        with open_library_file(options["file"], "rt") as file:
+            songs_data = []
+            for line_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+
+                try:
+                    songs_data.append(get_song_data(json.loads(line)))
+
+                except (ValueError, KeyError, TypeError) as error:
+                    raise CommandError(
+                        "Invalid song at line {}: {}".format(line_number, error)
+                    ) from error
+
+                if len(songs_data) >= self.batch_size:
+                    imported += self.import_songs(songs_data)
+                    songs_data = []
+
+            if songs_data:
+                imported += self.import_songs(songs_data)
+
+        duration = perf_counter() - start
+        self.stdout.write(
+            "Imported {} songs in {:.2f} s ({:.0f} songs/s).".format(
+                imported, duration, imported / duration if duration else 0
+            )
+        )
+
+    @staticmethod
+    def import_songs(songs_data):
+        """Create or update songs in bulk
+
+        Args:
+            songs_data (list): data of the songs, as given by `get_song_data`.
+
+        Returns:
+            int: amount of imported songs.
+        """
+        with transaction.atomic():
+            # songs already in the database are updated
+            songs_old = bulk.get_objects(
+                Song,
+                ("filename", "directory"),
+                {
+                    (song_data["filename"], song_data["directory"])
+                    for song_data in songs_data
+                },
+            )
+
+            dates = []
+            for song_data in songs_data:
+                song_old = songs_old.get(
+                    (song_data["filename"], song_data["directory"])
+                )
+                if song_old is not None:
+                    song_data["id"] = song_old.pk
+
+                dates.append(
+                    (song_data.pop("date_created"), song_data.pop("date_updated"))
+                )
+
+            songs = bulk.save_songs(songs_data)
+
+            # dates are set automatically when saving
+            for song, (date_created, date_updated) in zip(songs, dates):
+                song.date_created = date_created
+                song.date_updated = date_updated
+
+            Song.objects.bulk_update(
+                songs, ["date_created", "date_updated"], batch_size=bulk.BATCH_SIZE
+            )
+
+            create_alternative_titles(
+                [
+                    songworklink_data
+                    for song_data in songs_data
+                    for songworklink_data in song_data["songworklink_set"]
+                ]
+            )
+
+        return len(songs)
+
+
+def create_alternative_titles(songworklinks_data):
+    """Create the missing alternative titles of works in bulk
+
+    Args:
+        songworklinks_data (list): data of links to works, as given by
+            `get_song_data`.
+    """
+    _, _, works = bulk.get_or_create_related([], [], songworklinks_data)
+
+    alternative_titles = set()
+    for songworklink_data in songworklinks_data:
+        work = works[bulk.get_work_key(songworklink_data["work"])]
+        for title in songworklink_data["work"].get("alternative_titles", []):
+            alternative_titles.add((work.pk, title))
+
+    if not alternative_titles:
+        return
+
+    work_ids = list({work.pk for work in works.values()})
+    for chunk in bulk.chunks(work_ids):
+        alternative_titles.difference_update(
+            WorkAlternativeTitle.objects.filter(work_id__in=chunk).values_list(
+                "work_id", "title"
+            )
+        )
+
+    if not alternative_titles:
+        return
+
+    WorkAlternativeTitle.objects.bulk_create(
+        [
+            WorkAlternativeTitle(work_id=work_id, title=title)
+            for work_id, title in alternative_titles
+        ]
+    )
+
+    # alternative titles created in bulk do not send signals
+    modified_work_ids = list({work_id for work_id, _ in alternative_titles})
+    for chunk in bulk.chunks(modified_work_ids):
+        search.refresh(
+            SongWorkLink.objects.filter(work_id__in=chunk).values_list(
+                "song_id", flat=True
+            )
+        )
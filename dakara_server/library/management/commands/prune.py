@@ -1,15 +1,30 @@
 import os
+from datetime import timedelta
+from time import perf_counter
 
 from django.core.management.base import BaseCommand
-from library.models import Artist, Work
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from library.models import Artist, SongTag, Work, WorkAlternativeTitle, WorkType
+from library.query_language import invalidate_parser
+from playlist.models import PlayerError
 
 
 class Command(BaseCommand):
     """Command for removing unused objects from database
+
+    Objects are deleted by chunks of IDs, without being loaded in memory.
+    Only objects with no other objects depending on them are deleted, so the
+    deletion does not have to cascade and signals are not sent.
     """
 
     help = "Remove unused objects from database."
 
+    # amount of IDs covered by a deletion query
+    chunk_size = 5000
+
     def add_arguments(self, parser):
         """Extend arguments for the command
         """
@@ -24,6 +39,30 @@ class Command(BaseCommand):
             "--works", help="Remove works with no songs attached.", action="store_true"
         )
 
+        parser.add_argument(
+            "--tags", help="Remove tags with no songs attached.", action="store_true"
+        )
+
+        parser.add_argument(
+            "--work-types",
+            help="""Remove work types with no works attached. Works removed by
+            `--works` are considered.""",
+            action="store_true",
+        )
+
+        parser.add_argument(
+            "--player-errors",
+            help="Remove player errors older than the given amount of days.",
+            type=int,
+            metavar="DAYS",
+        )
+
+        parser.add_argument(
+            "--dry-run",
+            help="Only count the objects to remove, do not remove them.",
+            action="store_true",
+        )
+
         parser.add_argument(
             "--quiet", help="Do not display anything on run.", action="store_true"
         )
@@ -37,22 +76,93 @@ class Command(BaseCommand):
             self.stdout = open(os.devnull, "w")
             self.stderr = open(os.devnull, "w")
 
+        dry_run = options["dry_run"]
+
+        # prune player errors if requested
+        if options["player_errors"] is not None:
+            date_limit = timezone.now() - timedelta(days=options["player_errors"])
+            self.prune(
+                PlayerError.objects.filter(date_created__lt=date_limit),
+                "player errors",
+                dry_run,
+            )
+
         # prune artists if requested
         if options["artists"]:
-            # TODO: starting from django 1.9 the delete method returns
-            # the number of rows affected
-            # so this can be done in one call
-            queryset = Artist.objects.filter(song=None)
-            removed_artists = queryset.count()
-            queryset.delete()
-            self.stdout.write("Removed {} artists.".format(removed_artists))
+            self.prune(Artist.objects.filter(song=None), "artists", dry_run)
 
         # prune works if requested
         if options["works"]:
-            # TODO: starting from django 1.9 the delete method returns
-            # the number of rows affected
-            # so this can be done in one call
-            queryset = Work.objects.filter(song=None)
-            removed_works = queryset.count()
-            queryset.delete()
-            self.stdout.write("Removed {} works.".format(removed_works))
+            self.prune(
+                Work.objects.filter(song=None),
+                "works",
+                dry_run,
+                dependent_querysets=[
+                    lambda works: WorkAlternativeTitle.objects.filter(work__in=works)
+                ],
+            )
+
+        # prune tags if requested
+        if options["tags"]:
+            self.prune(SongTag.objects.filter(song=None), "tags", dry_run)
+
+        # prune work types if requested
+        if options["work_types"]:
+            work_types = WorkType.objects.filter(work=None)
+
+            # in dry run mode, works that would be removed are still there
+            if dry_run and options["works"]:
+                work_types = WorkType.objects.exclude(
+                    pk__in=Work.objects.exclude(song=None).values("work_type")
+                )
+
+            removed = self.prune(work_types, "work types", dry_run)
+
+            # work types are deleted without signals
+            if removed and not dry_run:
+                invalidate_parser()
+
+    def prune(self, queryset, name, dry_run, dependent_querysets=()):
+        """Delete the objects of a queryset by chunks of IDs
+
+        Args:
+            queryset (django.db.models.QuerySet): objects to delete, which
+                must have no other objects depending on them, except the ones
+                given by `dependent_querysets`.
+            name (str): name of the objects for the report.
+            dry_run (bool): only count the objects to delete.
+            dependent_querysets (list): functions giving, from a chunk of
+                objects to delete, a queryset of objects depending on them,
+                which are deleted first.
+
+        Returns:
+            int: amount of deleted objects.
+        """
+        if dry_run:
+            self.stdout.write("Would remove {} {}.".format(queryset.count(), name))
+            return 0
+
+        start = perf_counter()
+        removed = 0
+        bounds = queryset.aggregate(low=Min("pk"), high=Max("pk"))
+        if bounds["low"] is not None:
+            for low in range(bounds["low"], bounds["high"] + 1, self.chunk_size):
+                chunk = queryset.filter(pk__gte=low, pk__lt=low + self.chunk_size)
+                # `_raw_delete` is a private API of Django, which deletes
+                # without collecting related objects nor sending signals; it
+                # is safe here as the deleted objects have no dependents left
+                with transaction.atomic():
+                    for get_dependent_queryset in dependent_querysets:
+                        dependent_queryset = get_dependent_queryset(chunk)
+                        dependent_queryset._raw_delete(dependent_queryset.db)
+
+                    removed += chunk._raw_delete(chunk.db)
+
+        duration = perf_counter() - start
+        self.stdout.write(
+            "Removed {} {} in {:.2f} s ({:.0f} rows/s).".format(
+                removed, name, duration, removed / duration if duration else 0
+            )
+        )
+
+        return removed
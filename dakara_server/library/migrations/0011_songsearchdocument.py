@@ -0,0 +1,96 @@
+# Generated by Django 2.2.28 on 2026-10-16 20:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from library import search
+
+try:
+    from django.contrib.postgres.operations import TrigramExtension
+
+except ImportError:
+    # psycopg2 is not installed, so the database cannot be PostgreSQL
+    extension_operations = []
+
+else:
+
+    class PostgreSQLTrigramExtension(TrigramExtension):
+        """Trigram extension managed on PostgreSQL only
+
+        The extension is only created on PostgreSQL, but the base operation
+        tries to remove it on any database.
+        """
+
+        def database_backwards(self, app_label, schema_editor, from_state, to_state):
+            if schema_editor.connection.vendor != "postgresql":
+                return
+
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+    extension_operations = [PostgreSQLTrigramExtension()]
+
+
+def create_search_documents(apps, schema_editor):
+    """Create the search document of all existing songs
+    """
+    Song = apps.get_model("library", "Song")
+    SongSearchDocument = apps.get_model("library", "SongSearchDocument")
+
+    songs = Song.objects.prefetch_related(
+        "artists", "songworklink_set__work__alternative_titles"
+    )
+    documents = []
+    for song in songs:
+        texts = [song.title, song.version, song.detail, song.detail_video]
+        texts.extend(artist.name for artist in song.artists.all())
+        for songworklink in song.songworklink_set.all():
+            texts.append(songworklink.work.title)
+            texts.extend(
+                alternative_title.title
+                for alternative_title in songworklink.work.alternative_titles.all()
+            )
+
+        documents.append(
+            SongSearchDocument(
+                song=song, document="\n".join(text for text in texts if text)
+            )
+        )
+
+    SongSearchDocument.objects.bulk_create(documents, batch_size=2000)
+
+
+def install_index(apps, schema_editor):
+    search.install_index(schema_editor)
+
+
+def uninstall_index(apps, schema_editor):
+    search.uninstall_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0010_song_has_instrumental"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SongSearchDocument",
+            fields=[
+                (
+                    "song",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="library.Song",
+                    ),
+                ),
+                ("document", models.TextField(blank=True)),
+            ],
+        ),
+        *extension_operations,
+        migrations.RunPython(install_index, uninstall_index),
+        migrations.RunPython(create_search_documents, migrations.RunPython.noop),
+    ]
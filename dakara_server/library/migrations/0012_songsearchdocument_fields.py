@@ -0,0 +1,95 @@
+# Generated by Django 2.2.28 on 2026-10-16 20:25
+
+import unicodedata
+
+from django.db import migrations, models
+
+from library import search
+
+
+def normalize(text):
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(
+        char for char in decomposed if not unicodedata.combining(char)
+    ).casefold()
+
+
+def join_lines(texts):
+    texts = [text for text in texts if text]
+    if not texts:
+        return ""
+
+    return "\n" + "\n".join(texts) + "\n"
+
+
+def update_search_documents(apps, schema_editor):
+    """Fill the new fields of the search documents and normalize them
+    """
+    Song = apps.get_model("library", "Song")
+    SongSearchDocument = apps.get_model("library", "SongSearchDocument")
+
+    songs = Song.objects.prefetch_related(
+        "artists", "tags", "songworklink_set__work__alternative_titles"
+    )
+    documents = []
+    for song in songs:
+        artists = [normalize(artist.name) for artist in song.artists.all()]
+        works = []
+        for songworklink in song.songworklink_set.all():
+            works.append(normalize(songworklink.work.title))
+            works.extend(
+                normalize(alternative_title.title)
+                for alternative_title in songworklink.work.alternative_titles.all()
+            )
+
+        texts = [
+            normalize(text)
+            for text in (song.title, song.version, song.detail, song.detail_video)
+        ]
+        texts.extend(artists)
+        texts.extend(works)
+
+        documents.append(
+            SongSearchDocument(
+                song=song,
+                document="\n".join(text for text in texts if text),
+                artists=join_lines(artists),
+                works=join_lines(works),
+                tags=join_lines(tag.name for tag in song.tags.all()),
+            )
+        )
+
+    SongSearchDocument.objects.all().delete()
+    SongSearchDocument.objects.bulk_create(documents, batch_size=2000)
+
+
+def install_index(apps, schema_editor):
+    # adding fields rebuilds the table on SQLite, which drops its triggers
+    search.install_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0011_songsearchdocument"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="songsearchdocument",
+            name="artists",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="songsearchdocument",
+            name="tags",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="songsearchdocument",
+            name="works",
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(install_index, migrations.RunPython.noop),
+        migrations.RunPython(update_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# indexes on the ordering keys of the songs, artists and works lists, so that
+# pages can be fetched by keyset without sorting the whole tables
+INDEXES = (
+    ("library_song_title_lower_id", "library_song", "LOWER(title), id"),
+    ("library_artist_name_lower_id", "library_artist", "LOWER(name), id"),
+    (
+        "library_work_title_lower_subtitle_lower_id",
+        "library_work",
+        "LOWER(title), LOWER(subtitle), id",
+    ),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in ("sqlite", "postgresql"):
+        return
+
+    for name, table, columns in INDEXES:
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(name, table, columns)
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in ("sqlite", "postgresql"):
+        return
+
+    for name, _, _ in INDEXES:
+        schema_editor.execute("DROP INDEX IF EXISTS {}".format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("library", "0012_songsearchdocument_fields")]
+
+    operations = [migrations.RunPython(create_indexes, drop_indexes)]
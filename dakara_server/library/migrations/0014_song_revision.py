@@ -0,0 +1,60 @@
+# Generated by Django 2.2.28 on 2026-10-16 20:33
+
+from django.db import migrations, models
+
+
+def set_initial_revision(apps, schema_editor):
+    """Put existing songs in the first revision of the library
+    """
+    Song = apps.get_model("library", "Song")
+    LibraryRevision = apps.get_model("library", "LibraryRevision")
+
+    Song.objects.update(revision=1)
+    LibraryRevision.objects.create(pk=1, value=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0013_ordering_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LibraryRevision",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="SongTombstone",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("song_id", models.IntegerField()),
+                ("revision", models.BigIntegerField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="song",
+            name="revision",
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(set_initial_revision, migrations.RunPython.noop),
+    ]
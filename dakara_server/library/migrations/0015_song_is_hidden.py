@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-16 20:47
+
+from django.db import migrations, models
+
+
+def set_initial_hidden(apps, schema_editor):
+    """Hide existing songs having a disabled tag
+    """
+    Song = apps.get_model("library", "Song")
+
+    Song.objects.filter(tags__disabled=True).update(is_hidden=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0014_song_revision"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="song",
+            name="is_hidden",
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(set_initial_hidden, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 2.2.28 on 2026-10-16 20:51
+
+from django.db import migrations
+import internal.fields
+
+# folded fields to fill, by model
+FOLDED_FIELDS = (
+    ("Artist", "name_folded"),
+    ("Song", "title_folded"),
+    ("Work", "title_folded"),
+    ("WorkAlternativeTitle", "title_folded"),
+)
+
+# indexes on the former ordering keys of the songs, artists and works lists,
+# replaced by the indexes of the folded fields
+LOWER_INDEXES = (
+    ("library_song_title_lower_id", "library_song", "LOWER(title), id"),
+    ("library_artist_name_lower_id", "library_artist", "LOWER(name), id"),
+    (
+        "library_work_title_lower_subtitle_lower_id",
+        "library_work",
+        "LOWER(title), LOWER(subtitle), id",
+    ),
+)
+
+
+def fill_folded_fields(apps, schema_editor):
+    """Fold the values of existing objects
+    """
+    for model_name, field_name in FOLDED_FIELDS:
+        model = apps.get_model("library", model_name)
+        field = model._meta.get_field(field_name)
+
+        objects = list(model.objects.only("pk", field.source))
+        for obj in objects:
+            field.pre_save(obj, False)
+
+        model.objects.bulk_update(objects, [field_name], batch_size=500)
+
+
+def drop_lower_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in ("sqlite", "postgresql"):
+        return
+
+    for name, _, _ in LOWER_INDEXES:
+        schema_editor.execute("DROP INDEX IF EXISTS {}".format(name))
+
+
+def create_lower_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in ("sqlite", "postgresql"):
+        return
+
+    for name, table, columns in LOWER_INDEXES:
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(name, table, columns)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0015_song_is_hidden"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="artist",
+            name="name_folded",
+            field=internal.fields.FoldedCharField(
+                db_index=True, default="", editable=False, max_length=255, source="name"
+            ),
+        ),
+        migrations.AddField(
+            model_name="song",
+            name="title_folded",
+            field=internal.fields.FoldedCharField(
+                db_index=True,
+                default="",
+                editable=False,
+                max_length=255,
+                source="title",
+            ),
+        ),
+        migrations.AddField(
+            model_name="work",
+            name="title_folded",
+            field=internal.fields.FoldedCharField(
+                db_index=True,
+                default="",
+                editable=False,
+                max_length=255,
+                source="title",
+            ),
+        ),
+        migrations.AddField(
+            model_name="workalternativetitle",
+            name="title_folded",
+            field=internal.fields.FoldedCharField(
+                db_index=True,
+                default="",
+                editable=False,
+                max_length=255,
+                source="title",
+            ),
+        ),
+        migrations.RunPython(fill_folded_fields, migrations.RunPython.noop),
+        migrations.RunPython(drop_lower_indexes, create_lower_indexes),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# index on the ordering keys of the works list, the subtitle is not folded so
+# its lowered value is indexed along with the folded title
+INDEXES = (
+    (
+        "library_work_title_folded_subtitle_lower_id",
+        "library_work",
+        "title_folded, LOWER(subtitle), id",
+    ),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in ("sqlite", "postgresql"):
+        return
+
+    for name, table, columns in INDEXES:
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(name, table, columns)
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in ("sqlite", "postgresql"):
+        return
+
+    for name, _, _ in INDEXES:
+        schema_editor.execute("DROP INDEX IF EXISTS {}".format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("library", "0016_folded_fields")]
+
+    operations = [migrations.RunPython(create_indexes, drop_indexes)]
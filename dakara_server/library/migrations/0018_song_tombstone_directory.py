@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-16 22:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0017_work_ordering_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="songtombstone",
+            name="directory",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="songtombstone",
+            name="moved",
+            field=models.BooleanField(default=False),
+        ),
+    ]
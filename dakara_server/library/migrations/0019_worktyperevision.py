@@ -0,0 +1,28 @@
+# Generated by Django 2.2.28 on 2026-10-16 22:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0018_song_tombstone_directory"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WorkTypeRevision",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("value", models.CharField(max_length=32)),
+            ],
+        ),
+    ]
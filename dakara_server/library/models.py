@@ -1,14 +1,43 @@
+import threading
+from contextlib import contextmanager
 from datetime import timedelta
+from uuid import uuid4
 
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MaxValueValidator, MinValueValidator
 
+from internal.fields import FoldedCharField
+
+
+class SongQuerySet(models.QuerySet):
+    """Query set of songs
+    """
+
+    def refresh_hidden(self):
+        """Recompute in bulk if the songs are hidden
+
+        A song is hidden if it has at least one disabled tag.
+
+        Returns:
+            int: amount of songs recomputed.
+        """
+        return self.update(
+            is_hidden=models.Exists(
+                Song.tags.through.objects.filter(
+                    song_id=models.OuterRef("pk"), songtag__disabled=True
+                )
+            )
+        )
+
 
 class Song(models.Model):
     """Song object
     """
 
+    objects = SongQuerySet.as_manager()
+
     title = models.CharField(max_length=255)
+    title_folded = FoldedCharField(source="title")
     filename = models.CharField(max_length=255)
     directory = models.CharField(max_length=255, blank=True)
     duration = models.DurationField(default=timedelta(0))
@@ -22,16 +51,270 @@ class Song(models.Model):
     has_instrumental = models.BooleanField(default=False)
     date_created = models.DateTimeField(auto_now_add=True)
     date_updated = models.DateTimeField(auto_now=True)
+    # revision of the library when the song was last saved
+    revision = models.BigIntegerField(default=0, db_index=True)
+    # if the song has a disabled tag, kept up to date by signals
+    is_hidden = models.BooleanField(default=False, db_index=True)
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        song = super().from_db(db, field_names, values)
+
+        # directory of the song in database, to know if the song is moved
+        song.directory_saved = song.__dict__.get("directory")
+
+        return song
+
+    def save(self, *args, **kwargs):
+        # the library revision is incremented before the song is written, and
+        # stays locked until both are committed, so that the revision is not
+        # read before the song is visible
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+        self.directory_saved = self.directory
+
+
+class RevisionBatch(threading.local):
+    """Changes of the library sharing the same revision
+
+    Attributes:
+        value (int): revision of the batch, None if no batch is in progress.
+        tombstones (list): tombstones of songs deleted or moved within the
+            batch, without revision.
+    """
+
+    def __init__(self):
+        self.value = None
+        self.tombstones = []
+
+
+revision_batch = RevisionBatch()
+
+
+class SongTombstoneManager(models.Manager):
+    """Manager of song tombstone objects
+    """
+
+    def create_for_songs(self, songs, moved=False):
+        """Mark songs as deleted in the current library revision
+
+        If called within a batch of changes, the tombstones are created at the
+        end of the batch.
+
+        Args:
+            songs (list): tuples of ID and directory of the deleted songs.
+            moved (bool): the songs are not deleted but moved out of the
+                given directories.
+        """
+        if not songs:
+            return
+
+        tombstones = [
+            self.model(song_id=song_id, directory=directory, moved=moved)
+            for song_id, directory in songs
+        ]
+
+        if revision_batch.value is not None:
+            revision_batch.tombstones.extend(tombstones)
+            return
+
+        with transaction.atomic():
+            revision = LibraryRevision.objects.increment()
+            for tombstone in tombstones:
+                tombstone.revision = revision
+
+            self.bulk_create(tombstones)
+
+
+class SongTombstone(models.Model):
+    """Trace of a deleted song
+
+    It allows the feeder to know which songs were deleted since a revision of
+    the library, and the hashes of directories to be updated incrementally.
+    Songs moved to another directory leave a tombstone in their previous
+    directory as well, which is not a deletion.
+    """
+
+    objects = SongTombstoneManager()
+
+    song_id = models.IntegerField()
+    # revision of the library when the song was deleted
+    revision = models.BigIntegerField(db_index=True)
+    # directory the song was removed from
+    directory = models.CharField(max_length=255, blank=True)
+    # if the song was only moved to another directory
+    moved = models.BooleanField(default=False)
+
+    def __str__(self):
+        return "Tombstone of song {}".format(self.song_id)
+
+
+class LibraryRevisionManager(models.Manager):
+    """Manager of library revision objects
+
+    Only one library revision object can exist.
+    """
+
+    def get_object(self):
+        """Get the library revision
+        """
+        library_revision, _ = self.get_or_create(pk=1)
+        return library_revision
+
+    def get_committed_value(self):
+        """Get the value of the library revision once changes are committed
+
+        Changes lock the library revision until they are committed. Reading
+        it with a lock waits for changes in progress, so that all the songs
+        and tombstones up to the returned revision are visible.
+
+        Returns:
+            int: value of the library revision.
+        """
+        with transaction.atomic():
+            library_revision, _ = self.select_for_update().get_or_create(pk=1)
+
+        return library_revision.value
+
+    def increment(self):
+        """Increment the library revision
+
+        If called within a batch of changes, the revision of the batch is
+        given instead.
+
+        Returns:
+            int: new value of the library revision.
+        """
+        if revision_batch.value is not None:
+            return revision_batch.value
+
+        # the row is locked until the end of the transaction, so that
+        # concurrent changes get distinct values
+        with transaction.atomic():
+            library_revision, _ = self.select_for_update().get_or_create(pk=1)
+            library_revision.value += 1
+            library_revision.save()
+
+        return library_revision.value
+
+    @contextmanager
+    def batch(self):
+        """Context manager to make all changes share the same revision
+
+        The library revision is incremented once when entering the outermost
+        context. Tombstones of songs deleted or moved within the context are
+        created in bulk when it exits without error.
+
+        Yields:
+            int: revision of the changes.
+        """
+        if revision_batch.value is not None:
+            yield revision_batch.value
+            return
+
+        # the library revision stays locked until the changes are committed
+        with transaction.atomic():
+            revision = self.increment()
+            revision_batch.value = revision
+            try:
+                yield revision
+                tombstones = revision_batch.tombstones
+
+            finally:
+                revision_batch.value = None
+                revision_batch.tombstones = []
+
+            for tombstone in tombstones:
+                tombstone.revision = revision
+
+            SongTombstone.objects.bulk_create(tombstones)
+
+
+class LibraryRevision(models.Model):
+    """Revision of the library
+
+    It is incremented each time a song is saved or deleted.
+    """
+
+    objects = LibraryRevisionManager()
+
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return "Library revision {}".format(self.value)
+
+
+class WorkTypeRevisionManager(models.Manager):
+    """Manager of work type revision objects
+
+    Only one work type revision object can exist.
+    """
+
+    def get_value(self):
+        """Get the value of the work type revision
+
+        Returns:
+            str: value of the work type revision.
+        """
+        work_type_revision, _ = self.get_or_create(
+            pk=1, defaults={"value": uuid4().hex}
+        )
+        return work_type_revision.value
+
+    def renew(self):
+        """Give a new value to the work type revision
+        """
+        self.update_or_create(pk=1, defaults={"value": uuid4().hex})
+
+
+class WorkTypeRevision(models.Model):
+    """Revision of the work types
+
+    It is given a new random value each time work types change, so that each
+    process knows when to create its query parser again.
+    """
+
+    objects = WorkTypeRevisionManager()
+
+    value = models.CharField(max_length=32)
+
+    def __str__(self):
+        return "Work type revision {}".format(self.value)
+
+
+class SongSearchDocument(models.Model):
+    """Text of a song and its related objects used for search
+
+    It flattens the song and its related objects, so that searches do not have
+    to join them. The document field is full text indexed. Search documents
+    are kept in sync by the signals of `library.signals`.
+    """
+
+    song = models.OneToOneField(
+        Song,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document",
+    )
+    document = models.TextField(blank=True)
+    artists = models.TextField(blank=True)
+    works = models.TextField(blank=True)
+    tags = models.TextField(blank=True)
+
+    def __str__(self):
+        return "Search document of {}".format(self.song)
+
 
 class Artist(models.Model):
     """Artist object
     """
 
     name = models.CharField(max_length=255)
+    name_folded = FoldedCharField(source="name")
 
     def __str__(self):
         return self.name
@@ -44,6 +327,7 @@ class Work(models.Model):
     """
 
     title = models.CharField(max_length=255)
+    title_folded = FoldedCharField(source="title")
     subtitle = models.CharField(max_length=255, blank=True)
     work_type = models.ForeignKey("WorkType", on_delete=models.CASCADE)
 
@@ -56,6 +340,7 @@ class WorkAlternativeTitle(models.Model):
     """
 
     title = models.CharField(max_length=255)
+    title_folded = FoldedCharField(source="title")
     work = models.ForeignKey(
         Work,
         on_delete=models.CASCADE,
@@ -110,10 +395,7 @@ class SongWorkLink(models.Model):
         return "{} <{}> {}".format(self.song, self.link_type, self.work)
 
     def __hash__(self):
-        fields = frozenset(
-            (self.song.pk, self.work.pk, self.link_type, self.link_type_number)
-        )
-        return hash(fields)
+        return hash((self.song_id, self.work_id, self.link_type, self.link_type_number))
 
     def __eq__(self, other):
         return self.__hash__() == other.__hash__()
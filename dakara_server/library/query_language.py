@@ -1,9 +1,12 @@
 import re
 
-from library.models import WorkType
+from library.models import WorkType, WorkTypeRevision
 
 KEYWORDS = ["artist", "work", "title"]
 
+# parser of the process and the revision of the work types it was created for
+cached_parser = (None, None)
+
 
 class QueryLanguageParser:
     """Parser for search query mini language used to search song
@@ -161,3 +164,34 @@ class QueryLanguageParser:
                     result["tag"].append(item_clean.upper())
 
         return result
+
+
+def get_parser():
+    """Get a parser for the current work types
+
+    The parser is created once per process and per revision of the work types,
+    as creating it requires to query the work types and to compile the
+    language regex. The revision is stored in database, so that changes made
+    by other processes, like management commands, are noticed.
+
+    Returns:
+        QueryLanguageParser: parser.
+    """
+    global cached_parser
+
+    revision = WorkTypeRevision.objects.get_value()
+    parser_revision, parser = cached_parser
+
+    if parser is None or parser_revision != revision:
+        parser = QueryLanguageParser()
+        cached_parser = (revision, parser)
+
+    return parser
+
+
+def invalidate_parser():
+    """Request the parsers to be created again
+
+    To call when the work types change, once the changes are written.
+    """
+    WorkTypeRevision.objects.renew()
@@ -0,0 +1,443 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.db.models import Case, Expression, IntegerField, Q, Value, When
+from django.db.utils import OperationalError
+
+from internal.fields import fold
+from library.models import Song, SongSearchDocument
+
+# separator of the different texts of a search document
+# it cannot be part of a search term, so a term cannot match across two texts
+SEPARATOR = "\n"
+
+# minimal length of a term to be searched in the SQLite full text index, as the
+# trigram tokenizer cannot match shorter terms
+TRIGRAM_LENGTH = 3
+
+SQLITE_FTS_TABLE = "library_songsearchdocument_fts"
+
+SQLITE_FTS_STATEMENTS = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS library_songsearchdocument_fts
+    USING fts5(
+        document,
+        content='library_songsearchdocument',
+        content_rowid='song_id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS library_songsearchdocument_fts_insert
+    AFTER INSERT ON library_songsearchdocument BEGIN
+        INSERT INTO library_songsearchdocument_fts(rowid, document)
+        VALUES (new.song_id, new.document);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS library_songsearchdocument_fts_delete
+    AFTER DELETE ON library_songsearchdocument BEGIN
+        INSERT INTO library_songsearchdocument_fts(
+            library_songsearchdocument_fts, rowid, document
+        )
+        VALUES ('delete', old.song_id, old.document);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS library_songsearchdocument_fts_update
+    AFTER UPDATE ON library_songsearchdocument BEGIN
+        INSERT INTO library_songsearchdocument_fts(
+            library_songsearchdocument_fts, rowid, document
+        )
+        VALUES ('delete', old.song_id, old.document);
+        INSERT INTO library_songsearchdocument_fts(rowid, document)
+        VALUES (new.song_id, new.document);
+    END
+    """,
+    """
+    INSERT INTO library_songsearchdocument_fts(library_songsearchdocument_fts)
+    VALUES ('rebuild')
+    """,
+)
+
+SQLITE_FTS_DROP_STATEMENTS = (
+    "DROP TRIGGER IF EXISTS library_songsearchdocument_fts_insert",
+    "DROP TRIGGER IF EXISTS library_songsearchdocument_fts_delete",
+    "DROP TRIGGER IF EXISTS library_songsearchdocument_fts_update",
+    "DROP TABLE IF EXISTS library_songsearchdocument_fts",
+)
+
+# the index is created on the uppercased document, as it is how Django
+# performs the `icontains` lookup on PostgreSQL
+POSTGRESQL_INDEX_STATEMENTS = (
+    """
+    CREATE INDEX IF NOT EXISTS library_songsearchdocument_document_trgm
+    ON library_songsearchdocument
+    USING gin (UPPER(document) gin_trgm_ops)
+    """,
+)
+
+POSTGRESQL_INDEX_DROP_STATEMENTS = (
+    "DROP INDEX IF EXISTS library_songsearchdocument_document_trgm",
+)
+
+# cache of the availability of the SQLite full text index per database alias
+sqlite_fts_available = {}
+
+
+def install_index(schema_editor):
+    """Create the full text index of the search documents
+
+    The function is idempotent and can be called again after the search
+    document table has been rebuilt, which drops its triggers on SQLite. If
+    the SQLite library does not support the FTS5 trigram tokenizer, no index is
+    created and searches fall back to a scan of the search documents. On
+    PostgreSQL, the `pg_trgm` extension must already be installed.
+
+    Args:
+        schema_editor (django.db.backends.base.schema.BaseDatabaseSchemaEditor):
+            schema editor of the migration.
+    """
+    vendor = schema_editor.connection.vendor
+
+    if vendor == "sqlite":
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                for statement in SQLITE_FTS_STATEMENTS:
+                    schema_editor.execute(statement)
+
+        except OperationalError:
+            pass
+
+        sqlite_fts_available.pop(schema_editor.connection.alias, None)
+        return
+
+    if vendor == "postgresql":
+        for statement in POSTGRESQL_INDEX_STATEMENTS:
+            schema_editor.execute(statement)
+
+
+def uninstall_index(schema_editor):
+    """Remove the full text index of the search documents
+
+    Args:
+        schema_editor (django.db.backends.base.schema.BaseDatabaseSchemaEditor):
+            schema editor of the migration.
+    """
+    vendor = schema_editor.connection.vendor
+
+    if vendor == "sqlite":
+        for statement in SQLITE_FTS_DROP_STATEMENTS:
+            schema_editor.execute(statement)
+
+        sqlite_fts_available.pop(schema_editor.connection.alias, None)
+        return
+
+    if vendor == "postgresql":
+        for statement in POSTGRESQL_INDEX_DROP_STATEMENTS:
+            schema_editor.execute(statement)
+
+
+def is_sqlite_fts_available():
+    """Tell if the SQLite full text index can be used
+    """
+    if connection.vendor != "sqlite":
+        return False
+
+    if connection.alias not in sqlite_fts_available:
+        with connection.cursor() as cursor:
+            tables = connection.introspection.table_names(cursor)
+
+        sqlite_fts_available[connection.alias] = SQLITE_FTS_TABLE in tables
+
+    return sqlite_fts_available[connection.alias]
+
+
+def normalize(text):
+    """Normalize a text for search
+
+    The text is case folded and its accents are removed.
+
+    Args:
+        text (str): text to normalize.
+
+    Returns:
+        str: normalized text.
+    """
+    return fold(text)
+
+
+def join_lines(texts):
+    """Join texts in a field of a search document
+
+    Each text is surrounded by separators, so that a text can be exactly
+    matched with `contains_exact`.
+
+    Args:
+        texts (iterable): texts to join.
+
+    Returns:
+        str: joined texts.
+    """
+    texts = [text for text in texts if text]
+    if not texts:
+        return ""
+
+    return SEPARATOR + SEPARATOR.join(texts) + SEPARATOR
+
+
+def contains_exact(text):
+    """Give the pattern to exactly match a text of a search document field
+
+    Args:
+        text (str): text to match.
+
+    Returns:
+        str: pattern to use with the `contains` lookup.
+    """
+    return SEPARATOR + text + SEPARATOR
+
+
+class FullTextMatch(Expression):
+    """Subquery giving the IDs of the songs matching the SQLite full text index
+
+    The expression is meant to be used on the right of the `in` lookup, which
+    puts it in parentheses.
+
+    Args:
+        match (str): full text query to match.
+    """
+
+    def __init__(self, match):
+        super().__init__(output_field=IntegerField())
+        self.match = match
+
+    def as_sql(self, compiler, connection):
+        return (
+            "SELECT rowid FROM {table} WHERE {table} MATCH %s".format(
+                table=SQLITE_FTS_TABLE
+            ),
+            [self.match],
+        )
+
+
+def filter_containing(query_set, term):
+    """Filter songs whose search document contains a term
+
+    Args:
+        query_set (django.db.models.QuerySet): songs to filter.
+        term (str): term to search, case and accent insensitively.
+
+    Returns:
+        django.db.models.QuerySet: filtered songs.
+    """
+    term = normalize(term)
+
+    if len(term) >= TRIGRAM_LENGTH and is_sqlite_fts_available():
+        # the term is passed as a quoted string so that it is matched as a
+        # whole by the trigram tokenizer
+        return query_set.filter(
+            pk__in=FullTextMatch('"{}"'.format(term.replace('"', '""')))
+        )
+
+    return query_set.filter(search_document__document__icontains=term)
+
+
+def get_relevance(term):
+    """Create the expression giving the relevance of songs for a term
+
+    From the most relevant to the least relevant, the term is the title of
+    the song, the beginning of its title, in its artists names, in its works
+    titles, or in its details.
+
+    Args:
+        term (str): term to rank songs with, case and accent insensitively.
+
+    Returns:
+        django.db.models.Case: expression giving the relevance of each song,
+        from 5 to 0.
+    """
+    term = normalize(term)
+
+    return Case(
+        When(title_folded=term, then=Value(5)),
+        When(title_folded__startswith=term, then=Value(4)),
+        When(search_document__artists__contains=term, then=Value(3)),
+        When(search_document__works__contains=term, then=Value(2)),
+        When(
+            Q(detail__icontains=term) | Q(detail_video__icontains=term), then=Value(1),
+        ),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def build_document(song):
+    """Create the search document of a song
+
+    Args:
+        song (library.models.Song): song to index. Its artists, tags and work
+            links should be prefetched for better performances.
+
+    Returns:
+        dict: values of the fields of the search document. The field
+        `document` contains all the texts related to the song, the fields
+        `artists` and `works` contain respectively the artists names and the
+        works titles (including alternative titles), and the field `tags`
+        contains the tags names. All texts but tags names are normalized.
+    """
+    artists = [normalize(artist.name) for artist in song.artists.all()]
+    works = []
+    for songworklink in song.songworklink_set.all():
+        works.append(normalize(songworklink.work.title))
+        works.extend(
+            normalize(alternative_title.title)
+            for alternative_title in songworklink.work.alternative_titles.all()
+        )
+
+    texts = [
+        normalize(text)
+        for text in (song.title, song.version, song.detail, song.detail_video)
+    ]
+    texts.extend(artists)
+    texts.extend(works)
+
+    return {
+        "document": SEPARATOR.join(text for text in texts if text),
+        "artists": join_lines(artists),
+        "works": join_lines(works),
+        "tags": join_lines(tag.name for tag in song.tags.all()),
+    }
+
+
+class DeferredRefresh(threading.local):
+    """Songs whose search document refresh is deferred
+
+    Attributes:
+        depth (int): number of nested `deferred_refresh` contexts.
+        song_ids (set): IDs of songs to refresh.
+        created_song_ids (set): IDs of songs whose search document can be
+            created.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.song_ids = set()
+        self.created_song_ids = set()
+
+
+deferred = DeferredRefresh()
+
+
+@contextmanager
+def deferred_refresh():
+    """Context manager to refresh search documents only once on exit
+
+    Within the context, calls to `refresh` only record the songs to refresh.
+    They are refreshed in bulk when the outermost context exits without
+    error.
+    """
+    deferred.depth += 1
+    try:
+        yield
+
+    except BaseException:
+        if deferred.depth == 1:
+            deferred.song_ids.clear()
+            deferred.created_song_ids.clear()
+
+        raise
+
+    finally:
+        deferred.depth -= 1
+
+    if deferred.depth > 0:
+        return
+
+    song_ids = deferred.song_ids
+    created_song_ids = deferred.created_song_ids
+    deferred.song_ids = set()
+    deferred.created_song_ids = set()
+    refresh_now(song_ids, created_song_ids)
+
+
+def refresh(song_ids, create=False):
+    """Update the search documents of songs
+
+    If called within a `deferred_refresh` context, the update is postponed to
+    the exit of the context.
+
+    Args:
+        song_ids (iterable): IDs of the songs to update.
+        create (bool): if true, create the missing search documents. Otherwise,
+            only existing documents are updated, which prevents to index songs
+            being deleted.
+    """
+    song_ids = set(song_ids)
+
+    if deferred.depth > 0:
+        deferred.song_ids.update(song_ids)
+        if create:
+            deferred.created_song_ids.update(song_ids)
+
+        return
+
+    refresh_now(song_ids, song_ids if create else ())
+
+
+def refresh_now(song_ids, created_song_ids=()):
+    """Update the search documents of songs in bulk
+
+    Songs are processed by chunks, so that they are not all loaded in memory
+    at once and the amount of query parameters stays bounded.
+
+    Args:
+        song_ids (set): IDs of the songs to update.
+        created_song_ids (set): IDs of the songs whose search document can be
+            created if missing.
+    """
+    # imported here as the bulk module depends on this module
+    from library.bulk import chunks
+
+    for chunk in chunks(sorted(song_ids)):
+        refresh_chunk(chunk, created_song_ids)
+
+
+def refresh_chunk(song_ids, created_song_ids):
+    """Update the search documents of a chunk of songs in bulk
+
+    Args:
+        song_ids (list): IDs of the songs to update.
+        created_song_ids (set): IDs of the songs whose search document can be
+            created if missing.
+    """
+    songs = Song.objects.filter(pk__in=song_ids).prefetch_related(
+        "artists", "tags", "songworklink_set__work__alternative_titles"
+    )
+    documents = {
+        document.pk: document
+        for document in SongSearchDocument.objects.filter(song_id__in=song_ids)
+    }
+
+    documents_to_create = []
+    documents_to_update = []
+    for song in songs:
+        values = build_document(song)
+        document = documents.get(song.pk)
+
+        if document is None:
+            if song.pk in created_song_ids:
+                documents_to_create.append(SongSearchDocument(song=song, **values))
+
+            continue
+
+        for field, value in values.items():
+            setattr(document, field, value)
+
+        documents_to_update.append(document)
+
+    SongSearchDocument.objects.bulk_create(documents_to_create)
+    SongSearchDocument.objects.bulk_update(
+        documents_to_update, ["document", "artists", "works", "tags"]
+    )
@@ -1,7 +1,10 @@
 import os
 
+from django.db.models import Prefetch
 from rest_framework import serializers
 
+from library import bulk, search
+
 from library.models import (
     Song,
     Artist,
@@ -23,6 +26,26 @@ class SecondsDurationField(serializers.DurationField):
         return int(round(value.total_seconds()))
 
 
+def get_songworklink_prefetch(prefix=""):
+    """Get the lookup to prefetch the work links of songs
+
+    The works are fetched with their work type and their alternative titles.
+
+    Args:
+        prefix (str): path from the serialized objects to the songs, ending
+            with "__". Empty if the serialized objects are songs.
+
+    Returns:
+        django.db.models.Prefetch: lookup to give to `prefetch_related`.
+    """
+    return Prefetch(
+        prefix + "songworklink_set",
+        queryset=SongWorkLink.objects.select_related(
+            "work__work_type"
+        ).prefetch_related("work__alternative_titles"),
+    )
+
+
 class ArtistSerializer(serializers.ModelSerializer):
     """Artist serializer
 
@@ -50,7 +73,12 @@ class ArtistWithCountSerializer(serializers.ModelSerializer):
     @staticmethod
     def get_song_count(artist):
         """Count the amount of songs associated to the artist
+
+        The count is preferably annotated by the view.
         """
+        if hasattr(artist, "song_count"):
+            return artist.song_count
+
         return Song.objects.filter(artists=artist).count()
 
 
@@ -112,7 +140,12 @@ class WorkSerializer(serializers.ModelSerializer):
     @staticmethod
     def get_song_count(work):
         """Count the amount of songs associated to the work
+
+        The count is preferably annotated by the view.
         """
+        if hasattr(work, "song_count"):
+            return work.song_count
+
         return Song.objects.filter(works=work).count()
 
 
@@ -168,6 +201,23 @@ class SongSerializer(serializers.ModelSerializer):
         )
         extra_kwargs = {"lyrics": {"write_only": True}}
 
+    @staticmethod
+    def get_prefetch_lookups(prefix=""):
+        """Get the lookups to prefetch the nested relations of songs
+
+        Args:
+            prefix (str): path from the serialized objects to the songs, ending
+                with "__". Empty if the serialized objects are songs.
+
+        Returns:
+            list: lookups to give to `prefetch_related`.
+        """
+        return [
+            prefix + "artists",
+            prefix + "tags",
+            get_songworklink_prefetch(prefix),
+        ]
+
     @staticmethod
     def get_lyrics_preview(song, max_lines=5):
         """Get an extract of the lyrics
@@ -187,98 +237,91 @@ class SongSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         """Create the Song instance
         """
-        # create vanilla song
-        artists_data = validated_data.pop("artists", [])
-        tags_data = validated_data.pop("tags", [])
-        songworklinks_data = validated_data.pop("songworklink_set", [])
-        song = Song.objects.create(**validated_data)
-
-        # create artists and add them
-        for artist_data in artists_data:
-            artist, _ = Artist.objects.get_or_create(**artist_data)
-            song.artists.add(artist)
-
-        # create tags and add them
-        for tag_data in tags_data:
-            tag, _ = SongTag.objects.get_or_create(**tag_data)
-            song.tags.add(tag)
-
-        # create works and add them
-        for songworklink_data in songworklinks_data:
-            work_data = songworklink_data.pop("work")
-            work_type_data = work_data.pop("work_type")
-
-            # create work type
-            work_type, _ = WorkType.objects.get_or_create(
-                query_name=work_type_data["query_name"],
-                # TODO add defaults
-            )
-
-            # create work
-            work, _ = Work.objects.get_or_create(
-                title=work_data["title"],
-                subtitle=work_data.get("subtitle", ""),
-                work_type=work_type,
-            )
-
-            # create work link
-            SongWorkLink.objects.create(**songworklink_data, song=song, work=work)
-
-        return song
+        # refresh the search document once all relations are set
+        with search.deferred_refresh():
+            # create vanilla song
+            artists_data = validated_data.pop("artists", [])
+            tags_data = validated_data.pop("tags", [])
+            songworklinks_data = validated_data.pop("songworklink_set", [])
+            song = Song.objects.create(**validated_data)
+
+            # create artists and add them
+            for artist_data in artists_data:
+                artist, _ = Artist.objects.get_or_create(**artist_data)
+                song.artists.add(artist)
+
+            # create tags and add them
+            for tag_data in tags_data:
+                tag, _ = SongTag.objects.get_or_create(**tag_data)
+                song.tags.add(tag)
+
+            # create works and add them
+            for songworklink_data in songworklinks_data:
+                work_data = songworklink_data.pop("work")
+                work_type_data = work_data.pop("work_type")
+
+                # create work type
+                work_type, _ = WorkType.objects.get_or_create(
+                    query_name=work_type_data["query_name"],
+                    # TODO add defaults
+                )
+
+                # create work
+                work, _ = Work.objects.get_or_create(
+                    title=work_data["title"],
+                    subtitle=work_data.get("subtitle", ""),
+                    work_type=work_type,
+                )
+
+                # create work link
+                SongWorkLink.objects.create(**songworklink_data, song=song, work=work)
+
+            return song
 
     def update(self, song, validated_data):
         """Update the Song instance
+
+        Related objects are resolved in bulk and only the differences with the
+        current relations are applied. The song is not saved if neither its
+        fields nor its relations changed.
         """
-        # create vanilla song
-        artists_data = validated_data.pop("artists", [])
-        tags_data = validated_data.pop("tags", [])
-        songworklinks_data = validated_data.pop("songworklink_set", [])
-        song = super().update(song, validated_data)
-
-        # create artists and add them
-        artists = [
-            Artist.objects.get_or_create(**artist_data)[0]
-            for artist_data in artists_data
-        ]
-        song.artists.set(artists)
-
-        # create tags and add them
-        tags = [SongTag.objects.get_or_create(**tag_data)[0] for tag_data in tags_data]
-        song.tags.set(tags)
-
-        # create works and add them
-        songworklinks_old = set(song.songworklink_set.all())
-        for songworklink_data in songworklinks_data:
-            work_data = songworklink_data.pop("work")
-            work_type_data = work_data.pop("work_type")
-
-            # create work type
-            work_type, _ = WorkType.objects.get_or_create(
-                query_name=work_type_data["query_name"],
-                # TODO add defaults
+        # refresh the search document once all relations are set
+        with search.deferred_refresh():
+            artists_data = validated_data.pop("artists", [])
+            tags_data = validated_data.pop("tags", [])
+            songworklinks_data = validated_data.pop("songworklink_set", [])
+
+            # update vanilla song
+            saved = False
+            if any(
+                getattr(song, field) != value for field, value in validated_data.items()
+            ):
+                song = super().update(song, validated_data)
+                saved = True
+
+            # get or create related objects
+            artists, tags, works = bulk.get_or_create_related(
+                artists_data, tags_data, songworklinks_data
             )
 
-            # create work
-            work, work_created = Work.objects.get_or_create(
-                title=work_data["title"],
-                subtitle=work_data.get("subtitle", ""),
-                work_type=work_type,
+            # set relations
+            changed_artists = bulk.set_relation(
+                song.artists,
+                [artists[artist_data["name"]] for artist_data in artists_data],
+            )
+            changed_tags = bulk.set_relation(
+                song.tags, [tags[tag_data["name"]] for tag_data in tags_data]
+            )
+            changed_songworklinks = bulk.set_songworklinks(
+                song, songworklinks_data, works
             )
-            songworklink = SongWorkLink(**songworklink_data, song=song, work=work)
-
-            # the link already exists
-            if not work_created and songworklink in songworklinks_old:
-                songworklinks_old.remove(songworklink)
-
-            # otherwise create work link
-            else:
-                songworklink.save()
 
-        # remove removed links
-        for songworklink_old in songworklinks_old:
-            songworklink_old.delete()
+            # mark the song as changed in the library if only its relations
+            # changed
+            if not saved and (changed_artists or changed_tags or changed_songworklinks):
+                song.save(update_fields=["date_updated", "revision"])
 
-        return song
+            return song
 
 
 class SongForPlayerSerializer(serializers.ModelSerializer):
@@ -295,6 +338,19 @@ class SongForPlayerSerializer(serializers.ModelSerializer):
         model = Song
         fields = ("title", "artists", "works", "file_path", "has_instrumental")
 
+    @staticmethod
+    def get_prefetch_lookups(prefix=""):
+        """Get the lookups to prefetch the nested relations of songs
+
+        Args:
+            prefix (str): path from the serialized objects to the songs, ending
+                with "__". Empty if the serialized objects are songs.
+
+        Returns:
+            list: lookups to give to `prefetch_related`.
+        """
+        return [prefix + "artists", get_songworklink_prefetch(prefix)]
+
     @staticmethod
     def get_file_path(song):
         """Add directory to song file name
@@ -309,3 +365,44 @@ class SongOnlyFilePathSerializer(serializers.ModelSerializer):
     class Meta:
         model = Song
         fields = ("id", "filename", "directory")
+
+
+class SongForFeederSerializer(SongSerializer):
+    """Song serializer for bulk changes by the feeder
+
+    The ID of the song can be given to update it.
+    """
+
+    id = serializers.IntegerField(required=False)
+
+
+class FeederBulkDeleteSerializer(serializers.Serializer):
+    """Songs to delete in bulk by the feeder
+    """
+
+    ids = serializers.ListField(child=serializers.IntegerField())
+
+
+class FeederChangesRequestSerializer(serializers.Serializer):
+    """Revision of the library known by the feeder
+    """
+
+    since = serializers.IntegerField(min_value=0)
+
+
+class FeederChangesSerializer(serializers.Serializer):
+    """Changes of the library since a revision for the feeder
+    """
+
+    revision = serializers.IntegerField(read_only=True)
+    songs = SongOnlyFilePathSerializer(many=True, read_only=True)
+    deleted = serializers.ListField(child=serializers.IntegerField(), read_only=True)
+
+
+class FeederDirectoriesSerializer(serializers.Serializer):
+    """Hashes of the directories of the library for the feeder
+    """
+
+    revision = serializers.IntegerField(read_only=True)
+    hash = serializers.CharField(read_only=True)
+    directories = serializers.DictField(child=serializers.CharField(), read_only=True)
@@ -0,0 +1,206 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import Signal, receiver
+
+from library import search
+from library.query_language import invalidate_parser
+from library.models import (
+    Artist,
+    LibraryRevision,
+    Song,
+    SongTag,
+    SongTombstone,
+    SongWorkLink,
+    Work,
+    WorkAlternativeTitle,
+    WorkType,
+)
+
+# sent when songs are updated in bulk, as no other signal is sent then
+songs_updated = Signal(providing_args=["songs", "fields"])
+
+
+@receiver(pre_save, sender=Song)
+def set_song_revision(sender, instance, **kwargs):
+    """Mark the song as changed in the current library revision
+
+    A song moved to another directory leaves a tombstone in its previous
+    directory, with the same revision.
+    """
+    directory_saved = getattr(instance, "directory_saved", None)
+    if directory_saved is None or directory_saved == instance.directory:
+        instance.revision = LibraryRevision.objects.increment()
+        return
+
+    with LibraryRevision.objects.batch() as revision:
+        instance.revision = revision
+        SongTombstone.objects.create_for_songs(
+            [(instance.pk, directory_saved)], moved=True
+        )
+
+
+@receiver(pre_save, sender=Song)
+def set_song_hidden(sender, instance, update_fields=None, **kwargs):
+    """Recompute if the song is hidden
+
+    The flag is changed by queries when tags change, so the value of the
+    instance may be outdated and must not be written back.
+    """
+    if instance.pk is None:
+        return
+
+    if update_fields is not None and "is_hidden" not in update_fields:
+        return
+
+    instance.is_hidden = Song.tags.through.objects.filter(
+        song_id=instance.pk, songtag__disabled=True
+    ).exists()
+
+
+@receiver(post_delete, sender=Song)
+def create_song_tombstone(sender, instance, **kwargs):
+    """Mark the song as deleted in the current library revision
+    """
+    SongTombstone.objects.create_for_songs([(instance.pk, instance.directory)])
+
+
+@receiver(post_save, sender=Song)
+def refresh_song_search_document(sender, instance, **kwargs):
+    """Index the song when it is created or modified
+    """
+    search.refresh([instance.pk], create=True)
+
+
+@receiver(m2m_changed, sender=Song.artists.through)
+@receiver(m2m_changed, sender=Song.tags.through)
+def refresh_relation_search_document(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """Index the songs whose artists or tags changed
+    """
+    # the reverse clear action does not give the affected songs
+    if action == "pre_clear":
+        if reverse:
+            instance._search_song_ids = list(
+                instance.song_set.values_list("pk", flat=True)
+            )
+
+        return
+
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        search.refresh([instance.pk])
+        return
+
+    if action == "post_clear":
+        search.refresh(getattr(instance, "_search_song_ids", []))
+        return
+
+    search.refresh(pk_set)
+
+
+@receiver(post_save, sender=SongWorkLink)
+@receiver(post_delete, sender=SongWorkLink)
+def refresh_songworklink_search_document(sender, instance, **kwargs):
+    """Index the song whose works changed
+    """
+    search.refresh([instance.song_id])
+
+
+@receiver(post_save, sender=Artist)
+@receiver(post_save, sender=SongTag)
+@receiver(post_save, sender=Work)
+def refresh_related_search_document(sender, instance, created, **kwargs):
+    """Index the songs of a modified artist, tag or work
+    """
+    if created:
+        return
+
+    search.refresh(instance.song_set.values_list("pk", flat=True))
+
+
+@receiver(pre_delete, sender=Artist)
+@receiver(pre_delete, sender=SongTag)
+def prepare_deleted_related_search_document(sender, instance, **kwargs):
+    """Remember the songs of an artist or a tag to delete
+
+    The links between songs and artists or tags are removed silently on
+    deletion.
+    """
+    instance._search_song_ids = list(instance.song_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Artist)
+@receiver(post_delete, sender=SongTag)
+def refresh_deleted_related_search_document(sender, instance, **kwargs):
+    """Index the songs of a deleted artist or tag
+    """
+    search.refresh(getattr(instance, "_search_song_ids", []))
+
+
+@receiver(post_save, sender=WorkAlternativeTitle)
+@receiver(post_delete, sender=WorkAlternativeTitle)
+def refresh_alternative_title_search_document(sender, instance, **kwargs):
+    """Index the songs of a work whose alternative titles changed
+    """
+    search.refresh(
+        SongWorkLink.objects.filter(work_id=instance.work_id).values_list(
+            "song_id", flat=True
+        )
+    )
+
+
+@receiver(post_save, sender=WorkType)
+@receiver(post_delete, sender=WorkType)
+def invalidate_work_type_parser(sender, **kwargs):
+    """Request the query language parser to consider modified work types
+    """
+    invalidate_parser()
+
+
+@receiver(post_save, sender=SongTag)
+def refresh_tag_hidden_songs(sender, instance, created, **kwargs):
+    """Recompute if the songs of a modified tag are hidden
+    """
+    if created:
+        return
+
+    Song.objects.filter(pk__in=instance.song_set.values("pk")).refresh_hidden()
+
+
+@receiver(post_delete, sender=SongTag)
+def refresh_deleted_tag_hidden_songs(sender, instance, **kwargs):
+    """Recompute if the songs of a deleted tag are hidden
+
+    The songs are remembered before deletion by
+    `prepare_deleted_related_search_document`.
+    """
+    Song.objects.filter(
+        pk__in=getattr(instance, "_search_song_ids", [])
+    ).refresh_hidden()
+
+
+@receiver(m2m_changed, sender=Song.tags.through)
+def refresh_song_hidden(sender, instance, action, reverse, pk_set, **kwargs):
+    """Recompute if the songs whose tags changed are hidden
+    """
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        Song.objects.filter(pk=instance.pk).refresh_hidden()
+        return
+
+    # the songs of the reverse clear action are remembered by
+    # `refresh_relation_search_document`
+    if action == "post_clear":
+        pk_set = getattr(instance, "_search_song_ids", [])
+
+    Song.objects.filter(pk__in=pk_set).refresh_hidden()
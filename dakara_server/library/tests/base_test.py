@@ -1,3 +1,5 @@
+from django.core.cache import cache
+
 from internal.tests.base_test import BaseProvider, BaseAPITestCase
 from library.models import (
     WorkType,
@@ -147,3 +149,9 @@ class LibraryProvider(BaseProvider):
 class LibraryAPITestCase(BaseAPITestCase, LibraryProvider):
     """Base library test class for Unittest
     """
+
+    def tearDown(self):
+        # Clear cache between tests, so that values cached by revision are not
+        # reused
+        cache.clear()
+        super().tearDown()
@@ -1,6 +1,9 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 
+from library.models import Artist
 from library.tests.base_test import LibraryAPITestCase
 
 
@@ -34,6 +37,49 @@ class ArtistListViewTestCase(LibraryAPITestCase):
         self.assertEqual(response.data["results"][0]["song_count"], 1)
         self.assertEqual(response.data["results"][1]["song_count"], 0)
 
+    def test_get_artist_list_cursor(self):
+        """Test to get artist list by keyset
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # Get first page of artists list
+        response = self.client.get(self.url, {"cursor": "", "page_size": 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.check_artist_json(response.data["results"][0], self.artist1)
+
+        # Get next page
+        response = self.client.get(response.data["pagination"]["next"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.check_artist_json(response.data["results"][0], self.artist2)
+        self.assertIsNone(response.data["pagination"]["next"])
+
+    def test_get_artist_list_queries(self):
+        """Test the amount of queries does not depend on the amount of artists
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # Get artists list
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # add more artists with songs
+        for index in range(3, 6):
+            artist = Artist.objects.create(name="Artist{}".format(index))
+            self.song1.artists.add(artist)
+
+        # Get artists list again
+        with self.assertNumQueries(len(context.captured_queries)):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 5)
+
     def test_get_artist_list_forbidden(self):
         """Test to verify unauthenticated user can't get artist list
         """
@@ -77,3 +77,43 @@ class CreatetagsCommandTestCase(TestCase):
         # Tag 2 was created
         self.assertEqual(tags[1].name, "TAGNAME2")
         self.assertEqual(tags[1].color_hue, 5)
+
+    def test_createtags_command_case_insensitive(self):
+        """Test create tags command matches existing tags case insensitively
+        """
+        # Create existing tag
+        tag1 = SongTag.objects.create(name="tagname1", color_hue=0)
+
+        config_file_path = os.path.join(
+            APP_DIR, RESSOURCES_DIR, "createtags_command_config.yaml"
+        )
+
+        # Call command
+        args = [config_file_path]
+        opts = {"quiet": True}
+        call_command("createtags", *args, **opts)
+
+        # Post-Assertions
+        tags = SongTag.objects.order_by("name")
+        self.assertEqual(len(tags), 2)
+        self.assertEqual(tags[0].name, "TAGNAME2")
+        self.assertEqual(tags[1].name, "tagname1")
+        self.assertEqual(tags[1].id, tag1.id)
+
+    def test_createtags_command_again(self):
+        """Test create tags command does not write when tags are up to date
+        """
+        config_file_path = os.path.join(
+            APP_DIR, RESSOURCES_DIR, "createtags_command_config.yaml"
+        )
+
+        # Call command
+        args = [config_file_path]
+        opts = {"quiet": True, "prune": True}
+        call_command("createtags", *args, **opts)
+
+        # Call command again, only the tags are loaded, within a savepoint
+        with self.assertNumQueries(3):
+            call_command("createtags", *args, **opts)
+
+        self.assertEqual(SongTag.objects.count(), 2)
@@ -1,10 +1,24 @@
 import os
+from types import SimpleNamespace
+from unittest.mock import patch
 
 from django.core.management import call_command
 from django.core.management.base import CommandError
 from django.test import TestCase
 
-from library.models import WorkType, Work
+from library.management.commands.createworks import (
+    WorkAlternativeTitleCreator,
+    WorkCreator,
+)
+from library.bulk import chunks
+from library.models import (
+    Song,
+    SongSearchDocument,
+    SongWorkLink,
+    WorkType,
+    Work,
+    WorkAlternativeTitle,
+)
 
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 RESSOURCES_DIR = os.path.join("tests_ressources", "work_files")
@@ -380,3 +394,286 @@ class CommandsTestCase(TestCase):
         self.assertEqual(works[2].subtitle, "Subtitle 1")
         self.assertEqual(works[2].work_type.query_name, "WorkType 1")
         self.assertEqual(works[2].alternative_titles.count(), 0)
+
+    def test_createworks_bulk(self):
+        """Test create works command in bulk mode
+        """
+        # Pre-assertions
+        self.assertEqual(WorkType.objects.count(), 1)
+        self.assertEqual(Work.objects.count(), 0)
+
+        # Call command
+        work_file = os.path.join(DIR_WORK_FILES, "correct_work_file.json")
+
+        args = [work_file]
+        opts = {"verbosity": 0, "bulk": True}
+        call_command("createworks", *args, **opts)
+
+        # Work assertions
+        works = Work.objects.order_by("title")
+
+        self.assertEqual(len(works), 3)
+
+        self.assertEqual(works[0].title, "Work 1")
+        self.assertEqual(works[0].subtitle, "Subtitle 1")
+        self.assertEqual(works[0].work_type.query_name, "WorkType 1")
+        self.assertCountEqual(
+            [alt.title for alt in works[0].alternative_titles.all()],
+            ["AltTitle 1", "AltTitle 2"],
+        )
+
+        self.assertEqual(works[1].title, "Work 2")
+        self.assertEqual(works[1].subtitle, "Subtitle 2")
+        self.assertEqual(works[1].alternative_titles.count(), 0)
+
+        self.assertEqual(works[2].title, "Work 3")
+        self.assertEqual(works[2].subtitle, "")
+        self.assertCountEqual(
+            [alt.title for alt in works[2].alternative_titles.all()],
+            ["AltTitle 1", "AltTitle 3"],
+        )
+
+        # Call the command a second time
+        call_command("createworks", *args, **opts)
+
+        # Check that it did not change the database
+        self.assertEqual(Work.objects.count(), 3)
+        self.assertEqual(WorkAlternativeTitle.objects.count(), 4)
+
+    def test_createworks_bulk_search_documents(self):
+        """Test create works command in bulk mode refreshes search documents
+
+        The songs of the works are searched by chunks.
+        """
+        # Create works with songs
+        work_type = WorkType.objects.get(query_name="WorkType 1")
+        song1 = Song.objects.create(title="Song1")
+        song3 = Song.objects.create(title="Song3")
+        work1 = Work.objects.create(
+            title="Work 1", subtitle="Subtitle 1", work_type=work_type
+        )
+        work3 = Work.objects.create(title="Work 3", work_type=work_type)
+        SongWorkLink.objects.create(song=song1, work=work1, link_type="OP")
+        SongWorkLink.objects.create(song=song3, work=work3, link_type="OP")
+
+        # Call command
+        work_file = os.path.join(DIR_WORK_FILES, "correct_work_file.json")
+
+        args = [work_file]
+        opts = {"verbosity": 0, "bulk": True}
+        with patch(
+            "library.management.commands.createworks.chunks",
+            side_effect=lambda items: chunks(items, 1),
+        ):
+            call_command("createworks", *args, **opts)
+
+        # Search documents assertions
+        self.assertIn("alttitle 2", SongSearchDocument.objects.get(song=song1).works)
+        self.assertIn("alttitle 3", SongSearchDocument.objects.get(song=song3).works)
+
+    def test_createworks_bulk_update_only(self):
+        """Test create works command in bulk mode with the update only option
+        """
+        # Create works
+        work_type = WorkType.objects.get(query_name="WorkType 1")
+        work = Work.objects.create(
+            title="Work 1", subtitle="Subtitle 1", work_type=work_type
+        )
+        WorkAlternativeTitle.objects.create(title="AltTitle 1", work=work)
+
+        # Call command
+        work_file = os.path.join(DIR_WORK_FILES, "correct_work_file.json")
+
+        args = [work_file]
+        opts = {"verbosity": 0, "bulk": True, "update_only": True}
+        call_command("createworks", *args, **opts)
+
+        # Work assertions
+        self.assertEqual(Work.objects.count(), 1)
+        self.assertCountEqual(
+            [alt.title for alt in work.alternative_titles.all()],
+            ["AltTitle 1", "AltTitle 2"],
+        )
+
+    def test_createworks_bulk_case_sensitive_work_file(self):
+        """Test createworks in bulk mode with case-sensitive differences
+        """
+        # Call command
+        work_file = os.path.join(DIR_WORK_FILES, "case_sensitive_work_file.json")
+
+        args = [work_file]
+        opts = {"verbosity": 0, "bulk": True}
+        call_command("createworks", *args, **opts)
+
+        # Work assertions
+        self.assertCountEqual(
+            Work.objects.values_list("title", "subtitle"),
+            [
+                ("Work 1", "Subtitle 1"),
+                ("Work 1", "subtitle 1"),
+                ("work 1", "Subtitle 1"),
+            ],
+        )
+
+    def test_createworks_stream(self):
+        """Test create works command in stream mode
+        """
+        # Call command
+        work_file = os.path.join(DIR_WORK_FILES, "correct_work_file.json")
+
+        args = [work_file]
+        opts = {"verbosity": 0, "stream": True}
+        call_command("createworks", *args, **opts)
+
+        # Work assertions
+        self.assertCountEqual(
+            Work.objects.values_list("title", "subtitle", "work_type__query_name"),
+            [
+                ("Work 1", "Subtitle 1", "WorkType 1"),
+                ("Work 2", "Subtitle 2", "WorkType 1"),
+                ("Work 3", "", "WorkType 1"),
+            ],
+        )
+        self.assertCountEqual(
+            WorkAlternativeTitle.objects.values_list("work__title", "title"),
+            [
+                ("Work 1", "AltTitle 1"),
+                ("Work 1", "AltTitle 2"),
+                ("Work 3", "AltTitle 1"),
+                ("Work 3", "AltTitle 3"),
+            ],
+        )
+
+        # Call the command a second time
+        call_command("createworks", *args, **opts)
+
+        # Check that it did not change the database
+        self.assertEqual(Work.objects.count(), 3)
+        self.assertEqual(WorkAlternativeTitle.objects.count(), 4)
+
+    def test_createworks_stream_json_lines(self):
+        """Test create works command in stream mode from a JSON Lines file
+        """
+        # Call command
+        work_file = os.path.join(DIR_WORK_FILES, "correct_work_file.jsonl")
+
+        args = [work_file]
+        opts = {"verbosity": 0, "stream": True}
+        call_command("createworks", *args, **opts)
+
+        # Work assertions
+        self.assertCountEqual(
+            Work.objects.values_list("title", "subtitle"),
+            [("Work 1", "Subtitle 1"), ("Work 2", "Subtitle 2"), ("Work 3", "")],
+        )
+        self.assertEqual(WorkAlternativeTitle.objects.count(), 4)
+
+    def test_createworks_stream_work_type_without_work_list(self):
+        """Check no work is created in stream mode when work type is not a list
+        """
+        # Create work type
+        WorkType.objects.create(query_name="WorkType 2")
+
+        # Call command
+        work_file = os.path.join(
+            DIR_WORK_FILES, "work_type_without_work_list_work_file.json"
+        )
+
+        args = [work_file]
+        opts = {"verbosity": 0, "stream": True}
+        with self.assertLogs(
+            "library.management.commands.createworks", level="INFO"
+        ) as logs:
+            call_command("createworks", *args, **opts)
+
+        self.assertEqual(Work.objects.count(), 0)
+
+        # assert the work types are reported as errors like in normal mode
+        self.assertEqual(
+            len([line for line in logs.output if "value must be a list" in line]), 2
+        )
+        self.assertNotIn(
+            "INFO:library.management.commands.createworks:"
+            "Works successfully created.",
+            logs.output,
+        )
+
+    def test_createworks_stream_nonexistent_file(self):
+        """Check the command raises an error in stream mode with no file
+        """
+        work_file = os.path.join(DIR_WORK_FILES, "this_file_does_not_exist.json")
+
+        with self.assertRaises(CommandError):
+            # Call command
+            args = [work_file]
+            opts = {"verbosity": 0, "stream": True}
+            call_command("createworks", *args, **opts)
+
+    def test_remove_incorrect_works(self):
+        """Test incorrect works are removed in one pass with their index logged
+        """
+        work_creator = WorkCreator()
+        work_listing = [
+            {"title": "Work 1"},
+            "Work 2",
+            {"subtitle": "Subtitle 3"},
+            {"title": "Work 1"},
+        ]
+
+        with self.assertLogs(
+            "library.management.commands.createworks", "DEBUG"
+        ) as logger:
+            works = work_creator.remove_incorrect_works(work_listing)
+
+        self.assertListEqual(works, [{"title": "Work 1"}, {"title": "Work 1"}])
+        self.assertIn(
+            "DEBUG:library.management.commands.createworks:"
+            "Incorrect work at index 1: value must be a dictionary.",
+            logger.output,
+        )
+        self.assertIn(
+            "DEBUG:library.management.commands.createworks:"
+            "Incorrect work at index 2: no title field found",
+            logger.output,
+        )
+
+    def test_createworks_stream_incorrect_work_index(self):
+        """Test incorrect works are reported with their index in the file
+
+        The index should not depend on the batch the work belongs to.
+        """
+        works = [{"title": "Work 1"}, {"title": "Work 2"}, "Work 3", {"title": ""}]
+        parser = SimpleNamespace(
+            parse_work_stream=lambda work_file: (
+                ("WorkType 1", dict_work) for dict_work in works
+            )
+        )
+        work_creator = WorkCreator(parser=parser, stream=True, batch_size=2)
+
+        with self.assertLogs(
+            "library.management.commands.createworks", "DEBUG"
+        ) as logger:
+            work_creator.createworks()
+
+        self.assertEqual(Work.objects.count(), 2)
+        self.assertIn(
+            "DEBUG:library.management.commands.createworks:"
+            "Incorrect work at index 2: value must be a dictionary.",
+            logger.output,
+        )
+        self.assertIn(
+            "DEBUG:library.management.commands.createworks:"
+            "Incorrect work at index 3: no title field found",
+            logger.output,
+        )
+
+    def test_remove_incorrect_alt_titles(self):
+        """Test incorrect alternative titles are removed in one pass
+        """
+        alt_title_creator = WorkAlternativeTitleCreator()
+
+        alt_titles = alt_title_creator.remove_incorrect_alt_titles(
+            ["AltTitle 1", 2, None, "AltTitle 1", ["AltTitle 3"]]
+        )
+
+        self.assertListEqual(alt_titles, ["AltTitle 1", "AltTitle 1"])
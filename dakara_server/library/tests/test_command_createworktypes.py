@@ -4,6 +4,7 @@ from django.core.management import call_command
 from django.test import TestCase
 
 from library.models import WorkType
+from library.query_language import get_parser
 
 RESSOURCES_DIR = "tests_ressources"
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -87,3 +88,20 @@ class CommandsTestCase(TestCase):
         self.assertEqual(work_types[1].name, "Work type two")
         self.assertEqual(work_types[1].name_plural, "Work type two plural")
         self.assertEqual(work_types[1].icon_name, "cat")
+
+    def test_createworktypes_command_parser(self):
+        """Test the query parser considers work types created by the command
+        """
+        self.assertNotIn("work-type-one", get_parser().keywords_work_type)
+
+        config_file_path = os.path.join(
+            APP_DIR, RESSOURCES_DIR, "createworktypes_command_config.yaml"
+        )
+
+        # Call command
+        args = [config_file_path]
+        opts = {"quiet": True}
+        call_command("createworktypes", *args, **opts)
+
+        # Post-Assertions
+        self.assertIn("work-type-one", get_parser().keywords_work_type)
@@ -0,0 +1,105 @@
+import gzip
+import json
+import os
+from datetime import timedelta
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from library.management.commands.exportlibrary import Command
+from library.models import (
+    Artist,
+    Song,
+    SongTag,
+    SongWorkLink,
+    Work,
+    WorkAlternativeTitle,
+    WorkType,
+)
+
+
+class ExportlibraryCommandTestCase(TestCase):
+    def setUp(self):
+        # create a song with all its relations
+        self.song = Song.objects.create(
+            title="Song1",
+            filename="song1.mp4",
+            directory="directory",
+            duration=timedelta(seconds=90),
+        )
+        self.song.artists.add(Artist.objects.create(name="Artist1"))
+        self.song.tags.add(SongTag.objects.create(name="TAG1", color_hue=5))
+        work_type = WorkType.objects.create(query_name="anime", name="Anime")
+        work = Work.objects.create(title="Work1", work_type=work_type)
+        WorkAlternativeTitle.objects.create(title="AltTitle1", work=work)
+        SongWorkLink.objects.create(
+            song=self.song, work=work, link_type="OP", link_type_number=1
+        )
+
+        # create a song without relations
+        Song.objects.create(title="Song2", filename="song2.mp4")
+
+    def test_exportlibrary(self):
+        """Test to export the library
+        """
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "library.jsonl")
+
+            # Call command
+            call_command("exportlibrary", path, quiet=True)
+
+            # Post-Assertions
+            with open(path) as file:
+                records = [json.loads(line) for line in file]
+
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]["id"], self.song.id)
+        self.assertEqual(records[0]["title"], "Song1")
+        self.assertEqual(records[0]["duration"], 90)
+        self.assertListEqual(records[0]["artists"], [{"name": "Artist1"}])
+        self.assertListEqual(
+            records[0]["tags"], [{"name": "TAG1", "color_hue": 5, "disabled": False}]
+        )
+        self.assertListEqual(
+            records[0]["works"],
+            [
+                {
+                    "work": {
+                        "title": "Work1",
+                        "subtitle": "",
+                        "alternative_titles": ["AltTitle1"],
+                        "work_type": {
+                            "query_name": "anime",
+                            "name": "Anime",
+                            "name_plural": "",
+                            "icon_name": None,
+                        },
+                    },
+                    "link_type": "OP",
+                    "link_type_number": 1,
+                    "episodes": "",
+                }
+            ],
+        )
+        self.assertEqual(records[1]["title"], "Song2")
+        self.assertListEqual(records[1]["works"], [])
+
+    def test_exportlibrary_gzip(self):
+        """Test to export the library to a compressed file by chunks
+        """
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "library.jsonl.gz")
+
+            # Call command
+            with patch.object(Command, "chunk_size", 1):
+                call_command("exportlibrary", path, quiet=True)
+
+            # Post-Assertions
+            with gzip.open(path, "rt") as file:
+                records = [json.loads(line) for line in file]
+
+        self.assertListEqual(
+            [record["title"] for record in records], ["Song1", "Song2"]
+        )
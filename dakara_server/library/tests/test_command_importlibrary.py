@@ -0,0 +1,130 @@
+import os
+from datetime import datetime, timedelta, timezone
+from tempfile import TemporaryDirectory
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from library import search
+from library.models import (
+    Artist,
+    Song,
+    SongTag,
+    SongWorkLink,
+    Work,
+    WorkAlternativeTitle,
+    WorkType,
+)
+
+
+class ImportlibraryCommandTestCase(TestCase):
+    def create_library(self):
+        """Create a song with all its relations
+        """
+        song = Song.objects.create(
+            title="Song1",
+            filename="song1.mp4",
+            directory="directory",
+            duration=timedelta(seconds=90),
+        )
+        song.artists.add(Artist.objects.create(name="Artist1"))
+        song.tags.add(SongTag.objects.create(name="TAG1", color_hue=5))
+        work_type = WorkType.objects.create(query_name="anime", name="Anime")
+        work = Work.objects.create(title="Work1", work_type=work_type)
+        WorkAlternativeTitle.objects.create(title="AltTitle1", work=work)
+        SongWorkLink.objects.create(
+            song=song, work=work, link_type="OP", link_type_number=1
+        )
+
+        # set a date in the past
+        Song.objects.filter(pk=song.pk).update(
+            date_created=datetime(2020, 1, 1, tzinfo=timezone.utc),
+            date_updated=datetime(2020, 1, 2, tzinfo=timezone.utc),
+        )
+
+    def clear_library(self):
+        """Remove all songs and their relations
+        """
+        Song.objects.all().delete()
+        Artist.objects.all().delete()
+        SongTag.objects.all().delete()
+        WorkType.objects.all().delete()
+
+    def test_importlibrary(self):
+        """Test to import an exported library in an empty database
+        """
+        self.create_library()
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "library.jsonl.gz")
+            call_command("exportlibrary", path, quiet=True)
+            self.clear_library()
+
+            # Call command
+            call_command("importlibrary", path, quiet=True)
+
+        # Post-Assertions
+        song = Song.objects.get()
+        self.assertEqual(song.title, "Song1")
+        self.assertEqual(song.filename, "song1.mp4")
+        self.assertEqual(song.directory, "directory")
+        self.assertEqual(song.duration, timedelta(seconds=90))
+        self.assertEqual(song.date_created, datetime(2020, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(song.date_updated, datetime(2020, 1, 2, tzinfo=timezone.utc))
+        self.assertListEqual(
+            [artist.name for artist in song.artists.all()], ["Artist1"]
+        )
+        tag = song.tags.get()
+        self.assertEqual(tag.name, "TAG1")
+        self.assertEqual(tag.color_hue, 5)
+        songworklink = song.songworklink_set.get()
+        self.assertEqual(songworklink.link_type, "OP")
+        self.assertEqual(songworklink.link_type_number, 1)
+        self.assertEqual(songworklink.work.title, "Work1")
+        self.assertEqual(songworklink.work.work_type.query_name, "anime")
+        self.assertEqual(songworklink.work.work_type.name, "Anime")
+        self.assertListEqual(
+            [title.title for title in songworklink.work.alternative_titles.all()],
+            ["AltTitle1"],
+        )
+
+        # the song can be found by the alternative title of its work
+        self.assertListEqual(
+            list(search.filter_containing(Song.objects.all(), "AltTitle1")), [song],
+        )
+
+    def test_importlibrary_existing(self):
+        """Test to import a library in the same database
+        """
+        self.create_library()
+        song = Song.objects.get()
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "library.jsonl")
+            call_command("exportlibrary", path, quiet=True)
+
+            # Call command
+            call_command("importlibrary", path, quiet=True)
+
+        # Post-Assertions
+        self.assertListEqual(list(Song.objects.all()), [song])
+        self.assertEqual(Artist.objects.count(), 1)
+        self.assertEqual(SongTag.objects.count(), 1)
+        self.assertEqual(Work.objects.count(), 1)
+        self.assertEqual(WorkAlternativeTitle.objects.count(), 1)
+        self.assertEqual(SongWorkLink.objects.count(), 1)
+
+    def test_importlibrary_invalid(self):
+        """Test to import an invalid library file
+        """
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "library.jsonl")
+            with open(path, "w") as file:
+                file.write('{"title": "Song1"}\n')
+
+            # Call command
+            with self.assertRaisesRegex(CommandError, "Invalid song at line 1"):
+                call_command("importlibrary", path, quiet=True)
+
+        self.assertFalse(Song.objects.exists())
@@ -1,7 +1,25 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from library.management.commands.prune import Command
+from library.models import (
+    Artist,
+    Work,
+    WorkAlternativeTitle,
+    WorkType,
+    Song,
+    SongTag,
+    SongWorkLink,
+)
+from playlist.models import PlayerError, PlaylistEntry
 
-from library.models import Artist, Work, WorkType, Song, SongWorkLink
+UserModel = get_user_model()
 
 
 class PruneCommandTestCase(TestCase):
@@ -84,3 +102,126 @@ class PruneCommandTestCase(TestCase):
         # Work2 was removed
         self.assertEqual(len(works), 1)
         self.assertEqual(works[0].id, work1.id)
+
+    def test_prune_command_works_alternative_titles(self):
+        """Test prune command removes alternative titles of removed works
+        """
+        work_type = WorkType.objects.create(query_name="anime")
+        work = Work.objects.create(title="Work1", work_type=work_type)
+        WorkAlternativeTitle.objects.create(title="AltTitle1", work=work)
+
+        # Call command
+        call_command("prune", quiet=True, works=True)
+
+        # Post-Assertions
+        self.assertFalse(Work.objects.exists())
+        self.assertFalse(WorkAlternativeTitle.objects.exists())
+
+    def test_prune_command_tags(self):
+        """Test prune command for tags
+        """
+        tag1 = SongTag.objects.create(name="TAG1")
+        SongTag.objects.create(name="TAG2")
+        song1 = Song.objects.create(title="Song1")
+        song1.tags.add(tag1)
+
+        # Call command
+        call_command("prune", quiet=True, tags=True)
+
+        # Post-Assertions
+        self.assertCountEqual(SongTag.objects.all(), [tag1])
+
+    def test_prune_command_work_types(self):
+        """Test prune command for work types, after works
+        """
+        work_type1 = WorkType.objects.create(query_name="anime")
+        work_type2 = WorkType.objects.create(query_name="games")
+        WorkType.objects.create(query_name="live")
+        work1 = Work.objects.create(title="Work1", work_type=work_type1)
+        Work.objects.create(title="Work2", work_type=work_type2)
+        song1 = Song.objects.create(title="Song1")
+        SongWorkLink.objects.create(song=song1, work=work1, link_type="OP")
+
+        # Call command
+        call_command("prune", quiet=True, works=True, work_types=True)
+
+        # Post-Assertions
+        self.assertCountEqual(WorkType.objects.all(), [work_type1])
+
+    def test_prune_command_player_errors(self):
+        """Test prune command for player errors
+        """
+        user = UserModel.objects.create_user("TestUser", "", "password")
+        song1 = Song.objects.create(title="Song1")
+        playlist_entry = PlaylistEntry.objects.create(song=song1, owner=user)
+        player_error_old = PlayerError.objects.create(
+            playlist_entry=playlist_entry, error_message="error old"
+        )
+        player_error_old.date_created = timezone.now() - timedelta(days=10)
+        player_error_old.save()
+        player_error_new = PlayerError.objects.create(
+            playlist_entry=playlist_entry, error_message="error new"
+        )
+
+        # Call command
+        call_command("prune", quiet=True, player_errors=7)
+
+        # Post-Assertions
+        self.assertCountEqual(PlayerError.objects.all(), [player_error_new])
+
+    def test_prune_command_dry_run(self):
+        """Test prune command only counts objects in dry run mode
+        """
+        Artist.objects.create(name="Artist1")
+        SongTag.objects.create(name="TAG1")
+
+        # Call command
+        stdout = StringIO()
+        call_command("prune", artists=True, tags=True, dry_run=True, stdout=stdout)
+
+        # Post-Assertions
+        self.assertEqual(Artist.objects.count(), 1)
+        self.assertEqual(SongTag.objects.count(), 1)
+        self.assertEqual(
+            stdout.getvalue(), "Would remove 1 artists.\nWould remove 1 tags.\n"
+        )
+
+    def test_prune_command_dry_run_work_types(self):
+        """Test prune command counts work types of removed works in dry run mode
+        """
+        work_type1 = WorkType.objects.create(query_name="anime")
+        work_type2 = WorkType.objects.create(query_name="games")
+        WorkType.objects.create(query_name="live")
+        work1 = Work.objects.create(title="Work1", work_type=work_type1)
+        Work.objects.create(title="Work2", work_type=work_type2)
+        song1 = Song.objects.create(title="Song1")
+        SongWorkLink.objects.create(song=song1, work=work1, link_type="OP")
+
+        # Call command
+        stdout = StringIO()
+        call_command("prune", works=True, work_types=True, dry_run=True, stdout=stdout)
+
+        # Post-Assertions
+        self.assertEqual(WorkType.objects.count(), 3)
+        self.assertEqual(
+            stdout.getvalue(), "Would remove 1 works.\nWould remove 2 work types.\n"
+        )
+
+    def test_prune_command_chunks(self):
+        """Test prune command deletes objects over several chunks
+        """
+        artist1 = Artist.objects.create(name="Artist1")
+        for index in range(5):
+            Artist.objects.create(name="Artist{}".format(index + 2))
+
+        song1 = Song.objects.create(title="Song1")
+        song1.artists.add(artist1)
+
+        # Call command
+        stdout = StringIO()
+        with patch.object(Command, "chunk_size", 2):
+            call_command("prune", artists=True, stdout=stdout)
+
+        # Post-Assertions
+        self.assertCountEqual(Artist.objects.all(), [artist1])
+        self.assertTrue(stdout.getvalue().startswith("Removed 5 artists in "))
@@ -1,8 +1,15 @@
+import json
+from unittest.mock import patch
+
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework import status
 
+from library import directories
+from library.models import Artist, LibraryRevision, Song, SongTombstone, WorkType
+from library.query_language import get_parser
 from library.tests.base_test import LibraryAPITestCase
+from library.views_feeder import FeederListView
 
 
 UserModel = get_user_model()
@@ -49,6 +56,62 @@ class FeederListViewTestCase(LibraryAPITestCase):
             ],
         )
 
+    def test_get_feeder_song_list_stream(self):
+        """Test to get feeder song list streamed
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        # Get songs list
+        response = self.client.get(self.url, {"stream": ""})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/json")
+
+        # the content is the same as without streaming
+        self.assertCountEqual(
+            json.loads(b"".join(response.streaming_content)),
+            [
+                {
+                    "id": self.song1.pk,
+                    "filename": self.song1.filename,
+                    "directory": self.song1.directory,
+                },
+                {
+                    "id": self.song2.pk,
+                    "filename": self.song2.filename,
+                    "directory": self.song2.directory,
+                },
+            ],
+        )
+
+    def test_get_feeder_song_list_stream_chunks(self):
+        """Test to get feeder song list streamed in several chunks
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        # Get songs list
+        with patch.object(FeederListView, "chunk_size", 1):
+            response = self.client.get(self.url, {"stream": ""})
+            content = list(response.streaming_content)
+
+        self.assertEqual(len(content), 3)
+        self.assertEqual(len(json.loads(b"".join(content))), 2)
+
+    def test_get_feeder_song_list_stream_empty(self):
+        """Test to get feeder song list streamed when there are no songs
+        """
+        Song.objects.all().delete()
+
+        # Login as manager
+        self.authenticate(self.manager)
+
+        # Get songs list
+        response = self.client.get(self.url, {"stream": ""})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), [])
+
     def test_get_song_list_forbidden(self):
         """Test that normal user cannot have feeder song list
         """
@@ -58,3 +121,437 @@ class FeederListViewTestCase(LibraryAPITestCase):
         # Attempte to get songs list
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class FeederChangesViewTestCase(LibraryAPITestCase):
+    url = reverse("library-feeder-changes")
+
+    def setUp(self):
+        # create a user without any rights
+        self.user = self.create_user("TestUser")
+
+        # create a manager
+        self.manager = self.create_user("TestManager", library_level=UserModel.MANAGER)
+
+        # create test data
+        self.create_test_data()
+
+    def test_get_changes_all(self):
+        """Test to get all the songs from the start
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        # Get changes
+        response = self.client.get(self.url, {"since": 0})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["revision"], LibraryRevision.objects.get_object().value
+        )
+        self.assertCountEqual(
+            [song["id"] for song in response.data["songs"]],
+            [self.song1.pk, self.song2.pk],
+        )
+        self.assertEqual(response.data["deleted"], [])
+
+    def test_get_changes_since(self):
+        """Test to get the changes since a revision
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        # Get current revision
+        response = self.client.get(self.url, {"since": 0})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        revision = response.data["revision"]
+
+        # Get changes, there should be none
+        response = self.client.get(self.url, {"since": revision})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["revision"], revision)
+        self.assertEqual(response.data["songs"], [])
+        self.assertEqual(response.data["deleted"], [])
+
+        # change the library
+        self.song1.filename = "renamed.mp4"
+        self.song1.save()
+        song2_id = self.song2.pk
+        self.song2.delete()
+        song3 = Song.objects.create(title="Song3", filename="file3.mp4")
+
+        # Get changes
+        response = self.client.get(self.url, {"since": revision})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["revision"], revision + 3)
+        self.assertEqual(
+            response.data["songs"],
+            [
+                {
+                    "id": self.song1.pk,
+                    "filename": "renamed.mp4",
+                    "directory": self.song1.directory,
+                },
+                {"id": song3.pk, "filename": "file3.mp4", "directory": ""},
+            ],
+        )
+        self.assertEqual(response.data["deleted"], [song2_id])
+
+    def test_get_changes_moved(self):
+        """Test a song moved to another directory is not given as deleted
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        # move a song
+        revision = LibraryRevision.objects.get_object().value
+        self.song1.directory = "other"
+        self.song1.save()
+
+        # check the song left a tombstone in its previous directory
+        self.assertCountEqual(
+            SongTombstone.objects.values_list(
+                "song_id", "revision", "directory", "moved"
+            ),
+            [(self.song1.pk, revision + 1, "directory", True)],
+        )
+
+        # Get changes
+        response = self.client.get(self.url, {"since": revision})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["revision"], revision + 1)
+        self.assertEqual(
+            [song["id"] for song in response.data["songs"]], [self.song1.pk]
+        )
+        self.assertEqual(response.data["deleted"], [])
+
+    def test_get_changes_invalid(self):
+        """Test to get changes with an invalid revision
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        # Get changes without revision
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Get changes with a negative revision
+        response = self.client.get(self.url, {"since": -1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_changes_forbidden(self):
+        """Test that normal user cannot get changes
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # Attempt to get changes
+        response = self.client.get(self.url, {"since": 0})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class FeederDirectoriesViewTestCase(LibraryAPITestCase):
+    url = reverse("library-feeder-directories")
+    url_list = reverse("library-feeder-list")
+
+    def setUp(self):
+        # create a user without any rights
+        self.user = self.create_user("TestUser")
+
+        # create a manager
+        self.manager = self.create_user("TestManager", library_level=UserModel.MANAGER)
+
+        # create test data
+        self.create_test_data()
+
+    def test_get_directories(self):
+        """Test to get the hashes of directories
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        # Get hashes
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["revision"], LibraryRevision.objects.get_object().value
+        )
+        self.assertCountEqual(
+            response.data["directories"].keys(),
+            [self.song1.directory, self.song2.directory],
+        )
+        library_hash = response.data["hash"]
+        hashes = response.data["directories"]
+
+        # Get hashes again, they are taken from cache
+        # the revision is read with a lock, within a transaction
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.data["hash"], library_hash)
+
+        # change a song
+        self.song1.filename = "renamed.mp4"
+        self.song1.save()
+
+        # Get hashes, only the directory of the song changed
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data["hash"], library_hash)
+        self.assertNotEqual(
+            response.data["directories"][self.song1.directory],
+            hashes[self.song1.directory],
+        )
+        self.assertEqual(
+            response.data["directories"][self.song2.directory],
+            hashes[self.song2.directory],
+        )
+
+    def test_get_directories_incremental(self):
+        """Test only the changed directories are hashed again
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        # Get hashes, they are put in cache
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # change the library: a song is moved, a song is deleted and a song is
+        # created in a new directory
+        self.song1.directory = "moved"
+        self.song1.save()
+        self.song2.delete()
+        Song.objects.create(title="Song3", filename="file3.mp4", directory="new")
+
+        # Get hashes
+        with patch(
+            "library.directories.compute_directory_hashes",
+            wraps=directories.compute_directory_hashes,
+        ) as mocked_compute_directory_hashes:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mocked_compute_directory_hashes.assert_called_once_with(
+            {"directory", "moved", "new", ""}
+        )
+
+        # check the hashes are the same as when computed from scratch
+        hashes = directories.compute_directory_hashes()
+        self.assertEqual(response.data["directories"], hashes)
+        self.assertCountEqual(hashes.keys(), ["moved", "new"])
+        self.assertEqual(
+            response.data["hash"], directories.compute_library_hash(hashes)
+        )
+
+    def test_get_feeder_song_list_directory(self):
+        """Test to get feeder song list of a directory
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        # Get songs list of the directory of song1
+        response = self.client.get(self.url_list, {"directory": self.song1.directory})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            [
+                {
+                    "id": self.song1.pk,
+                    "filename": self.song1.filename,
+                    "directory": self.song1.directory,
+                }
+            ],
+        )
+
+    def test_get_directories_forbidden(self):
+        """Test that normal user cannot get hashes of directories
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # Attempt to get hashes
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class FeederBulkViewTestCase(LibraryAPITestCase):
+    url = reverse("library-feeder-bulk")
+
+    def setUp(self):
+        # create a user without any rights
+        self.user = self.create_user("TestUser")
+
+        # create a manager
+        self.manager = self.create_user("TestManager", library_level=UserModel.MANAGER)
+
+        # create test data
+        self.create_test_data()
+
+    @staticmethod
+    def get_song_data(index):
+        """Give the data of a song to create
+        """
+        return {
+            "title": "Song{}".format(index),
+            "filename": "file{}.mp4".format(index),
+            "directory": "directory",
+            "duration": 0,
+            "artists": [{"name": "Artist1"}, {"name": "Artist{}".format(index)}],
+            "tags": [{"name": "TAG1"}],
+            "works": [
+                {
+                    "work": {
+                        "title": "Work1",
+                        "subtitle": "",
+                        "work_type": {"query_name": "wt1"},
+                    },
+                    "link_type": "OP",
+                    "link_type_number": index,
+                    "episodes": "",
+                },
+                {
+                    "work": {
+                        "title": "Work{}".format(index),
+                        "work_type": {"query_name": "wt_new"},
+                    },
+                    "link_type": "ED",
+                    "link_type_number": None,
+                    "episodes": "",
+                },
+            ],
+        }
+
+    def test_post_songs(self):
+        """Test to create songs in bulk
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        # Create songs
+        revision = LibraryRevision.objects.get_object().value
+        response = self.client.post(
+            self.url, [self.get_song_data(index) for index in range(3, 6)]
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 3)
+
+        # check the songs
+        song = Song.objects.get(pk=response.data[0]["id"])
+        self.assertEqual(song.title, "Song3")
+        self.assertEqual(song.revision, revision + 1)
+        self.assertCountEqual(
+            [artist.name for artist in song.artists.all()], ["Artist1", "Artist3"]
+        )
+        self.assertEqual(song.artists.get(name="Artist1"), self.artist1)
+        self.assertEqual(list(song.tags.all()), [self.tag1])
+        self.assertCountEqual(
+            [(link.work.title, link.link_type) for link in song.songworklink_set.all()],
+            [("Work1", "OP"), ("Work3", "ED")],
+        )
+        self.assertEqual(
+            song.songworklink_set.get(link_type="OP").work, self.work1,
+        )
+
+        # check the relations are not duplicated
+        self.assertEqual(Artist.objects.filter(name="Artist1").count(), 1)
+        self.assertEqual(WorkType.objects.filter(query_name="wt_new").count(), 1)
+
+        # check the songs can be searched
+        self.assertEqual(song.search_document.artists, "\nartist1\nartist3\n")
+
+        # check the library revision was incremented once
+        self.assertEqual(LibraryRevision.objects.get_object().value, revision + 1)
+
+    def test_post_songs_update(self):
+        """Test to update songs in bulk
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        # Update song2 and create a song
+        song_data = self.get_song_data(2)
+        song_data["id"] = self.song2.pk
+        song_data["title"] = "Renamed"
+        response = self.client.post(self.url, [song_data, self.get_song_data(3)])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data[0]["id"], self.song2.pk)
+
+        # check the song was updated and its relations replaced
+        self.song2.refresh_from_db()
+        self.assertEqual(self.song2.title, "Renamed")
+        self.assertCountEqual(
+            [artist.name for artist in self.song2.artists.all()],
+            ["Artist1", "Artist2"],
+        )
+        self.assertCountEqual(
+            [link.work.title for link in self.song2.songworklink_set.all()],
+            ["Work1", "Work2"],
+        )
+
+        # check the song left a tombstone in its previous directory
+        self.assertCountEqual(
+            SongTombstone.objects.values_list("song_id", "directory", "moved"),
+            [(self.song2.pk, "", True)],
+        )
+
+    def test_post_songs_parser(self):
+        """Test the query parser considers work types created in bulk
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        self.assertNotIn("wt_new", get_parser().keywords_work_type)
+
+        # Create a song with a new work type
+        response = self.client.post(self.url, [self.get_song_data(3)])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # check the parser knows the new work type
+        self.assertIn("wt_new", get_parser().keywords_work_type)
+
+    def test_post_songs_unknown(self):
+        """Test to update songs in bulk that do not exist
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        # Attempt to update an unknown song
+        song_data = self.get_song_data(3)
+        song_data["id"] = 0
+        response = self.client.post(self.url, [song_data, self.get_song_data(4)])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # nothing was created
+        self.assertFalse(Song.objects.filter(title="Song4").exists())
+
+    def test_delete_songs(self):
+        """Test to delete songs in bulk
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        # Delete songs
+        revision = LibraryRevision.objects.get_object().value
+        response = self.client.delete(self.url, {"ids": [self.song1.pk, self.song2.pk]})
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Song.objects.exists())
+
+        # check tombstones share the same revision
+        self.assertCountEqual(
+            SongTombstone.objects.values_list("song_id", "revision"),
+            [(self.song1.pk, revision + 1), (self.song2.pk, revision + 1)],
+        )
+
+    def test_bulk_forbidden(self):
+        """Test that normal user cannot change songs in bulk
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # Attempt to create songs
+        response = self.client.post(self.url, [self.get_song_data(3)])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # Attempt to delete songs
+        response = self.client.delete(self.url, {"ids": [self.song1.pk]})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
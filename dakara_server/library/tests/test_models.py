@@ -1,8 +1,9 @@
 from datetime import timedelta
 
 import pytest
+from django.db import DatabaseError
 
-from library import models
+from library import bulk, models
 
 
 class TestStringification:
@@ -82,3 +83,125 @@ class TestStringification:
         tag = models.SongTag(name="Rock and roll", color_hue=180, disabled=True)
 
         assert str(tag) == "Rock and roll"
+
+
+class TestSongHidden:
+    """Test the hidden flag of songs
+    """
+
+    @staticmethod
+    def get_hidden_songs():
+        """Get the titles of the hidden songs
+        """
+        return list(
+            models.Song.objects.filter(is_hidden=True)
+            .order_by("title")
+            .values_list("title", flat=True)
+        )
+
+    @pytest.mark.django_db
+    def test_disable_tag(self, library_provider):
+        """Test songs are hidden when their tag is disabled
+        """
+        assert self.get_hidden_songs() == []
+
+        library_provider.tag1.disabled = True
+        library_provider.tag1.save()
+        assert self.get_hidden_songs() == ["Song2"]
+
+        library_provider.tag1.disabled = False
+        library_provider.tag1.save()
+        assert self.get_hidden_songs() == []
+
+    @pytest.mark.django_db
+    def test_save_outdated_song(self, library_provider):
+        """Test an outdated song instance does not change if it is hidden
+        """
+        song = models.Song.objects.get(pk=library_provider.song2.pk)
+        assert not song.is_hidden
+
+        library_provider.tag1.disabled = True
+        library_provider.tag1.save()
+        assert self.get_hidden_songs() == ["Song2"]
+
+        # save the outdated instance
+        song.title = "Song2 renamed"
+        song.save()
+        assert self.get_hidden_songs() == ["Song2 renamed"]
+
+    @pytest.mark.django_db
+    def test_change_tags(self, library_provider):
+        """Test songs are hidden when a disabled tag is added to them
+        """
+        library_provider.tag2.disabled = True
+        library_provider.tag2.save()
+
+        library_provider.song1.tags.add(library_provider.tag2)
+        assert self.get_hidden_songs() == ["Song1"]
+
+        library_provider.tag2.song_set.add(library_provider.song2)
+        assert self.get_hidden_songs() == ["Song1", "Song2"]
+
+        library_provider.song1.tags.remove(library_provider.tag2)
+        assert self.get_hidden_songs() == ["Song2"]
+
+        library_provider.tag2.song_set.clear()
+        assert self.get_hidden_songs() == []
+
+    @pytest.mark.django_db
+    def test_delete_tag(self, library_provider):
+        """Test songs are not hidden anymore when their disabled tag is deleted
+        """
+        library_provider.tag1.disabled = True
+        library_provider.tag1.save()
+        assert self.get_hidden_songs() == ["Song2"]
+
+        library_provider.tag1.delete()
+        assert self.get_hidden_songs() == []
+
+    @pytest.mark.django_db
+    def test_save_songs(self, library_provider):
+        """Test songs saved in bulk are hidden if they have a disabled tag
+        """
+        library_provider.tag2.disabled = True
+        library_provider.tag2.save()
+
+        bulk.save_songs(
+            [
+                {"title": "Song3", "filename": "song3.mp4", "tags": [{"name": "TAG2"}]},
+                {"title": "Song4", "filename": "song4.mp4", "tags": [{"name": "TAG1"}]},
+            ]
+        )
+        assert self.get_hidden_songs() == ["Song3"]
+
+
+class TestLibraryRevision:
+    """Test the revision of the library
+    """
+
+    @pytest.mark.django_db
+    def test_song_save_atomic(self, mocker):
+        """Test the revision is not incremented if the song cannot be written
+        """
+        revision = models.LibraryRevision.objects.get_committed_value()
+        mocker.patch.object(
+            models.Song, "_do_insert", side_effect=DatabaseError("failure")
+        )
+
+        # create a song which cannot be written
+        with pytest.raises(DatabaseError):
+            models.Song.objects.create(title="Song")
+
+        # assert the revision is unchanged
+        assert models.LibraryRevision.objects.get_committed_value() == revision
+
+    @pytest.mark.django_db
+    def test_song_save(self):
+        """Test the song is saved with the new revision
+        """
+        revision = models.LibraryRevision.objects.get_committed_value()
+        song = models.Song.objects.create(title="Song")
+
+        # assert the song has the new revision
+        assert song.revision == revision + 1
+        assert models.LibraryRevision.objects.get_committed_value() == revision + 1
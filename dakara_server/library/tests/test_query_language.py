@@ -1,7 +1,7 @@
 from django.test import TestCase
 
-from library.query_language import QueryLanguageParser
-from library.models import WorkType
+from library.query_language import QueryLanguageParser, get_parser
+from library.models import WorkType, WorkTypeRevision
 
 
 class QueryLanguageParserTestCase(TestCase):
@@ -279,3 +279,52 @@ class QueryLanguageParserTestCase(TestCase):
         self.assertCountEqual(res["work"]["contains"], [])
         self.assertCountEqual(res["work"]["exact"], [])
         self.assertCountEqual(res["work_type"].keys(), [])
+
+    def test_get_parser_cached(self):
+        """Test the parser is created once for the current work types
+        """
+        parser = get_parser()
+        self.assertCountEqual(
+            parser.keywords, ["artist", "work", "title", "wt1", "wt2"]
+        )
+
+        # getting the parser again only queries the work type revision
+        with self.assertNumQueries(1):
+            self.assertIs(get_parser(), parser)
+
+    def test_get_parser_work_types_changed(self):
+        """Test the parser is created again when work types change
+        """
+        parser = get_parser()
+
+        # create a work type
+        wt3 = WorkType.objects.create(name="WorkType3", query_name="wt3")
+        parser_new = get_parser()
+        self.assertIsNot(parser_new, parser)
+        self.assertIn("wt3", parser_new.keywords)
+
+        # modify a work type
+        wt3.query_name = "wt4"
+        wt3.save()
+        parser_new = get_parser()
+        self.assertNotIn("wt3", parser_new.keywords)
+        self.assertIn("wt4", parser_new.keywords)
+
+        # delete a work type
+        wt3.delete()
+        self.assertNotIn("wt4", get_parser().keywords)
+
+    def test_get_parser_work_types_changed_other_process(self):
+        """Test the parser is created again when another process changes work
+        types
+        """
+        parser = get_parser()
+
+        # create a work type and change the revision in database, as another
+        # process would do, without this process being notified
+        WorkType.objects.bulk_create([WorkType(name="WorkType3", query_name="wt3")])
+        WorkTypeRevision.objects.update(value="other")
+
+        parser_new = get_parser()
+        self.assertIsNot(parser_new, parser)
+        self.assertIn("wt3", parser_new.keywords)
@@ -0,0 +1,200 @@
+import pytest
+
+from library import bulk, models, search
+
+
+def search_songs(term):
+    """Get the songs containing the given term
+    """
+    return list(search.filter_containing(models.Song.objects.all(), term))
+
+
+class TestSearchDocument:
+    """Test the search document of songs
+    """
+
+    @pytest.mark.django_db
+    def test_index_available(self, library_provider):
+        """Test the full text index is used with SQLite
+        """
+        assert search.is_sqlite_fts_available()
+
+    @pytest.mark.django_db
+    def test_document(self, library_provider):
+        """Test the content of a search document
+        """
+        document = models.SongSearchDocument.objects.get(song=library_provider.song2)
+
+        assert document.document.split(search.SEPARATOR) == [
+            "song2",
+            "version2",
+            "detail2",
+            "detail_video2",
+            "artist1",
+            "work1",
+            "alttitle1",
+            "alttitle2",
+        ]
+        assert document.artists == "\nartist1\n"
+        assert document.works == "\nwork1\nalttitle1\nalttitle2\n"
+        assert document.tags == "\nTAG1\n"
+
+    def test_normalize(self):
+        """Test to normalize texts
+        """
+        assert search.normalize("Ébène") == "ebene"
+        assert search.normalize("Straße") == "strasse"
+
+    @pytest.mark.django_db
+    def test_search(self, library_provider):
+        """Test to search terms
+        """
+        assert search_songs("ong1") == [library_provider.song1]
+        assert search_songs("LTTITLE1") == [library_provider.song2]
+        assert search_songs("2") == [library_provider.song2]
+        assert search_songs('"') == []
+        assert search_songs("ARTÎST1") == [library_provider.song2]
+
+        # a term cannot match accross two texts
+        assert search_songs("2 Version") == []
+
+    @pytest.mark.django_db
+    def test_search_several_songs(self, library_provider):
+        """Test a term can match several songs in the full text index
+        """
+        assert search.is_sqlite_fts_available()
+
+        # assert all matching songs are found
+        assert sorted(search_songs("ong"), key=lambda song: song.id) == [
+            library_provider.song1,
+            library_provider.song2,
+        ]
+
+    @pytest.mark.django_db
+    def test_refresh_song(self, library_provider):
+        """Test the search document is updated when the song changes
+        """
+        library_provider.song1.title = "Renamed"
+        library_provider.song1.save()
+
+        assert search_songs("ong1") == []
+        assert search_songs("enamed") == [library_provider.song1]
+
+    @pytest.mark.django_db
+    def test_refresh_artists(self, library_provider):
+        """Test the search document is updated when artists change
+        """
+        library_provider.song1.artists.add(library_provider.artist2)
+        assert search_songs("tist2") == [library_provider.song1]
+
+        library_provider.artist2.name = "Renamed"
+        library_provider.artist2.save()
+        assert search_songs("tist2") == []
+        assert search_songs("enamed") == [library_provider.song1]
+
+        library_provider.artist2.song_set.clear()
+        assert search_songs("enamed") == []
+
+        library_provider.artist1.delete()
+        assert search_songs("tist1") == []
+
+    @pytest.mark.django_db
+    def test_refresh_works(self, library_provider):
+        """Test the search document is updated when works change
+        """
+        link = models.SongWorkLink.objects.create(
+            song=library_provider.song1,
+            work=library_provider.work3,
+            link_type=models.SongWorkLink.OPENING,
+        )
+        assert search_songs("ork3") == [library_provider.song1]
+
+        models.WorkAlternativeTitle.objects.create(
+            title="AltTitle3", work=library_provider.work3
+        )
+        assert search_songs("ltTitle3") == [library_provider.song1]
+
+        link.delete()
+        assert search_songs("ork3") == []
+
+        library_provider.work1.title = "Renamed"
+        library_provider.work1.save()
+        assert search_songs("enamed") == [library_provider.song2]
+
+    @pytest.mark.django_db
+    def test_delete_song(self, library_provider):
+        """Test the search document is removed with the song
+        """
+        library_provider.song2.delete()
+
+        assert not models.SongSearchDocument.objects.filter(
+            song_id=library_provider.song2.id
+        ).exists()
+        assert search_songs("ork1") == []
+
+    @pytest.mark.django_db
+    def test_refresh_tags(self, library_provider):
+        """Test the search document is updated when tags change
+        """
+        library_provider.song1.tags.add(library_provider.tag2)
+        document = models.SongSearchDocument.objects.get(song=library_provider.song1)
+        assert document.tags == "\nTAG2\n"
+
+        library_provider.tag2.delete()
+        document.refresh_from_db()
+        assert document.tags == ""
+
+    @pytest.mark.django_db
+    def test_refresh_chunks(self, library_provider, mocker):
+        """Test to refresh search documents by chunks
+        """
+        songs = models.Song.objects.bulk_create(
+            [models.Song(title="Song{}".format(index + 3)) for index in range(3)]
+        )
+        song_ids = set(
+            models.Song.objects.filter(
+                title__in=[song.title for song in songs]
+            ).values_list("pk", flat=True)
+        )
+        models.SongSearchDocument.objects.filter(song_id__in=song_ids).delete()
+
+        chunks = bulk.chunks
+        mocked_chunks = mocker.patch(
+            "library.bulk.chunks", side_effect=lambda items: chunks(items, 2)
+        )
+        search.refresh_now(song_ids, song_ids)
+
+        mocked_chunks.assert_called_once_with(sorted(song_ids))
+        assert (
+            set(
+                models.SongSearchDocument.objects.filter(
+                    song_id__in=song_ids
+                ).values_list("song_id", flat=True)
+            )
+            == song_ids
+        )
+        assert search_songs("song4") == [models.Song.objects.get(title="Song4")]
+
+    @pytest.mark.django_db
+    def test_deferred_refresh(self, library_provider):
+        """Test to refresh search documents once
+        """
+        with search.deferred_refresh():
+            song = models.Song.objects.create(title="Song3")
+            song.artists.add(library_provider.artist1)
+            song.artists.add(library_provider.artist2)
+
+            # the document is not created yet
+            assert not models.SongSearchDocument.objects.filter(song=song).exists()
+
+        document = models.SongSearchDocument.objects.get(song=song)
+        assert document.artists == "\nartist1\nartist2\n"
+
+        # the refresh is cancelled on error
+        with pytest.raises(RuntimeError):
+            with search.deferred_refresh():
+                song.artists.clear()
+                raise RuntimeError()
+
+        document.refresh_from_db()
+        assert document.artists == "\nartist1\nartist2\n"
@@ -1,10 +1,14 @@
 from datetime import timedelta
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 
+from internal.pagination import KeysetPaginationCustom
 from internal.tests.base_test import UserModel
 from library.models import Song, Artist, Work, SongWorkLink, SongTag
+from library.query_language import get_parser
 from library.tests.base_test import LibraryAPITestCase
 
 
@@ -37,6 +41,108 @@ class SongListViewTestCase(LibraryAPITestCase):
         self.check_song_json(response.data["results"][0], self.song1)
         self.check_song_json(response.data["results"][1], self.song2)
 
+    def test_get_song_list_queries(self):
+        """Test the amount of queries does not depend on the amount of songs
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # Get songs list
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # add more songs with relations
+        for index in range(3, 6):
+            song = Song.objects.create(title="Song{}".format(index))
+            song.artists.add(self.artist1, self.artist2)
+            song.tags.add(self.tag1)
+            SongWorkLink.objects.create(
+                song=song, work=self.work1, link_type=SongWorkLink.OPENING
+            )
+            SongWorkLink.objects.create(
+                song=song, work=self.work3, link_type=SongWorkLink.ENDING
+            )
+
+        # Get songs list again
+        with self.assertNumQueries(len(context.captured_queries)):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 5)
+
+    def test_get_song_list_cursor(self):
+        """Test to get song list by keyset
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # Get first page of songs list
+        response = self.client.get(self.url, {"cursor": "", "page_size": 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.check_song_json(response.data["results"][0], self.song1)
+        self.assertIsNotNone(response.data["pagination"]["next"])
+
+        # Get next page
+        response = self.client.get(response.data["pagination"]["next"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.check_song_json(response.data["results"][0], self.song2)
+        self.assertIsNone(response.data["pagination"]["next"])
+
+    def test_get_song_list_cursor_same_title(self):
+        """Test to get song list by keyset with songs having the same title
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # give the same title to the songs
+        self.song2.title = self.song1.title.upper()
+        self.song2.save()
+
+        # Get songs list page by page
+        response = self.client.get(self.url, {"cursor": "", "page_size": 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.check_song_json(response.data["results"][0], self.song1)
+
+        response = self.client.get(response.data["pagination"]["next"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.check_song_json(response.data["results"][0], self.song2)
+
+    def test_get_song_list_cursor_invalid(self):
+        """Test to get song list with an invalid cursor
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # Get songs list with a garbage cursor
+        response = self.client.get(self.url, {"cursor": "invalid"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_song_list_cursor_invalid_values(self):
+        """Test to get song list with a cursor not matching the ordering
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # Get songs list with a cursor with a non integer ID
+        cursor = KeysetPaginationCustom.encode_cursor(["a", "x"])
+        response = self.client.get(self.url, {"cursor": cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Get songs list with a cursor with a missing key
+        cursor = KeysetPaginationCustom.encode_cursor(["a"])
+        response = self.client.get(self.url, {"cursor": cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Get songs list with a cursor with a null key
+        cursor = KeysetPaginationCustom.encode_cursor(["a", None])
+        response = self.client.get(self.url, {"cursor": cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_get_song_long_lyrics(self):
         """Test to get a song with few lyrics
         """
@@ -138,6 +244,26 @@ And everywhere that Mary went""",
         # Should not return any result
         self.song_query_test("#TAG2", [])
 
+    def test_get_song_list_with_query_tag_case(self):
+        """Test tags are matched with their exact case
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # create a tag in lower case
+        tag3 = SongTag.objects.create(name="tag3")
+        self.song1.tags.add(tag3)
+
+        # Get songs list with query = "#tag3"
+        # Should not return any result, as the tag name is searched in upper
+        # case
+        self.song_query_test("#tag3", [])
+
+        # Get songs list with query = "#TAG1", with a tag differing only by case
+        # Should only return song2
+        SongTag.objects.create(name="tag1").song_set.add(self.song1)
+        self.song_query_test("#TAG1", [self.song2])
+
     def test_get_song_list_with_query_artist(self):
         """Test to verify song list with artist query
         """
@@ -160,6 +286,26 @@ And everywhere that Mary went""",
         # Should not return any result
         self.song_query_test('artist:""tist1""', [])
 
+    def test_get_song_list_with_query_no_duplicate(self):
+        """Test songs matching several related objects are not duplicated
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # add another artist and work to song2
+        self.song2.artists.add(self.artist2)
+        SongWorkLink(
+            song_id=self.song2.id, work_id=self.work2.id, link_type=SongWorkLink.ENDING
+        ).save()
+
+        # Get songs list with query = "artist:tist wt1:ork"
+        # Should only return song2 once
+        self.song_query_test("artist:tist wt1:ork", [self.song2])
+
+        # Get songs list with query = "AltTitle2"
+        # Should only return song2 once
+        self.song_query_test("AltTitle2", [self.song2])
+
     def test_get_song_list_with_query_work(self):
         """Test to verify song list with work query
         """
@@ -226,6 +372,66 @@ And everywhere that Mary went""",
         # Should not return any result
         self.song_query_test("title:Artist", [])
 
+    def test_get_song_list_ordering_relevance(self):
+        """Test to verify song list can be ordered by relevance
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # Create songs matching the same term differently
+        song_detail = Song.objects.create(title="A song", detail="Zebra version")
+        song_artist = Song.objects.create(title="B song")
+        song_artist.artists.add(Artist.objects.create(name="Zebra"))
+        song_prefix = Song.objects.create(title="Zebra crossing")
+        song_exact = Song.objects.create(title="Zébra")
+
+        # Get songs list ordered by title
+        self.song_query_test(
+            "zebra", [song_detail, song_artist, song_exact, song_prefix]
+        )
+
+        # Get songs list ordered by relevance
+        response = self.client.get(
+            self.url, {"query": "zebra", "ordering": "relevance"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListEqual(
+            [song["id"] for song in response.data["results"]],
+            [song_exact.id, song_prefix.id, song_artist.id, song_detail.id],
+        )
+
+        # Get songs list ordered by relevance by keyset
+        response = self.client.get(
+            self.url,
+            {"query": "zebra", "ordering": "relevance", "cursor": "", "page_size": 2},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListEqual(
+            [song["id"] for song in response.data["results"]],
+            [song_exact.id, song_prefix.id],
+        )
+
+        response = self.client.get(response.data["pagination"]["next"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListEqual(
+            [song["id"] for song in response.data["results"]],
+            [song_artist.id, song_detail.id],
+        )
+
+    def test_get_song_list_with_query_title_folded(self):
+        """Test to verify song list with exact title query ignores case and accents
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # Set an accentuated title
+        self.song1.title = "Sông1"
+        self.song1.save()
+
+        # Get songs list with query = "title:""song1"""
+        # Should only return song1
+        self.song_query_test(""" title:""song1"" """, [self.song1])
+
     def test_get_song_list_with_query_multiple(self):
         """Test to verify song list with title query
         """
@@ -740,6 +946,42 @@ class SongViewTestCase(LibraryAPITestCase):
             song.songworklink_set.all(), [song_work_link_1, song_work_link_4]
         )
 
+    def test_put_song_embedded_work_type_new(self):
+        """Test to update a song with a new work type
+
+        The query parser should consider the new work type.
+        """
+        # login as manager
+        self.authenticate(self.manager)
+
+        # pre assert the parser
+        self.assertNotIn("wt_new", get_parser().keywords)
+
+        # update song1
+        song = {
+            "title": "Song1",
+            "filename": "file.mp4",
+            "directory": "directory",
+            "duration": 0,
+            "artists": [],
+            "tags": [],
+            "works": [
+                {
+                    "work": {"title": "Work4", "work_type": {"query_name": "wt_new"}},
+                    "link_type": "OP",
+                    "link_type_number": None,
+                    "episodes": "",
+                }
+            ],
+        }
+        response = self.client.put(self.url_song1, song)
+
+        # assert the response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # assert the parser knows the new work type
+        self.assertIn("wt_new", get_parser().keywords)
+
     def test_put_song_embedded_replace(self):
         """Test to update a song with already defined nested artists, tags and works
         """
@@ -874,6 +1116,103 @@ class SongViewTestCase(LibraryAPITestCase):
         self.assertEqual(song_work_link_1.episodes, "")
         self.assertCountEqual(song.songworklink_set.all(), [song_work_link_1])
 
+    def test_put_song_unchanged(self):
+        """Test to update a song with its current data
+
+        Nothing should be written.
+        """
+        # login as manager
+        self.authenticate(self.manager)
+
+        link = SongWorkLink.objects.get(song=self.song2)
+        song = {
+            "title": self.song2.title,
+            "filename": self.song2.filename,
+            "directory": self.song2.directory,
+            "duration": self.song2.duration,
+            "version": self.song2.version,
+            "detail": self.song2.detail,
+            "detail_video": self.song2.detail_video,
+            "has_instrumental": self.song2.has_instrumental,
+            "artists": [{"name": self.artist1.name}],
+            "tags": [{"name": self.tag1.name}],
+            "works": [
+                {
+                    "work": {
+                        "title": self.work1.title,
+                        "subtitle": self.work1.subtitle,
+                        "work_type": {"query_name": self.work1.work_type.query_name},
+                    },
+                    "link_type": link.link_type,
+                    "link_type_number": link.link_type_number,
+                    "episodes": link.episodes,
+                }
+            ],
+        }
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.put(self.url_song2, song)
+
+        # assert the response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # assert nothing was written
+        self.assertFalse(
+            any(
+                query["sql"].startswith(("INSERT", "UPDATE", "DELETE"))
+                for query in context.captured_queries
+            )
+        )
+        song = Song.objects.get(pk=self.song2.pk)
+        self.assertEqual(song.revision, self.song2.revision)
+        self.assertEqual(song.date_updated, self.song2.date_updated)
+        self.assertCountEqual(song.songworklink_set.all(), [link])
+        self.assertEqual(song.songworklink_set.get().pk, link.pk)
+
+    def test_put_song_relations_only(self):
+        """Test to update only the relations of a song
+
+        The song should be marked as changed.
+        """
+        # login as manager
+        self.authenticate(self.manager)
+
+        link = SongWorkLink.objects.get(song=self.song2)
+        song = {
+            "title": self.song2.title,
+            "filename": self.song2.filename,
+            "directory": self.song2.directory,
+            "duration": self.song2.duration,
+            "version": self.song2.version,
+            "detail": self.song2.detail,
+            "detail_video": self.song2.detail_video,
+            "has_instrumental": self.song2.has_instrumental,
+            "artists": [{"name": self.artist1.name}, {"name": self.artist2.name}],
+            "tags": [{"name": self.tag1.name}],
+            "works": [
+                {
+                    "work": {
+                        "title": self.work1.title,
+                        "subtitle": self.work1.subtitle,
+                        "work_type": {"query_name": self.work1.work_type.query_name},
+                    },
+                    "link_type": link.link_type,
+                    "link_type_number": link.link_type_number,
+                    "episodes": link.episodes,
+                }
+            ],
+        }
+        response = self.client.put(self.url_song2, song)
+
+        # assert the response
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # assert the song was marked as changed
+        song = Song.objects.get(pk=self.song2.pk)
+        self.assertCountEqual(song.artists.all(), [self.artist1, self.artist2])
+        self.assertGreater(song.revision, self.song2.revision)
+        self.assertGreater(song.date_updated, self.song2.date_updated)
+
     def test_put_song_embedded_work_subtitle(self):
         """Test work is created even if similar exists with different subtitle
         """
@@ -1,6 +1,9 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 
+from library.models import SongWorkLink, Work, WorkAlternativeTitle
 from library.tests.base_test import LibraryAPITestCase
 
 
@@ -36,6 +39,35 @@ class WorkListViewTestCase(LibraryAPITestCase):
         self.assertEqual(response.data["results"][1]["song_count"], 0)
         self.assertEqual(response.data["results"][2]["song_count"], 0)
 
+    def test_get_work_list_queries(self):
+        """Test the amount of queries does not depend on the amount of works
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # Get works list
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # add more works with songs and alternative titles
+        for index in range(4, 7):
+            work = Work.objects.create(title="Work{}".format(index), work_type=self.wt1)
+            WorkAlternativeTitle.objects.create(
+                title="AltTitle{}".format(index), work=work
+            )
+            SongWorkLink.objects.create(
+                song=self.song1, work=work, link_type=SongWorkLink.OPENING
+            )
+
+        # Get works list again
+        with self.assertNumQueries(len(context.captured_queries)):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 6)
+
     def test_get_work_list_forbidden(self):
         """Test to verify unauthenticated user can't get work list
         """
@@ -98,6 +130,22 @@ class WorkListViewTestCase(LibraryAPITestCase):
         # Should return work1 and work2
         self.work_query_test("ltTitle2", [self.work1, self.work2])
 
+    def test_get_work_list_with_query_alternative_titles_several(self):
+        """Test works matching several alternative titles are given once
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # Get works list with query = "ltTitle", which matches both alternative
+        # titles of work1
+        with CaptureQueriesContext(connection) as queries:
+            self.work_query_test("ltTitle", [self.work1, self.work2])
+
+        # the works are not deduplicated afterwards
+        self.assertFalse(
+            any("DISTINCT" in query["sql"] for query in queries.captured_queries)
+        )
+
     def test_get_work_list_with_query_empty(self):
         """Test to verify work list with empty query
         """
@@ -1,5 +1,5 @@
 from django.db.models.functions import Lower
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.contrib.auth import get_user_model
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.generics import (
@@ -10,10 +10,13 @@ from rest_framework.generics import (
 )
 
 from internal import permissions as internal_permissions
+from internal.fields import fold
+from internal.pagination import KeysetPaginationCustom
 from library import models
 from library import serializers
 from library import permissions
-from library.query_language import QueryLanguageParser
+from library import search
+from library.query_language import QueryLanguageParser, get_parser
 from library import views_feeder as feeder  # noqa F401
 
 
@@ -46,6 +49,10 @@ class ListCreateAPIViewWithQueryParsed(ListCreateAPIView):
 
 class SongListView(ListCreateAPIViewWithQueryParsed):
     """List of songs
+
+    Songs are ordered by title. If the `ordering` query parameter is
+    `relevance`, songs found with unspecific terms of the query are ordered
+    by relevance first, in the database.
     """
 
     permission_classes = [
@@ -53,21 +60,27 @@ class SongListView(ListCreateAPIViewWithQueryParsed):
         permissions.IsLibraryManager | internal_permissions.IsReadOnly,
     ]
     serializer_class = serializers.SongSerializer
+    pagination_class = KeysetPaginationCustom
+
+    ordering_query_param = "ordering"
+    relevance_ordering = "relevance"
 
     def get_queryset(self):
         """Search and filter the songs
         """
-        query_set = models.Song.objects.all()
+        query_set = models.Song.objects.prefetch_related(
+            *serializers.SongSerializer.get_prefetch_lookups()
+        )
 
         # hide all songs with disabled tags for non-managers or non-superusers
         user = self.request.user
         if not (user.is_superuser or user.is_library_manager):
-            query_set = query_set.exclude(tags__disabled=True)
+            query_set = query_set.filter(is_hidden=False)
 
         # if 'query' is in the query string then perform search otherwise
         # return all songs
         if "query" not in self.request.query_params:
-            return query_set.order_by(Lower("title"))
+            return query_set.order_by("title_folded", "id")
 
         query = self.request.query_params.get("query", None)
         if query:
@@ -75,78 +88,83 @@ class SongListView(ListCreateAPIViewWithQueryParsed):
             # term to search and where
             # the language manages the simple search as well the parser is
             # provided from query_language.py
-            language_parser = QueryLanguageParser()
+            language_parser = get_parser()
             res = language_parser.parse(query)
             query_list = []
-            query_list_many = []
             # specific terms of the research, i.e. artists, works and titles
+            # they are searched in the flattened search document of the songs,
+            # so that no join on related objects is needed
             for artist in res["artist"]["contains"]:
-                query_list_many.append(Q(artists__name__icontains=artist))
+                query_list.append(
+                    Q(search_document__artists__contains=search.normalize(artist))
+                )
 
             for artist in res["artist"]["exact"]:
-                query_list_many.append(Q(artists__name__iexact=artist))
+                query_list.append(
+                    Q(
+                        search_document__artists__contains=search.contains_exact(
+                            search.normalize(artist)
+                        )
+                    )
+                )
 
             for title in res["title"]["contains"]:
                 query_list.append(Q(title__icontains=title))
 
             for title in res["title"]["exact"]:
-                query_list.append(Q(title__iexact=title))
+                query_list.append(Q(title_folded=fold(title)))
 
             for work in res["work"]["contains"]:
                 query_list.append(
-                    Q(works__title__icontains=work)
-                    | Q(works__alternative_title__title__icontains=work)
+                    Q(search_document__works__contains=search.normalize(work))
                 )
 
             for work in res["work"]["exact"]:
                 query_list.append(
-                    Q(works__title__iexact=work)
-                    | Q(works__alternative_title__title__iexact=work)
+                    Q(
+                        search_document__works__contains=search.contains_exact(
+                            search.normalize(work)
+                        )
+                    )
                 )
 
             # specific terms of the research derivating from work
+            # the work type is not part of the search document, so the works
+            # are searched in a subquery, which does not duplicate songs
             for query_name, search_keywords in res["work_type"].items():
                 for keyword in search_keywords["contains"]:
                     query_list.append(
-                        (
-                            Q(works__title__icontains=keyword)
-                            | Q(
-                                works__alternative_title__title__icontains=keyword
-                            )  # noqa E501
+                        Q(
+                            pk__in=models.SongWorkLink.objects.filter(
+                                Q(work__title__icontains=keyword)
+                                | Q(work__alternative_title__title__icontains=keyword),
+                                work__work_type__query_name=query_name,
+                            ).values("song_id")
                         )
-                        & Q(works__work_type__query_name=query_name)
                     )
 
                 for keyword in search_keywords["exact"]:
                     query_list.append(
-                        (
-                            Q(works__title__iexact=keyword)
-                            | Q(works__alternative_title__title__iexact=keyword)
+                        Q(
+                            pk__in=models.SongWorkLink.objects.filter(
+                                Q(work__title_folded=fold(keyword))
+                                | Q(
+                                    work__alternative_title__title_folded=fold(keyword)
+                                ),
+                                work__work_type__query_name=query_name,
+                            ).values("song_id")
                         )
-                        & Q(works__work_type__query_name=query_name)
                     )
 
-                # one may want to factor the duplicated query on the work type
-                # but it is very unlikely someone will define severals animes
-                # (by instance) for a song at the same time
-                # IMHO a factorization will make the code less clear and just
-                # heavier, for no practical reason
-
-            # unspecific terms of the research
-            for remain in res["remaining"]:
-                query_list.append(
-                    Q(title__icontains=remain)
-                    | Q(artists__name__icontains=remain)
-                    | Q(works__title__icontains=remain)
-                    | Q(works__alternative_title__title__icontains=remain)
-                    | Q(version__icontains=remain)
-                    | Q(detail__icontains=remain)
-                    | Q(detail_video__icontains=remain)
-                )
-
             # tags
             for tag in res["tag"]:
-                query_list_many.append(Q(tags__name=tag))
+                query_list.append(
+                    Q(
+                        pk__in=models.Song.tags.through.objects.filter(
+                            songtag__name=tag
+                        ).values("song_id")
+                    )
+                )
 
             # now, gather the query objects
             filter_query = Q()
@@ -154,14 +172,24 @@ class SongListView(ListCreateAPIViewWithQueryParsed):
                 filter_query &= item
 
             query_set = query_set.filter(filter_query)
-            # gather the query objects involving custom many to many relation
-            for item in query_list_many:
-                query_set = query_set.filter(item)
+
+            # unspecific terms of the research
+            # they are searched in the full text index of the songs
+            for remain in res["remaining"]:
+                query_set = search.filter_containing(query_set, remain)
 
             # saving the parsed query to give it back to the client
             self.query_parsed = res
 
-        return query_set.distinct().order_by(Lower("title"))
+            # rank songs by relevance for the unspecific terms, within the
+            # query, so that the most relevant songs are on the first page
+            ordering = self.request.query_params.get(self.ordering_query_param)
+            if ordering == self.relevance_ordering and res["remaining"]:
+                return query_set.annotate(
+                    relevance=search.get_relevance(" ".join(res["remaining"]))
+                ).order_by("-relevance", "title_folded", "id")
+
+        return query_set.order_by("title_folded", "id")
 
     def get_serializer(self, *args, **kwargs):
         """Return the serializer instance that should be used for validating and
@@ -187,7 +215,9 @@ class SongView(RetrieveUpdateDestroyAPIView):
         IsAuthenticated,
         permissions.IsLibraryManager | internal_permissions.IsReadOnly,
     ]
-    queryset = models.Song.objects.all()
+    queryset = models.Song.objects.prefetch_related(
+        *serializers.SongSerializer.get_prefetch_lookups()
+    )
     serializer_class = serializers.SongSerializer
 
 
@@ -200,16 +230,18 @@ class ArtistListView(ListCreateAPIViewWithQueryParsed):
         permissions.IsLibraryManager | internal_permissions.IsReadOnly,
     ]
     serializer_class = serializers.ArtistWithCountSerializer
+    pagination_class = KeysetPaginationCustom
 
     def get_queryset(self):
         """Search and filter the artists
         """
-        query_set = models.Artist.objects.all()
+        # count songs in the same query, this has to be done before any join
+        query_set = models.Artist.objects.annotate(song_count=Count("song"))
 
         # if 'query' is in the query string then perform search return results
         # of the corresponding query
         if "query" not in self.request.query_params:
-            return query_set.order_by(Lower("name"))
+            return query_set.order_by("name_folded", "id")
 
         query = self.request.query_params.get("query", None)
         if query:
@@ -230,7 +262,7 @@ class ArtistListView(ListCreateAPIViewWithQueryParsed):
             # saving the parsed query to give it back to the client
             self.query_parsed = {"remaining": res}
 
-        return query_set.order_by(Lower("name"))
+        return query_set.order_by("name_folded", "id")
 
 
 class WorkListView(ListCreateAPIViewWithQueryParsed):
@@ -242,11 +274,17 @@ class WorkListView(ListCreateAPIViewWithQueryParsed):
         permissions.IsLibraryManager | internal_permissions.IsReadOnly,
     ]
     serializer_class = serializers.WorkSerializer
+    pagination_class = KeysetPaginationCustom
 
     def get_queryset(self):
         """Search and filter the works
         """
-        query_set = models.Work.objects.all()
+        # count songs in the same query, this has to be done before any join
+        query_set = (
+            models.Work.objects.annotate(song_count=Count("songworklink"))
+            .select_related("work_type")
+            .prefetch_related("alternative_titles")
+        )
 
         # if 'type' is in the query string
         # then filter work type
@@ -258,7 +296,7 @@ class WorkListView(ListCreateAPIViewWithQueryParsed):
         # if 'query' is in the query string then perform search return results
         # of the corresponding query and type filter
         if "query" not in self.request.query_params:
-            return query_set.order_by(Lower("title"), Lower("subtitle"))
+            return query_set.order_by("title_folded", Lower("subtitle"), "id")
 
         query = self.request.query_params.get("query", None)
         if query:
@@ -271,7 +309,14 @@ class WorkListView(ListCreateAPIViewWithQueryParsed):
                 query_list.append(
                     Q(title__icontains=remain)
                     | Q(subtitle__icontains=remain)
-                    | Q(alternative_title__title__icontains=remain)
+                    # alternative titles are searched in a subquery, so that
+                    # the works are not duplicated nor their songs counted
+                    # several times
+                    | Q(
+                        pk__in=models.WorkAlternativeTitle.objects.filter(
+                            title__icontains=remain
+                        ).values("work_id")
+                    )
                 )
 
             # gather the query objects
@@ -283,7 +328,7 @@ class WorkListView(ListCreateAPIViewWithQueryParsed):
             # saving the parsed query to give it back to the client
             self.query_parsed = {"remaining": res}
 
-        return query_set.distinct().order_by(Lower("title"), Lower("subtitle"))
+        return query_set.order_by("title_folded", Lower("subtitle"), "id")
 
 
 class WorkTypeListView(ListCreateAPIView):
@@ -1,14 +1,186 @@
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework import status
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from library import bulk
+from library import directories
 from library import models
 from library import serializers
 from library import permissions
 
 
 class FeederListView(ListAPIView):
+    """List of songs for the feeder
+
+    If the `stream` query parameter is given, the list is streamed as a JSON
+    array while songs are fetched by chunks, instead of being serialized at
+    once. The content of the response is the same.
+
+    The list can be restricted to some directories with the `directory` query
+    parameter, which can be repeated.
+    """
 
     permission_classes = [IsAuthenticated, permissions.IsLibraryManager]
     queryset = models.Song.objects.all()
     serializer_class = serializers.SongOnlyFilePathSerializer
     pagination_class = None
+
+    stream_query_param = "stream"
+    directory_query_param = "directory"
+
+    # amount of songs fetched from the database and sent at once
+    chunk_size = 2000
+
+    def filter_queryset(self, queryset):
+        if self.directory_query_param not in self.request.query_params:
+            return queryset
+
+        return queryset.filter(
+            directory__in=self.request.query_params.getlist(self.directory_query_param)
+        )
+
+    def list(self, request, *args, **kwargs):
+        if self.stream_query_param not in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        # the serializer only gives fields of the song as is, so rows can be
+        # directly converted to JSON
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values(*self.get_serializer_class().Meta.fields).iterator(
+            chunk_size=self.chunk_size
+        )
+
+        return StreamingHttpResponse(
+            stream_json_array(rows, self.chunk_size), content_type="application/json"
+        )
+
+
+class FeederBulkView(APIView):
+    """Bulk changes of songs by the feeder
+
+    Songs are created or updated with POST, and deleted with DELETE.
+    Relations of songs are resolved in bulk and changes are made in a single
+    transaction.
+    """
+
+    permission_classes = [IsAuthenticated, permissions.IsLibraryManager]
+
+    def post(self, request, *args, **kwargs):
+        serializer = serializers.SongForFeederSerializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            songs = bulk.save_songs(serializer.validated_data)
+
+        except models.Song.DoesNotExist as error:
+            return Response({"detail": str(error)}, status.HTTP_400_BAD_REQUEST)
+
+        serializer = serializers.SongOnlyFilePathSerializer(songs, many=True)
+        return Response(serializer.data, status.HTTP_201_CREATED)
+
+    def delete(self, request, *args, **kwargs):
+        serializer = serializers.FeederBulkDeleteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        bulk.delete_songs(serializer.validated_data["ids"])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class FeederChangesView(APIView):
+    """Changes of the library since a revision for the feeder
+
+    Gives the current revision of the library, the songs created or modified
+    and the IDs of the songs deleted since the revision passed with the
+    `since` query parameter. Deletions have to be applied before
+    modifications, as a deleted song ID may have been used again.
+    """
+
+    permission_classes = [IsAuthenticated, permissions.IsLibraryManager]
+
+    def get(self, request, *args, **kwargs):
+        serializer = serializers.FeederChangesRequestSerializer(
+            data=request.query_params
+        )
+        if not serializer.is_valid():
+            return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        since = serializer.validated_data["since"]
+
+        # changes are bounded by the current revision, so that later changes
+        # are given on the next call, the revision is read once the changes in
+        # progress are committed
+        revision = models.LibraryRevision.objects.get_committed_value()
+        songs = models.Song.objects.filter(
+            revision__gt=since, revision__lte=revision
+        ).order_by("revision")
+        deleted = (
+            models.SongTombstone.objects.filter(
+                revision__gt=since, revision__lte=revision, moved=False
+            )
+            .order_by("song_id")
+            .values_list("song_id", flat=True)
+            .distinct()
+        )
+
+        serializer = serializers.FeederChangesSerializer(
+            {"revision": revision, "songs": songs, "deleted": deleted}
+        )
+
+        return Response(serializer.data)
+
+
+class FeederDirectoriesView(APIView):
+    """Hashes of the directories of the library for the feeder
+
+    Gives the current revision of the library, the hash of the library and
+    the hash of each directory. The feeder can compare them with the hashes
+    of its last synchronization, and only get the songs of the directories
+    that differ. Hashes are kept in cache and only the directories changed
+    since the last request are hashed again.
+    """
+
+    permission_classes = [IsAuthenticated, permissions.IsLibraryManager]
+
+    def get(self, request, *args, **kwargs):
+        revision, library_hash, hashes = directories.get_directory_hashes()
+        serializer = serializers.FeederDirectoriesSerializer(
+            {"revision": revision, "hash": library_hash, "directories": hashes}
+        )
+
+        return Response(serializer.data)
+
+
+def stream_json_array(rows, chunk_size):
+    """Convert rows to a JSON array by chunks
+
+    Args:
+        rows (iterable): objects to convert.
+        chunk_size (int): amount of rows to convert in each chunk.
+
+    Yields:
+        bytes: part of the JSON array.
+    """
+    separator = "["
+    chunk = []
+    for row in rows:
+        chunk.append(separator)
+        chunk.append(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+        separator = ","
+
+        if len(chunk) >= chunk_size * 2:
+            yield "".join(chunk).encode("utf-8")
+            chunk = []
+
+    # the array is empty
+    if separator == "[":
+        chunk.append(separator)
+
+    chunk.append("]")
+    yield "".join(chunk).encode("utf-8")
@@ -7,6 +7,14 @@ class PlaylistConfig(DakaraConfig):
 
     name = "playlist"
 
+    def ready(self):
+        """Method called when app start
+        """
+        # connect the signals
+        import playlist.signals  # noqa F401
+
+        super().ready()
+
     def ready_no_reload(self):
         """Method called when app start
         """
@@ -1,6 +1,7 @@
 import logging
 
 from django.contrib.auth import get_user_model
+from django.db.models import prefetch_related_objects
 from channels.generic.websocket import JsonWebsocketConsumer
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
@@ -158,6 +159,10 @@ class PlaylistDeviceConsumer(DispatchJsonWebsocketConsumer):
         logger.info("The player will play '%s'", playlist_entry)
 
         # send to device
+        prefetch_related_objects(
+            [playlist_entry],
+            *serializers.PlaylistEntryForPlayerSerializer.get_prefetch_lookups()
+        )
         serializer = serializers.PlaylistEntryForPlayerSerializer(playlist_entry)
         self.send_json({"type": "playlist_entry", "data": serializer.data})
 
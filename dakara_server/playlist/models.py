@@ -1,7 +1,8 @@
 import textwrap
+from itertools import accumulate
 from datetime import timedelta, datetime
 
-from django.db import models
+from django.db import connection, models
 from django.db.utils import OperationalError
 from django.core.cache import cache
 from django.utils import timezone
@@ -16,15 +17,37 @@ class PlaylistManager(OrderedModelManager):
     """Manager of playlist objects
     """
 
+    PLAYING_ENTRY_ID_NAME = "playlist_playing_entry_id"
+
+    # value kept in cache when no entry is playing
+    NO_PLAYING_ENTRY_ID = 0
+
     def get_playing(self):
         """Get the current playlist entry
+
+        The ID of the current playlist entry is kept in cache, so that the
+        entry is obtained by its primary key, or not obtained at all if no
+        entry is playing. If the ID is not known, the entry is searched in a
+        single query and its ID is kept in cache. The song and the owner of
+        the entry are selected.
         """
-        playlist = self.filter(was_played=False, date_played__isnull=False)
+        entry_id = self.get_playing_id()
 
-        if not playlist:
+        if entry_id == self.NO_PLAYING_ENTRY_ID:
             return None
 
-        if playlist.count() > 1:
+        playlist = self.filter(
+            was_played=False, date_played__isnull=False
+        ).select_related("song", "owner")
+
+        if entry_id is not None:
+            playlist_entry = playlist.filter(pk=entry_id).first()
+            if playlist_entry is not None:
+                return playlist_entry
+
+        playlist = list(playlist)
+
+        if len(playlist) > 1:
             entries_str = ", ".join([str(e) for e in playlist])
 
             raise RuntimeError(
@@ -32,7 +55,38 @@ class PlaylistManager(OrderedModelManager):
                 " playing at the same time: {}".format(entries_str)
             )
 
-        return playlist.first()
+        playlist_entry = playlist[0] if playlist else None
+        self.set_playing_id(playlist_entry)
+
+        return playlist_entry
+
+    def get_playing_id(self):
+        """Get the ID of the current playlist entry kept in cache
+
+        Returns:
+            int: ID of the current entry, `NO_PLAYING_ENTRY_ID` if no entry is
+            playing, or None if it is not known.
+        """
+        return cache.get(self.PLAYING_ENTRY_ID_NAME)
+
+    def set_playing_id(self, playlist_entry):
+        """Keep the ID of the current playlist entry in cache
+
+        Args:
+            playlist_entry (PlaylistEntry): current entry, or None if no entry
+                is playing.
+        """
+        cache.set(
+            self.PLAYING_ENTRY_ID_NAME,
+            playlist_entry.id
+            if playlist_entry is not None
+            else self.NO_PLAYING_ENTRY_ID,
+        )
+
+    def clear_playing_id(self):
+        """Forget the ID of the current playlist entry
+        """
+        cache.delete(self.PLAYING_ENTRY_ID_NAME)
 
     def get_playlist(self):
         """Get the playlist of ongoing entries
@@ -43,6 +97,37 @@ class PlaylistManager(OrderedModelManager):
 
         return queryset
 
+    def get_playlist_durations(self):
+        """Get the cumulated durations of the playlist of ongoing entries
+
+        The cumulated durations are computed with a window function in the
+        query, if the database supports it.
+
+        Returns:
+            list: tuples of the ID of each ongoing entry, in order, and of the
+            cumulated duration of the songs up to this entry included.
+        """
+        playlist = self.get_playlist().order_by("order", "id")
+
+        if connection.features.supports_over_clause:
+            return list(
+                playlist.annotate(
+                    duration_cumulated=models.Window(
+                        models.Sum("song__duration"),
+                        order_by=[models.F("order").asc(), models.F("id").asc()],
+                        frame=models.RowRange(end=0),
+                    )
+                ).values_list("id", "duration_cumulated")
+            )
+
+        durations = []
+        duration_cumulated = timedelta()
+        for entry_id, duration in playlist.values_list("id", "song__duration"):
+            duration_cumulated += duration
+            durations.append((entry_id, duration_cumulated))
+
+        return durations
+
     def get_playlist_played(self):
         """Get the playlist of passed entries
         """
@@ -108,6 +193,7 @@ class PlaylistEntry(OrderedModel):
         # set the playlist entry
         self.date_played = datetime.now(tz)
         self.save()
+        PlaylistEntry.objects.set_playing_id(self)
 
     def set_finished(self):
         """The playlist entry has finished
@@ -122,6 +208,7 @@ class PlaylistEntry(OrderedModel):
         # set the playlist entry
         self.was_played = True
         self.save()
+        PlaylistEntry.objects.set_playing_id(None)
 
 
 class KaraokeManager(models.Manager):
@@ -136,6 +223,15 @@ class KaraokeManager(models.Manager):
         karaoke, _ = self.get_or_create(pk=1)
         return karaoke
 
+    def get_object_for_update(self):
+        """Get the first instance of kara status and lock it
+
+        The row is locked until the end of the transaction, which has to be
+        started by the caller.
+        """
+        karaoke, _ = self.select_for_update().get_or_create(pk=1)
+        return karaoke
+
     def clean_channel_names(self):
         """Remove all channel names
         """
@@ -222,6 +318,7 @@ class Player:
         self.paused = paused
         self.in_transition = in_transition
         self.date = None
+        self.invalidate_playlist_entry()
 
         # at least set the date
         self.update(date=date)
@@ -232,6 +329,18 @@ class Player:
     def __str__(self):
         return "Player"
 
+    def __getstate__(self):
+        # the current playlist entry is not stored in cache
+        state = self.__dict__.copy()
+        del state["_playlist_entry"]
+        del state["_playlist_entry_fetched"]
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.invalidate_playlist_entry()
+
     def __eq__(self, other):
         fields = ("timing", "paused", "in_transition", "date")
 
@@ -241,7 +350,7 @@ class Player:
         """Update the player and set date"""
         # set normal attributes
         for key, value in kwargs.items():
-            if hasattr(self, key) and key != "playlist_entry":
+            if key != "playlist_entry" and hasattr(self, key):
                 setattr(self, key, value)
 
         # set specific attributes
@@ -249,7 +358,24 @@ class Player:
 
     @property
     def playlist_entry(self):
-        return PlaylistEntry.objects.get_playing()
+        """Current playlist entry, with its song and its owner
+
+        The entry is obtained once and kept by the player object, but not
+        stored in cache. As the player is retrieved from cache by each request,
+        the entry is kept for the duration of the request. It has to be
+        invalidated when the current entry changes.
+        """
+        if not self._playlist_entry_fetched:
+            self._playlist_entry = PlaylistEntry.objects.get_playing()
+            self._playlist_entry_fetched = True
+
+        return self._playlist_entry
+
+    def invalidate_playlist_entry(self):
+        """Forget the current playlist entry kept by the player object
+        """
+        self._playlist_entry = None
+        self._playlist_entry_fetched = False
 
     @classmethod
     def get_or_create(cls):
@@ -272,3 +398,250 @@ class Player:
         """Reset the player to its initial state
         """
         self.update(timing=timedelta(), paused=False, in_transition=False)
+
+
+class PlaylistTimeline:
+    """Timeline of the playlist of ongoing entries
+
+    This object is not stored in database, but lives within Django memory
+    cache, like the player. It contains the IDs of the ongoing entries, in
+    order, with the cumulated duration of their songs, so that the dates of
+    play of the entries and the date of end of the playlist can be computed
+    without loading the songs. It is updated incrementally by signals when
+    entries change, or marked as outdated when the change cannot be applied
+    incrementally. Its version is incremented each time it is saved, so that a
+    change computed from a copy can be discarded if the timeline in cache has
+    changed meanwhile.
+    """
+
+    TIMELINE_NAME = "playlist_timeline"
+
+    def __init__(self, entries_id=(), durations_cumulated=()):
+        self.entries_id = list(entries_id)
+        self.durations_cumulated = list(durations_cumulated)
+        self.version = 0
+        self.outdated = False
+
+    def __repr__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self)
+
+    def __str__(self):
+        return "Playlist timeline"
+
+    @property
+    def duration(self):
+        """Total duration of the playlist
+        """
+        if not self.durations_cumulated:
+            return timedelta()
+
+        return self.durations_cumulated[-1]
+
+    def get_durations(self):
+        """Get the duration of the song of each entry
+
+        Returns:
+            list: durations, in the order of the entries.
+        """
+        return [
+            duration_cumulated - duration_cumulated_before
+            for duration_cumulated, duration_cumulated_before in zip(
+                self.durations_cumulated, [timedelta()] + self.durations_cumulated
+            )
+        ]
+
+    def set_durations(self, entries_id, durations):
+        """Set the entries of the timeline with the duration of their song
+
+        Args:
+            entries_id (list): IDs of the entries, in order.
+            durations (list): durations of the song of each entry.
+        """
+        self.entries_id = list(entries_id)
+        self.durations_cumulated = list(accumulate(durations))
+
+    def matches(self, playlist):
+        """Tell if the timeline corresponds to a playlist
+
+        Args:
+            playlist (list): ongoing entries, in order.
+
+        Returns:
+            bool: true if the timeline has the same entries in the same order,
+            with the same durations.
+        """
+        return self.entries_id == [
+            playlist_entry.id for playlist_entry in playlist
+        ] and self.get_durations() == [
+            playlist_entry.song.duration for playlist_entry in playlist
+        ]
+
+    def set_dates_play(self, playlist, date):
+        """Set when the entries of a playlist are supposed to play
+
+        Args:
+            playlist (list): ongoing entries, in order, which must match the
+                timeline.
+            date (datetime.datetime): date when the first entry is supposed to
+                play.
+
+        Returns:
+            datetime.datetime: date of the end of the playlist.
+        """
+        date_play = date
+        for playlist_entry, duration_cumulated in zip(
+            playlist, self.durations_cumulated
+        ):
+            playlist_entry.date_play = date_play
+            date_play = date + duration_cumulated
+
+        return date + self.duration
+
+    def add(self, playlist_entry):
+        """Add an entry at the end of the timeline
+
+        Args:
+            playlist_entry (PlaylistEntry): entry to add. Nothing is done if
+                it is already in the timeline.
+        """
+        if playlist_entry.id in self.entries_id:
+            return
+
+        self.entries_id.append(playlist_entry.id)
+        self.durations_cumulated.append(self.duration + playlist_entry.song.duration)
+
+    def remove(self, entry_id):
+        """Remove an entry from the timeline
+
+        Args:
+            entry_id (int): ID of the entry to remove. Nothing is done if it is
+                not in the timeline.
+        """
+        if entry_id not in self.entries_id:
+            return
+
+        index = self.entries_id.index(entry_id)
+        durations = self.get_durations()
+        del self.entries_id[index]
+        del durations[index]
+        self.set_durations(self.entries_id, durations)
+
+    def move(self, entry_id, other_entry_id, after=False):
+        """Move an entry before or after another one in the timeline
+
+        If one of the entries is not in the timeline, the timeline is
+        outdated and is created again from the database instead.
+
+        Args:
+            entry_id (int): ID of the entry to move.
+            other_entry_id (int): ID of the entry to move the entry next to.
+            after (bool): move the entry after the other entry instead of
+                before it.
+        """
+        if entry_id not in self.entries_id or other_entry_id not in self.entries_id:
+            self.refresh()
+            return
+
+        durations = dict(zip(self.entries_id, self.get_durations()))
+        entries_id = [id_ for id_ in self.entries_id if id_ != entry_id]
+        index = entries_id.index(other_entry_id) + int(after)
+        entries_id.insert(index, entry_id)
+        self.set_durations(entries_id, [durations[id_] for id_ in entries_id])
+
+    def refresh(self):
+        """Set the entries of the timeline from the database
+        """
+        durations = PlaylistEntry.objects.get_playlist_durations()
+        self.entries_id = [entry_id for entry_id, _ in durations]
+        self.durations_cumulated = [duration for _, duration in durations]
+        self.outdated = False
+
+    @classmethod
+    def create_from_playlist(cls, playlist):
+        """Create a timeline from a playlist
+
+        Args:
+            playlist (list): ongoing entries, in order, with their song
+                selected.
+
+        Returns:
+            PlaylistTimeline: timeline of the playlist.
+        """
+        timeline = cls()
+        timeline.set_durations(
+            [playlist_entry.id for playlist_entry in playlist],
+            [playlist_entry.song.duration for playlist_entry in playlist],
+        )
+
+        return timeline
+
+    @classmethod
+    def get_or_create(cls, playlist=None):
+        """Retrieve the timeline in cache or create one
+
+        The timeline is created from the database, or from the given playlist,
+        if it is not in cache or if it is outdated. The created timeline is
+        saved in cache.
+
+        Args:
+            playlist (list): ongoing entries, in order, with their song
+                selected. If given, the timeline in cache is created again if
+                it does not match them.
+
+        Returns:
+            PlaylistTimeline: timeline of the playlist.
+        """
+        timeline = cls.get()
+
+        if (
+            timeline is not None
+            and not timeline.outdated
+            and (playlist is None or timeline.matches(playlist))
+        ):
+            return timeline
+
+        version = timeline.version if timeline is not None else 0
+
+        if playlist is not None:
+            timeline = cls.create_from_playlist(playlist)
+
+        else:
+            timeline = cls()
+            timeline.refresh()
+
+        timeline.version = version
+        timeline.save()
+
+        return timeline
+
+    @classmethod
+    def get(cls):
+        """Retrieve the timeline in cache
+
+        Returns:
+            PlaylistTimeline: timeline of the playlist, or None if it is not
+            in cache. It may be outdated.
+        """
+        return cache.get(cls.TIMELINE_NAME)
+
+    @classmethod
+    def invalidate(cls):
+        """Mark the timeline in cache as outdated
+
+        The timeline will be created again from the database the next time it
+        is retrieved with `get_or_create`, and will keep its version. The
+        version is incremented even if the timeline was already outdated, so
+        that each change can be noticed.
+        """
+        timeline = cls.get()
+        if timeline is None:
+            return
+
+        timeline.outdated = True
+        timeline.save()
+
+    def save(self):
+        """Save timeline in cache and increment its version
+        """
+        self.version += 1
+        cache.set(self.TIMELINE_NAME, self)
@@ -1,4 +1,3 @@
-from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import permissions
 from django.contrib.auth import get_user_model
 
@@ -69,9 +68,8 @@ class IsSongEnabled(BasePermissionCustom):
             return True
 
         # check the song has no disabled tags
-        try:
-            song = Song.objects.get(pk=song_id)
-            return not any([t.disabled for t in song.tags.all()])
+        is_hidden = (
+            Song.objects.filter(pk=song_id).values_list("is_hidden", flat=True).first()
+        )
 
-        except ObjectDoesNotExist:
-            return True
+        return not is_hidden
@@ -31,6 +31,17 @@ class PlaylistEntrySerializer(serializers.ModelSerializer):
         fields = ("id", "date_created", "owner", "song", "song_id", "use_instrumental")
         read_only_fields = ("date_created",)
 
+    @staticmethod
+    def get_prefetch_lookups():
+        """Get the lookups to prefetch the nested relations of entries
+
+        The song and the owner should be selected with `select_related`.
+
+        Returns:
+            list: lookups to give to `prefetch_related`.
+        """
+        return SongSerializer.get_prefetch_lookups("song__")
+
     def validate(self, data):
         if data.get("use_instrumental") and not data["song"].has_instrumental:
             raise serializers.ValidationError("Song does not have instrumental")
@@ -50,6 +61,17 @@ class PlaylistEntryForPlayerSerializer(serializers.ModelSerializer):
         fields = ("id", "song", "date_created", "owner", "use_instrumental")
         read_only_fields = ("date_created",)
 
+    @staticmethod
+    def get_prefetch_lookups():
+        """Get the lookups to prefetch the nested relations of entries
+
+        The song and the owner should be selected with `select_related`.
+
+        Returns:
+            list: lookups to give to `prefetch_related`.
+        """
+        return SongForPlayerSerializer.get_prefetch_lookups("song__")
+
 
 class PlaylistEntryWithDatePlaySerializer(PlaylistEntrySerializer):
     """Playlist entry serializer
@@ -140,7 +162,7 @@ class PlayerStatusSerializer(serializers.Serializer):
         return playlist_entry
 
     def validate_event(self, event):
-        player = Player.get_or_create()
+        player = self.instance or Player.get_or_create()
 
         # Idle state
         if player.playlist_entry is None:
@@ -204,10 +226,11 @@ class PlayerErrorSerializer(serializers.ModelSerializer):
     def validate_playlist_entry_id(self, playlist_entry):
         # check the playlist entry is currently playing, or was played, or is
         # about to be played
+        playing_entry = PlaylistEntry.objects.get_playing()
         if not (
-            playlist_entry == PlaylistEntry.objects.get_playing()
+            playlist_entry == playing_entry
             or playlist_entry in PlaylistEntry.objects.get_playlist_played()
-            or PlaylistEntry.objects.get_playing() is None
+            or playing_entry is None
             and playlist_entry == PlaylistEntry.objects.get_next()
         ):
             raise serializers.ValidationError(
@@ -0,0 +1,91 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from library.models import Song
+from library.signals import songs_updated
+from playlist.models import PlaylistEntry, PlaylistTimeline
+
+
+@receiver(post_save, sender=PlaylistEntry)
+@receiver(post_delete, sender=PlaylistEntry)
+def clear_playing_entry_id(sender, instance, **kwargs):
+    """Forget the ID of the current playlist entry if the entry may change it
+
+    Entries which have never played and are not the current entry do not
+    change which entry is playing.
+    """
+    if (
+        instance.date_played is not None
+        or PlaylistEntry.objects.get_playing_id() == instance.pk
+    ):
+        PlaylistEntry.objects.clear_playing_id()
+
+
+@receiver(post_save, sender=PlaylistEntry)
+def update_timeline(sender, instance, created, **kwargs):
+    """Update the timeline of the playlist with a saved entry
+
+    New entries are added at the end of the playlist and entries which have
+    played leave it. Other changes, like a move or an entry queued again,
+    cannot be applied incrementally and mark the timeline as outdated.
+    """
+    timeline = PlaylistTimeline.get()
+    if timeline is None:
+        return
+
+    # the version of an outdated timeline is still incremented, so that copies
+    # of the timeline retrieved before the change are discarded
+    if timeline.outdated:
+        PlaylistTimeline.invalidate()
+        return
+
+    if instance.date_played is not None or instance.was_played:
+        if instance.pk not in timeline.entries_id:
+            return
+
+        timeline.remove(instance.pk)
+        timeline.save()
+        return
+
+    if created:
+        timeline.add(instance)
+        timeline.save()
+        return
+
+    PlaylistTimeline.invalidate()
+
+
+@receiver(post_delete, sender=PlaylistEntry)
+def update_deleted_timeline(sender, instance, **kwargs):
+    """Remove a deleted entry from the timeline of the playlist
+
+    Entries deleted in cascade, when their song is deleted, are removed as
+    well.
+    """
+    timeline = PlaylistTimeline.get()
+    if timeline is None or timeline.outdated or instance.pk not in timeline.entries_id:
+        return
+
+    timeline.remove(instance.pk)
+    timeline.save()
+
+
+@receiver(post_save, sender=Song)
+def invalidate_song_timeline(sender, instance, created, update_fields=None, **kwargs):
+    """Mark the timeline as outdated if the duration of a song may have changed
+    """
+    if created or (update_fields is not None and "duration" not in update_fields):
+        return
+
+    PlaylistTimeline.invalidate()
+
+
+@receiver(songs_updated, sender=Song)
+def invalidate_songs_timeline(sender, fields, **kwargs):
+    """Mark the timeline as outdated if the duration of songs saved in bulk
+    may have changed
+    """
+    if "duration" not in fields:
+        return
+
+    PlaylistTimeline.invalidate()
@@ -726,6 +726,7 @@ class TestDevice:
         await communicator.disconnect()
 
         # assert the play is stopped
+        player.invalidate_playlist_entry()
         assert player.playlist_entry is None
         assert player.timing == timedelta()
 
@@ -2,9 +2,11 @@ from datetime import datetime, timedelta
 from unittest.mock import MagicMock
 
 import pytest
+from django.core.cache import cache
 from django.db.utils import OperationalError
 
 from internal.tests.base_test import tz
+from library import bulk
 from playlist import models
 
 
@@ -74,6 +76,54 @@ class TestPlaylistEntry:
         ):
             models.PlaylistEntry.objects.get_playing()
 
+    def test_get_playing_cached(self, playlist_provider, django_assert_num_queries):
+        """Test the ID of the currently playing entry is kept in cache
+        """
+        cache.clear()
+
+        # assert the ID is searched once
+        with django_assert_num_queries(1):
+            assert models.PlaylistEntry.objects.get_playing() is None
+
+        with django_assert_num_queries(0):
+            assert models.PlaylistEntry.objects.get_playing() is None
+
+        # set playlist entry 1 is playing
+        playlist_provider.pe1.set_playing()
+
+        # assert the entry is obtained by its ID
+        assert models.PlaylistEntry.objects.get_playing_id() == playlist_provider.pe1.id
+        with django_assert_num_queries(1):
+            assert models.PlaylistEntry.objects.get_playing() == playlist_provider.pe1
+
+        # set playlist entry 1 finished
+        playlist_provider.pe1.set_finished()
+
+        # assert no entry is playing without query
+        with django_assert_num_queries(0):
+            assert models.PlaylistEntry.objects.get_playing() is None
+
+    def test_get_playing_cache_cleared(self, playlist_provider):
+        """Test the ID of the currently playing entry is forgotten on change
+        """
+        playlist_provider.pe1.set_playing()
+
+        # add a new entry
+        models.PlaylistEntry.objects.create(
+            song=playlist_provider.song1, owner=playlist_provider.user
+        )
+
+        # assert the ID is still known
+        assert models.PlaylistEntry.objects.get_playing_id() == playlist_provider.pe1.id
+
+        # reset playlist entry 1 without the model methods
+        playlist_provider.pe1.date_played = None
+        playlist_provider.pe1.save()
+
+        # assert the ID is forgotten
+        assert models.PlaylistEntry.objects.get_playing_id() is None
+        assert models.PlaylistEntry.objects.get_playing() is None
+
     def test_get_playlist_normal(self, playlist_provider):
         """Test to get the playlist
         """
@@ -128,6 +178,27 @@ class TestPlaylistEntry:
         assert len(playlist) == 1
         assert playlist[0] == playlist_provider.pe2
 
+    def test_get_playlist_durations(self, playlist_provider):
+        """Test to get the cumulated durations of the playlist
+        """
+        # assert the durations are cumulated in order
+        assert models.PlaylistEntry.objects.get_playlist_durations() == [
+            (playlist_provider.pe1.id, playlist_provider.song1.duration),
+            (
+                playlist_provider.pe2.id,
+                playlist_provider.song1.duration + playlist_provider.song2.duration,
+            ),
+        ]
+
+        # set playlist entry 1 is playing
+        playlist_provider.pe1.date_played = datetime.now(tz)
+        playlist_provider.pe1.save()
+
+        # assert only playlist entry 2 remains
+        assert models.PlaylistEntry.objects.get_playlist_durations() == [
+            (playlist_provider.pe2.id, playlist_provider.song2.duration)
+        ]
+
     def test_get_playlist_played_normal(self, playlist_provider):
         """Test to get the playlist of played entries
         """
@@ -323,6 +394,295 @@ class TestPlaylistEntry:
             playlist_entry_current.set_finished()
 
 
+@pytest.mark.django_db(transaction=True)
+class TestPlayer:
+    """Test the Player class
+    """
+
+    def test_playlist_entry(self, playlist_provider, django_assert_num_queries):
+        """Test the current playlist entry is kept by the player
+        """
+        playlist_provider.pe1.set_playing()
+        player = models.Player()
+
+        # assert the entry is obtained once with its song and owner
+        with django_assert_num_queries(1):
+            assert player.playlist_entry == playlist_provider.pe1
+            assert player.playlist_entry.song == playlist_provider.song1
+            assert player.playlist_entry.owner == playlist_provider.manager
+
+        # set playlist entry 1 finished
+        playlist_provider.pe1.set_finished()
+
+        # assert the entry is kept until invalidated
+        assert player.playlist_entry == playlist_provider.pe1
+        player.invalidate_playlist_entry()
+        assert player.playlist_entry is None
+
+    def test_playlist_entry_not_saved(self, playlist_provider):
+        """Test the current playlist entry is not stored in cache
+        """
+        playlist_provider.pe1.set_playing()
+        player = models.Player()
+        assert player.playlist_entry == playlist_provider.pe1
+        player.save()
+
+        # set playlist entry 1 finished
+        playlist_provider.pe1.set_finished()
+
+        # assert the player from cache gets the entry again
+        assert models.Player.get_or_create().playlist_entry is None
+
+
+@pytest.mark.django_db(transaction=True)
+class TestPlaylistTimeline:
+    """Test the PlaylistTimeline class
+    """
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        cache.clear()
+
+    def test_get_or_create(self, playlist_provider):
+        """Test to create the timeline from the database
+        """
+        timeline = models.PlaylistTimeline.get_or_create()
+
+        # assert the timeline
+        assert timeline.entries_id == [
+            playlist_provider.pe1.id,
+            playlist_provider.pe2.id,
+        ]
+        assert timeline.get_durations() == [
+            playlist_provider.song1.duration,
+            playlist_provider.song2.duration,
+        ]
+        assert timeline.version == 1
+
+        # assert the timeline is in cache
+        assert models.PlaylistTimeline.get_or_create().version == 1
+
+    def test_get_or_create_playlist(self, playlist_provider):
+        """Test to create the timeline again when it does not match a playlist
+        """
+        timeline = models.PlaylistTimeline.get_or_create()
+        timeline.remove(playlist_provider.pe1.id)
+        timeline.save()
+
+        # assert the timeline is created again from the playlist
+        playlist = list(models.PlaylistEntry.objects.get_playlist())
+        timeline = models.PlaylistTimeline.get_or_create(playlist)
+        assert timeline.matches(playlist)
+        assert timeline.version == 3
+
+        # assert the timeline is kept when it matches the playlist
+        assert models.PlaylistTimeline.get_or_create(playlist).version == 3
+
+    def test_set_dates_play(self, playlist_provider):
+        """Test to set when the entries of the playlist are supposed to play
+        """
+        date = datetime.now(tz)
+        playlist = list(models.PlaylistEntry.objects.get_playlist())
+        timeline = models.PlaylistTimeline.create_from_playlist(playlist)
+
+        # assert the dates of play
+        date_end = timeline.set_dates_play(playlist, date)
+        assert playlist[0].date_play == date
+        assert playlist[1].date_play == date + playlist_provider.song1.duration
+        assert date_end == (
+            date + playlist_provider.song1.duration + playlist_provider.song2.duration
+        )
+
+    def test_set_dates_play_empty(self):
+        """Test to get the end of an empty playlist
+        """
+        date = datetime.now(tz)
+        timeline = models.PlaylistTimeline()
+
+        # assert the playlist ends now
+        assert timeline.set_dates_play([], date) == date
+
+    def test_add_remove(self, playlist_provider):
+        """Test to add and remove entries
+        """
+        timeline = models.PlaylistTimeline()
+        timeline.add(playlist_provider.pe1)
+        timeline.add(playlist_provider.pe2)
+        timeline.add(playlist_provider.pe1)
+
+        # assert the entries are added once
+        assert timeline.entries_id == [
+            playlist_provider.pe1.id,
+            playlist_provider.pe2.id,
+        ]
+        assert timeline.duration == (
+            playlist_provider.song1.duration + playlist_provider.song2.duration
+        )
+
+        # remove the first entry
+        timeline.remove(playlist_provider.pe1.id)
+        timeline.remove(playlist_provider.pe1.id)
+
+        # assert the durations are cumulated again
+        assert timeline.entries_id == [playlist_provider.pe2.id]
+        assert timeline.durations_cumulated == [playlist_provider.song2.duration]
+
+    def test_move(self, playlist_provider):
+        """Test to move entries
+        """
+        timeline = models.PlaylistTimeline()
+        timeline.set_durations([1, 2, 3], [timedelta(seconds=s) for s in (1, 2, 3)])
+
+        # move the last entry before the first one
+        timeline.move(3, 1)
+        assert timeline.entries_id == [3, 1, 2]
+        assert timeline.get_durations() == [
+            timedelta(seconds=3),
+            timedelta(seconds=1),
+            timedelta(seconds=2),
+        ]
+
+        # move the first entry after the last one
+        timeline.move(3, 2, after=True)
+        assert timeline.entries_id == [1, 2, 3]
+        assert timeline.durations_cumulated == [
+            timedelta(seconds=1),
+            timedelta(seconds=3),
+            timedelta(seconds=6),
+        ]
+
+    def test_set_playing(self, playlist_provider):
+        """Test an entry leaves the timeline when it starts to play
+        """
+        timeline = models.PlaylistTimeline.get_or_create()
+        assert playlist_provider.pe1.id in timeline.entries_id
+
+        playlist_provider.pe1.set_playing()
+
+        # assert the entry is not in the timeline any more
+        timeline = models.PlaylistTimeline.get_or_create()
+        assert timeline.entries_id == [playlist_provider.pe2.id]
+
+    def test_matches_durations(self, playlist_provider):
+        """Test a timeline does not match a playlist with other durations
+        """
+        playlist = list(models.PlaylistEntry.objects.get_playlist())
+        timeline = models.PlaylistTimeline.create_from_playlist(playlist)
+        assert timeline.matches(playlist)
+
+        # change the duration of a song
+        playlist[0].song.duration += timedelta(seconds=10)
+
+        # assert the timeline does not match
+        assert not timeline.matches(playlist)
+
+    def test_move_unknown(self, playlist_provider):
+        """Test to move an entry unknown by the timeline
+        """
+        timeline = models.PlaylistTimeline()
+
+        # assert the timeline is created again from the database
+        timeline.move(playlist_provider.pe2.id, playlist_provider.pe1.id)
+        assert timeline.entries_id == [
+            playlist_provider.pe1.id,
+            playlist_provider.pe2.id,
+        ]
+        assert timeline.duration == (
+            playlist_provider.song1.duration + playlist_provider.song2.duration
+        )
+
+    def test_invalidate(self, playlist_provider):
+        """Test an outdated timeline is created again and keeps its version
+        """
+        models.PlaylistTimeline.get_or_create()
+        models.PlaylistTimeline.invalidate()
+        assert models.PlaylistTimeline.get().outdated
+
+        # assert the timeline is created again
+        timeline = models.PlaylistTimeline.get_or_create()
+        assert not timeline.outdated
+        assert timeline.version == 3
+
+    def test_signal_create_delete(self, playlist_provider):
+        """Test entries are added and removed by signals
+        """
+        models.PlaylistTimeline.get_or_create()
+
+        # create an entry
+        playlist_entry = models.PlaylistEntry.objects.create(
+            song=playlist_provider.song1, owner=playlist_provider.manager
+        )
+
+        # assert the entry is added at the end of the timeline
+        timeline = models.PlaylistTimeline.get()
+        assert not timeline.outdated
+        assert timeline.entries_id == [
+            playlist_provider.pe1.id,
+            playlist_provider.pe2.id,
+            playlist_entry.id,
+        ]
+
+        # delete the song of the first entry
+        playlist_provider.song1.delete()
+
+        # assert the entries of the song are removed in cascade
+        timeline = models.PlaylistTimeline.get()
+        assert not timeline.outdated
+        assert timeline.entries_id == [playlist_provider.pe2.id]
+        assert timeline.duration == playlist_provider.song2.duration
+
+    def test_signal_queued_again(self, playlist_provider):
+        """Test a played entry queued again outdates the timeline
+        """
+        models.PlaylistTimeline.get_or_create()
+
+        # queue a played entry again
+        playlist_provider.pe3.date_played = None
+        playlist_provider.pe3.was_played = False
+        playlist_provider.pe3.save()
+
+        # assert the timeline is created again with the entry
+        assert models.PlaylistTimeline.get().outdated
+        timeline = models.PlaylistTimeline.get_or_create()
+        assert playlist_provider.pe3.id in timeline.entries_id
+
+    def test_signal_song_duration(self, playlist_provider):
+        """Test a change of the duration of a song outdates the timeline
+        """
+        models.PlaylistTimeline.get_or_create()
+
+        # change the duration of a song
+        playlist_provider.song1.duration = timedelta(seconds=60)
+        playlist_provider.song1.save()
+
+        # assert the timeline is created again with the new duration
+        assert models.PlaylistTimeline.get().outdated
+        timeline = models.PlaylistTimeline.get_or_create()
+        assert timeline.get_durations() == [
+            timedelta(seconds=60),
+            playlist_provider.song2.duration,
+        ]
+
+    def test_signal_songs_duration_bulk(self, playlist_provider):
+        """Test a change of the duration of songs in bulk outdates the timeline
+        """
+        models.PlaylistTimeline.get_or_create()
+
+        # change the duration of a song in bulk
+        bulk.save_songs_fields(
+            [{"id": playlist_provider.song1.id, "duration": timedelta(seconds=60)}],
+            revision=1,
+        )
+
+        # assert the timeline is created again with the new duration
+        assert models.PlaylistTimeline.get().outdated
+        timeline = models.PlaylistTimeline.get_or_create()
+        assert timeline.get_durations() == [
+            timedelta(seconds=60),
+            playlist_provider.song2.duration,
+        ]
+
+
 class TestKaraoke:
     """Test the Karaoke class
     """
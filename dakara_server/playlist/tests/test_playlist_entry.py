@@ -1,12 +1,23 @@
 from unittest.mock import ANY, patch
 from datetime import datetime, timedelta
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.dateparse import parse_datetime
 from rest_framework import status
 
 from internal.tests.base_test import tz, UserModel
-from playlist.models import PlaylistEntry, Player, Karaoke
+from library import bulk
+from library.models import (
+    Artist,
+    Song,
+    SongWorkLink,
+    Work,
+    WorkAlternativeTitle,
+    WorkType,
+)
+from playlist.models import PlaylistEntry, PlaylistTimeline, Player, Karaoke
 from playlist.tests.base_test import PlaylistAPITestCase
 
 
@@ -52,6 +63,47 @@ class PlaylistEntryListViewTestCase(PlaylistAPITestCase):
         self.assertEqual(parse_datetime(pe1["date_play"]), now)
         self.assertEqual(parse_datetime(pe2["date_play"]), now + self.pe1.song.duration)
 
+    def test_get_playlist_entries_list_queries(self):
+        """Test the amount of queries does not depend on the amount of entries
+        """
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # add relations to songs
+        work_type = WorkType.objects.create(query_name="wt1")
+        work = Work.objects.create(title="Work1", work_type=work_type)
+        WorkAlternativeTitle.objects.create(title="AltTitle1", work=work)
+        artist = Artist.objects.create(name="Artist1")
+        self.song1.artists.add(artist)
+        SongWorkLink.objects.create(
+            song=self.song1, work=work, link_type=SongWorkLink.OPENING
+        )
+
+        # the current entry is known
+        PlaylistEntry.objects.get_playing()
+
+        # Get playlist entries list
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # add more entries with songs having relations
+        for index in range(3, 6):
+            song = Song.objects.create(title="Song{}".format(index))
+            song.artists.add(artist)
+            SongWorkLink.objects.create(
+                song=song, work=work, link_type=SongWorkLink.OPENING
+            )
+            PlaylistEntry.objects.create(song=song, owner=self.user)
+
+        # Get playlist entries list again
+        with self.assertNumQueries(len(context.captured_queries)):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 5)
+
     @patch(
         "playlist.views.datetime",
         side_effect=lambda *args, **kwargs: datetime(*args, **kwargs),
@@ -102,6 +154,40 @@ class PlaylistEntryListViewTestCase(PlaylistAPITestCase):
             now + self.pe1.song.duration - play_duration,
         )
 
+    @patch(
+        "playlist.views.datetime",
+        side_effect=lambda *args, **kwargs: datetime(*args, **kwargs),
+    )
+    def test_get_playlist_entries_list_timeline_outdated(self, mocked_datetime):
+        """Test the timeline is created again if it does not match the playlist
+        """
+        # patch the now method
+        now = datetime.now(tz)
+        mocked_datetime.now.return_value = now
+
+        # set an outdated timeline
+        timeline = PlaylistTimeline()
+        timeline.set_durations([self.pe2.id], [timedelta(seconds=60)])
+        timeline.save()
+
+        # Login as simple user
+        self.authenticate(self.user)
+
+        # Get playlist entries list
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # check the date of the end of the playlist
+        self.assertEqual(
+            parse_datetime(response.data["date_end"]),
+            now + self.pe1.song.duration + self.pe2.song.duration,
+        )
+
+        # check the timeline was updated
+        timeline = PlaylistTimeline.get_or_create()
+        self.assertListEqual(timeline.entries_id, [self.pe1.id, self.pe2.id])
+        self.assertEqual(timeline.version, 2)
+
     def test_get_playlist_entries_list_forbidden(self):
         """Test to verify playlist entries list forbidden when not logged in
         """
@@ -118,6 +204,7 @@ class PlaylistEntryListViewTestCase(PlaylistAPITestCase):
 
         # Pre assert 4 entries in database
         self.assertEqual(PlaylistEntry.objects.count(), 4)
+        PlaylistTimeline.get_or_create()
 
         # Post new playlist entry
         response = self.client.post(
@@ -134,6 +221,13 @@ class PlaylistEntryListViewTestCase(PlaylistAPITestCase):
         # Entry's owner is the user who created it
         self.assertEqual(new_entry.owner, self.p_user)
 
+        # check the entry was added to the timeline
+        timeline = PlaylistTimeline.get_or_create()
+        self.assertListEqual(
+            timeline.entries_id, [self.pe1.id, self.pe2.id, new_entry.id]
+        )
+        self.assertEqual(timeline.version, 2)
+
         # check the player was not requested to play this entry immediately
         mocked_send_to_channel.assert_not_called()
 
@@ -245,6 +339,72 @@ class PlaylistEntryListViewTestCase(PlaylistAPITestCase):
         # post assert there are still 4 in database
         self.assertEqual(PlaylistEntry.objects.count(), 4)
 
+    @patch("playlist.views.settings")
+    def test_post_create_playlist_entry_playlist_full_song_deleted(self, mock_settings):
+        """Test entries deleted with their song are not counted
+        """
+        # mock the settings
+        mock_settings.PLAYLIST_SIZE_LIMIT = 2
+
+        # Login as playlist user
+        self.authenticate(self.p_user)
+        PlaylistTimeline.get_or_create()
+
+        # the song of pe1 is deleted by the feeder
+        bulk.delete_songs([self.song1.id])
+        self.assertFalse(PlaylistEntry.objects.filter(pk=self.pe1.pk).exists())
+
+        # Post new playlist entry
+        response = self.client.post(self.url, {"song_id": self.song2.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @patch("playlist.views.settings")
+    def test_post_create_playlist_entry_playlist_full_queued_again(self, mock_settings):
+        """Test entries queued again by the player are counted
+        """
+        # mock the settings
+        mock_settings.PLAYLIST_SIZE_LIMIT = 2
+
+        # Login as playlist user
+        self.authenticate(self.p_user)
+        PlaylistTimeline.get_or_create()
+
+        # pe1 plays, then is queued again when the player disconnects
+        self.pe1.set_playing()
+        self.pe1.date_played = None
+        self.pe1.save()
+
+        # Post new playlist entry
+        response = self.client.post(self.url, {"song_id": self.song1.id})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertIn("Playlist is full, please retry later", str(response.content))
+
+    def test_post_create_playlist_entry_date_stop_queued_again(self):
+        """Test the song of an entry queued again counts for the date stop
+        """
+        # set kara stop
+        karaoke = Karaoke.objects.get_object()
+        karaoke.date_stop = datetime.now(tz) + timedelta(seconds=30)
+        karaoke.save()
+
+        # login as user
+        self.authenticate(self.p_user)
+        PlaylistTimeline.get_or_create()
+
+        # pe2 plays, then is queued again with a song lengthened meanwhile
+        self.pe2.set_playing()
+        self.song2.duration = timedelta(minutes=1)
+        self.song2.save()
+        self.pe2.date_played = None
+        self.pe2.save()
+
+        # request to add a new entry
+        response = self.client.post(self.url, {"song_id": self.song1.id})
+
+        # assert that the request is denied
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertIn("This song exceeds the karaoke stop time", str(response.content))
+
     def test_post_create_playlist_entry_date_stop_success(self):
         """Test user can add a song to playlist when before date stop
         """
@@ -267,6 +427,40 @@ class PlaylistEntryListViewTestCase(PlaylistAPITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(PlaylistEntry.objects.count(), 5)
 
+    def test_post_create_playlist_entry_date_stop_queries(self):
+        """Test the amount of queries to add an entry does not depend on the queue
+        """
+        # set kara stop
+        karaoke = Karaoke.objects.get_object()
+        karaoke.date_stop = datetime.now(tz) + timedelta(hours=2)
+        karaoke.save()
+
+        # login as user
+        self.authenticate(self.p_user)
+        PlaylistTimeline.get_or_create()
+        PlaylistEntry.objects.get_playing()
+
+        # request to add a new entry
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(self.url, {"song_id": self.song1.id})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        queries_count = len(context.captured_queries)
+
+        # add more entries
+        for _ in range(5):
+            response = self.client.post(self.url, {"song_id": self.song2.id})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # request to add a new entry again
+        with self.assertNumQueries(queries_count):
+            response = self.client.post(self.url, {"song_id": self.song1.id})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            PlaylistTimeline.get_or_create().duration, timedelta(seconds=75)
+        )
+
     def test_post_create_playlist_entry_date_stop_forbidden(self):
         """Test user cannot add song to playlist after its date stop
         """
@@ -497,6 +691,8 @@ class PlaylistEntryViewTestCase(PlaylistAPITestCase):
         # Pre assert 4 entries in database
         self.assertEqual(PlaylistEntry.objects.count(), 4)
 
+        PlaylistTimeline.get_or_create()
+
         # Delete playlist entries created by self
         response = self.client.delete(self.url_pe2)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
@@ -506,6 +702,11 @@ class PlaylistEntryViewTestCase(PlaylistAPITestCase):
         entries = PlaylistEntry.objects.filter(id=self.pe2.id)
         self.assertEqual(len(entries), 0)
 
+        # This playlist entry has been removed from the timeline
+        timeline = PlaylistTimeline.get_or_create()
+        self.assertListEqual(timeline.entries_id, [self.pe1.id])
+        self.assertEqual(timeline.duration, self.pe1.song.duration)
+
         # Attempt to delete playlist entry created by other user
         response = self.client.delete(self.url_pe1)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -559,6 +760,8 @@ class PlaylistEntryViewTestCase(PlaylistAPITestCase):
         playlist = list(PlaylistEntry.objects.exclude(was_played=True))
         self.assertListEqual(playlist, [self.pe1, self.pe2])
 
+        PlaylistTimeline.get_or_create()
+
         # Reorder pe2 before pe1
         response = self.client.put(self.url_pe2, data={"before_id": self.pe1.id})
 
@@ -568,6 +771,13 @@ class PlaylistEntryViewTestCase(PlaylistAPITestCase):
         playlist = list(PlaylistEntry.objects.exclude(was_played=True))
         self.assertListEqual(playlist, [self.pe2, self.pe1])
 
+        # Check the timeline was reordered
+        timeline = PlaylistTimeline.get_or_create()
+        self.assertListEqual(timeline.entries_id, [self.pe2.id, self.pe1.id])
+        self.assertListEqual(
+            timeline.get_durations(), [self.pe2.song.duration, self.pe1.song.duration]
+        )
+
     def test_put_playlist_reorder_after(self):
         """Test playlist reorder after another entry
         """
@@ -578,6 +788,8 @@ class PlaylistEntryViewTestCase(PlaylistAPITestCase):
         playlist = list(PlaylistEntry.objects.exclude(was_played=True))
         self.assertListEqual(playlist, [self.pe1, self.pe2])
 
+        PlaylistTimeline.get_or_create()
+
         # Reorder pe1 after pe2
         response = self.client.put(self.url_pe1, data={"after_id": self.pe2.id})
 
@@ -587,6 +799,63 @@ class PlaylistEntryViewTestCase(PlaylistAPITestCase):
         playlist = list(PlaylistEntry.objects.exclude(was_played=True))
         self.assertListEqual(playlist, [self.pe2, self.pe1])
 
+        # Check the timeline was reordered
+        timeline = PlaylistTimeline.get_or_create()
+        self.assertListEqual(timeline.entries_id, [self.pe2.id, self.pe1.id])
+
+    def test_put_playlist_reorder_timeline_outdated(self):
+        """Test playlist reorder with an entry unknown by the timeline
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        # pe1 leaves the timeline when it plays
+        self.pe1.set_playing()
+        PlaylistTimeline.get_or_create()
+
+        # pe1 is queued again without the timeline to be notified
+        PlaylistEntry.objects.filter(pk=self.pe1.pk).update(date_played=None)
+
+        # Reorder pe2 before pe1
+        response = self.client.put(self.url_pe2, data={"before_id": self.pe1.id})
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        # Check the timeline was created again
+        timeline = PlaylistTimeline.get_or_create()
+        self.assertListEqual(timeline.entries_id, [self.pe2.id, self.pe1.id])
+
+    def test_put_playlist_reorder_timeline_changed(self):
+        """Test playlist reorder when the timeline changes during the move
+
+        The timeline in cache should not be overwritten by the moved copy.
+        """
+        # Login as manager
+        self.authenticate(self.manager)
+
+        PlaylistTimeline.get_or_create()
+        duration = timedelta(seconds=42)
+        above = PlaylistEntry.above
+
+        def above_changed(playlist_entry, other_entry):
+            # the duration of a song changes right before the move
+            Song.objects.filter(pk=self.pe1.song.pk).update(duration=duration)
+            PlaylistTimeline.invalidate()
+            above(playlist_entry, other_entry)
+
+        # Reorder pe2 before pe1
+        with patch.object(PlaylistEntry, "above", above_changed):
+            response = self.client.put(self.url_pe2, data={"before_id": self.pe1.id})
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        # Check the timeline was created again with the new duration
+        timeline = PlaylistTimeline.get_or_create()
+        self.assertListEqual(timeline.entries_id, [self.pe2.id, self.pe1.id])
+        self.assertListEqual(
+            timeline.get_durations(), [self.pe2.song.duration, duration]
+        )
+
     def test_put_playlist_reorder_entry_played(self):
         """Test cannot reorder before played entry
         """
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from django.utils import timezone
 from django.conf import settings
 from django.core.cache import cache
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
 from rest_framework import status
@@ -54,14 +55,38 @@ class PlaylistEntryView(drf_generics.DestroyAPIView):
             return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
 
         if "before_id" in serializer.data:
-            before_id = serializer.data["before_id"]
-            before_entry = get_object_or_404(self.get_queryset(), pk=before_id)
-            playlist_entry.above(before_entry)
+            other_entry = get_object_or_404(
+                self.get_queryset(), pk=serializer.data["before_id"]
+            )
+            after = False
 
         else:
-            after_id = serializer.data["after_id"]
-            after_entry = get_object_or_404(self.get_queryset(), pk=after_id)
-            playlist_entry.below(after_entry)
+            other_entry = get_object_or_404(
+                self.get_queryset(), pk=serializer.data["after_id"]
+            )
+            after = True
+
+        # the karaoke is locked during the move, so that entries cannot be
+        # added to the timeline meanwhile
+        with transaction.atomic():
+            models.Karaoke.objects.get_object_for_update()
+            version = models.PlaylistTimeline.get_or_create().version
+
+            if after:
+                playlist_entry.below(other_entry)
+
+            else:
+                playlist_entry.above(other_entry)
+
+            # the move marks the timeline as outdated, which increments its
+            # version; if the timeline has not changed otherwise since it was
+            # retrieved, the entry is moved in it incrementally, otherwise it
+            # stays outdated and will be created again from the database
+            timeline = models.PlaylistTimeline.get()
+            if timeline is not None and timeline.version == version + 1:
+                timeline.outdated = False
+                timeline.move(playlist_entry.id, other_entry.id, after=after)
+                timeline.save()
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -77,31 +102,83 @@ class PlaylistEntryListView(drf_generics.ListCreateAPIView):
         (permissions.IsPlaylistManager & library_permissions.IsLibraryManager)
         | permissions.IsSongEnabled,
     ]
-    queryset = models.PlaylistEntry.objects.get_playlist()
+    queryset = (
+        models.PlaylistEntry.objects.get_playlist()
+        .select_related("song", "owner")
+        .prefetch_related(*serializers.PlaylistEntrySerializer.get_prefetch_lookups())
+    )
 
     def get(self, request, *args, **kwargs):
-        queryset = self.queryset.all()
         player = models.Player.get_or_create()
         date = datetime.now(tz)
 
         # add player remaining time
-        if player.playlist_entry:
-            date += player.playlist_entry.song.duration - player.timing
+        playing_entry = player.playlist_entry
+        if playing_entry:
+            date += playing_entry.song.duration - player.timing
 
         # for each entry, compute when it is supposed to play
-        for playlist_entry in queryset:
-            playlist_entry.date_play = date
-            date += playlist_entry.song.duration
+        playlist = list(self.queryset.all())
+        timeline = models.PlaylistTimeline.get_or_create(playlist)
+        date_end = timeline.set_dates_play(playlist, date)
 
         serializer = serializers.PlaylistEntriesWithDateEndSerializer(
-            {"results": queryset, "date_end": date}, context={"request": request}
+            {"results": playlist, "date_end": date_end}, context={"request": request}
         )
 
         return Response(serializer.data)
 
     def perform_create(self, serializer):
+        # the karaoke is locked until the entry is created, so that concurrent
+        # creations are checked one after the other against the timeline
+        with transaction.atomic():
+            karaoke = models.Karaoke.objects.get_object_for_update()
+            player = models.Player.get_or_create()
+            playing_entry = player.playlist_entry
+            timeline = models.PlaylistTimeline.get_or_create()
+
+            self.check_create(serializer, karaoke, player, playing_entry, timeline)
+
+            playlist_was_empty = playing_entry is None and not timeline.entries_id
+
+            # add the owner to the serializer and create data, the entry is
+            # added to the timeline by signal
+            serializer.save(owner=self.request.user)
+
+        # TODO broadcast that a new entry has been created
+
+        # Request the player to play the new playlist entry immediately if :
+        #   - the playlist was empty beforehand, so the new entry is the next
+        #     one, and the player was idle;
+        #   - player is set to play next song.
+        if playlist_was_empty and karaoke.player_play_next_song:
+            send_to_channel(
+                "playlist.device",
+                "send_playlist_entry",
+                {"playlist_entry": serializer.instance},
+            )
+
+    def check_create(self, serializer, karaoke, player, playing_entry, timeline):
+        """Check if a new entry can be created
+
+        The checks use the timeline of the playlist, so that they do not
+        depend on the amount of entries. The timeline is kept up to date by
+        signals when entries or songs change, and is created again from the
+        database when it is outdated.
+
+        Args:
+            serializer (serializers.PlaylistEntrySerializer): validated
+                serializer of the new entry.
+            karaoke (models.Karaoke): current karaoke.
+            player (models.Player): current player.
+            playing_entry (models.PlaylistEntry): entry currently playing, if
+                any.
+            timeline (models.PlaylistTimeline): timeline of the playlist.
+
+        Raises:
+            PermissionDenied: if the entry cannot be created.
+        """
         # Deny creation if kara is not ongoing
-        karaoke = models.Karaoke.objects.get_object()
         if not karaoke.ongoing:
             raise PermissionDenied(detail="Karaoke is not ongoing.")
 
@@ -118,10 +195,7 @@ class PlaylistEntryListView(drf_generics.ListCreateAPIView):
 
         # Deny the creation of a new playlist entry if it exceeds the playlist
         # capacity set in settings.
-        queryset = self.filter_queryset(self.get_queryset())
-        count = queryset.count()
-
-        if count >= settings.PLAYLIST_SIZE_LIMIT:
+        if len(timeline.entries_id) >= settings.PLAYLIST_SIZE_LIMIT:
             raise PermissionDenied(detail="Playlist is full, please retry later.")
 
         # Deny the creation of a new playlist entry if it exceeds karaoke stop
@@ -134,17 +208,14 @@ class PlaylistEntryListView(drf_generics.ListCreateAPIView):
             self.request.user.is_playlist_manager or self.request.user.is_superuser
         ):
             # compute playlist end date
-            playlist = self.filter_queryset(self.get_queryset())
-            player = models.Player.get_or_create()
             date = datetime.now(tz)
 
             # add player remaining time
-            if player.playlist_entry:
-                date += player.playlist_entry.song.duration - player.timing
+            if playing_entry:
+                date += playing_entry.song.duration - player.timing
 
             # compute end time of playlist
-            for playlist_entry in playlist:
-                date += playlist_entry.song.duration
+            date += timeline.duration
 
             # add current entry duration
             date += serializer.validated_data["song"].duration
@@ -153,34 +224,6 @@ class PlaylistEntryListView(drf_generics.ListCreateAPIView):
             if date > karaoke.date_stop:
                 raise PermissionDenied("This song exceeds the karaoke stop time")
 
-        playlist_was_empty = models.PlaylistEntry.objects.get_next() is None
-
-        # add the owner to the serializer and create data
-        serializer.save(owner=self.request.user)
-
-        # TODO broadcast that a new entry has been created
-
-        # Request the player to play the latest playlist entry immediately if :
-        #   - it exists;
-        #   - the playlist was empty beforehand;
-        #   - player is set to play next song
-        #   - the player is idle.
-        next_playlist_entry = models.PlaylistEntry.objects.get_next()
-        player = models.Player.get_or_create()
-        if all(
-            (
-                next_playlist_entry is not None,
-                playlist_was_empty,
-                karaoke.player_play_next_song,
-                player.playlist_entry is None,
-            )
-        ):
-            send_to_channel(
-                "playlist.device",
-                "send_playlist_entry",
-                {"playlist_entry": next_playlist_entry},
-            )
-
 
 class PlaylistPlayedEntryListView(drf_generics.ListAPIView):
     """List of played entries
@@ -188,7 +231,11 @@ class PlaylistPlayedEntryListView(drf_generics.ListAPIView):
 
     pagination_class = PlaylistEntryPagination
     serializer_class = serializers.PlaylistPlayedEntryWithDatePlayedSerializer
-    queryset = models.PlaylistEntry.objects.get_playlist_played()
+    queryset = (
+        models.PlaylistEntry.objects.get_playlist_played()
+        .select_related("song", "owner")
+        .prefetch_related(*serializers.PlaylistEntrySerializer.get_prefetch_lookups())
+    )
 
 
 class PlayerCommandView(drf_generics.UpdateAPIView):
@@ -313,7 +360,8 @@ class KaraokeView(drf_generics.RetrieveUpdateAPIView):
             player = models.Player()
             player.save()
 
-            # empty the playlist
+            # empty the playlist, the entries are removed from the timeline by
+            # signal
             models.PlaylistEntry.objects.all().delete()
 
             # empty the player errors
@@ -386,6 +434,7 @@ class PlayerStatusView(drf_generics.RetrieveUpdateAPIView):
         """
         # set the playlist entry as finished
         playlist_entry.set_finished()
+        player.invalidate_playlist_entry()
 
         # reset the player
         player.reset()
@@ -402,6 +451,7 @@ class PlayerStatusView(drf_generics.RetrieveUpdateAPIView):
         # set the playlist entry as started and already finished
         playlist_entry.set_playing()
         playlist_entry.set_finished()
+        player.invalidate_playlist_entry()
 
         # log the info
         logger.debug("The player could not play '%s'", playlist_entry)
@@ -414,6 +464,7 @@ class PlayerStatusView(drf_generics.RetrieveUpdateAPIView):
         """
         # set the playlist entry as started
         playlist_entry.set_playing()
+        player.invalidate_playlist_entry()
 
         # update the player
         player.update(in_transition=True, timing=timedelta(seconds=0))
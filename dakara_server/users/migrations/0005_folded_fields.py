@@ -0,0 +1,73 @@
+# Generated by Django 2.2.28 on 2026-10-16 20:51
+
+from django.db import migrations
+import internal.fields
+
+
+def fill_username_folded(apps, schema_editor):
+    """Fold the usernames of existing users
+
+    The folded usernames must be unique. As folding is more aggressive than
+    the case insensitive comparison used before, the migration fails if
+    several users have the same folded username.
+    """
+    DakaraUser = apps.get_model("users", "DakaraUser")
+    field = DakaraUser._meta.get_field("username_folded")
+
+    users = list(DakaraUser.objects.only("pk", "username"))
+    users_by_username_folded = {}
+    for user in users:
+        field.pre_save(user, False)
+        users_by_username_folded.setdefault(user.username_folded, []).append(
+            user.username
+        )
+
+    collisions = [
+        usernames
+        for usernames in users_by_username_folded.values()
+        if len(usernames) > 1
+    ]
+    if collisions:
+        raise ValueError(
+            "Some users have usernames which only differ by case, rename them "
+            "before migrating: {}".format(
+                "; ".join(", ".join(usernames) for usernames in collisions)
+            )
+        )
+
+    DakaraUser.objects.bulk_update(users, ["username_folded"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_auto_20200329_1303"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dakarauser",
+            name="username_folded",
+            field=internal.fields.FoldedCharField(
+                db_index=True,
+                default="",
+                editable=False,
+                keep_accents=True,
+                max_length=150,
+                source="username",
+            ),
+        ),
+        migrations.RunPython(fill_username_folded, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="dakarauser",
+            name="username_folded",
+            field=internal.fields.FoldedCharField(
+                default="",
+                editable=False,
+                keep_accents=True,
+                max_length=150,
+                source="username",
+                unique=True,
+            ),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 from django.core.exceptions import ObjectDoesNotExist
 
+from internal.fields import FoldedCharField, fold
+
 
 class DakaraUserManager(UserManager):
     """Custom user manager to handle case insensitive usernames
@@ -10,7 +12,7 @@ class DakaraUserManager(UserManager):
     def get_by_natural_key(self, username):
         """Search a username case insensitively
         """
-        return self.get(username__iexact=username)
+        return self.get(username_folded=fold(username, keep_accents=True))
 
     def _create_user(self, username, *args, **kwargs):
         """Generic method to create new users
@@ -49,6 +51,12 @@ class DakaraUser(AbstractUser):
 
     objects = DakaraUserManager()
 
+    # username in lower case, for case insensitive search, unique so that a
+    # user is found at most by its natural key
+    username_folded = FoldedCharField(
+        source="username", keep_accents=True, max_length=150, unique=True
+    )
+
     # permission levels per application
     USER = "u"
     MANAGER = "m"
@@ -19,6 +19,18 @@ class TestDakaraUser:
         ):
             models.DakaraUser.objects.create_user(username="testuser", password="pass")
 
+    def test_create_user_non_fold_unique(self):
+        """Test to create users with usernames only equal once case folded
+        """
+        models.DakaraUser.objects.create_user(username="Straße", password="pass")
+
+        assert models.DakaraUser.objects.is_username_taken("STRASSE")
+        with pytest.raises(
+            models.UserExistsWithDifferentCaseError,
+            match="The username must be case insensitively unique",
+        ):
+            models.DakaraUser.objects.create_user(username="STRASSE", password="pass")
+
     def test_users_permission_levels(self):
         """Test the users app permission levels
         """